@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'anontchigan.settings')
 
 application = get_asgi_application()
+
+# Chargement du chatbot en arrière-plan dès le démarrage du serveur (CHATBOT_CONFIG['PRELOAD'])
+from chatbot.services.loader import preload  # noqa: E402
+
+preload()
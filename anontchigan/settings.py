@@ -65,6 +65,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'anontchigan.wsgi.application'
+# Déploiement recommandé pour le chatbot (/chatbot/ask/ asynchrone) :
+# gunicorn anontchigan.asgi:application -k uvicorn.workers.UvicornWorker
+ASGI_APPLICATION = 'anontchigan.asgi.application'
 
 # Database
 DATABASES = {
@@ -144,12 +147,136 @@ LOGGING = {
     },
 }
 
+# ----------------- MÉTRIQUES PROMETHEUS --------------------- #
+# /metrics est ouvert en DEBUG ; sinon réservé au jeton `Authorization: Bearer <METRICS_TOKEN>`
+# ou aux adresses de METRICS_ALLOWED_IPS (séparées par des virgules). Derrière un reverse
+# proxy, REMOTE_ADDR est celle du proxy : préférer le jeton
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
 # ----------------- SECTION CHATBOT CLE API --------------------- #
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')  # Sécurisé
+# URL d'un serveur compatible (ex. `python manage.py fake_groq_server`), None = API Groq
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL') or None
 
 # Configuration pour les modèles
 CHATBOT_CONFIG = {
     'USE_ADVANCED_RAG': True,
-    'SIMILARITY_THRESHOLD': 0.65,
+    # Charge le ChatbotService en arrière-plan au démarrage du serveur (wsgi.py/asgi.py,
+    # runserver compris ; jamais pour les autres commandes ni les tests), voir /chatbot/ready/
+    'PRELOAD': True,
+    # Seuils en cosinus (INDEX_TYPE flat_ip/hnsw/ivf_pq). Réglés à l'origine à 0.65 et
+    # 0.55 en flat_l2 (similarité 1/(1+d²)) ; convertis par d² = 2 - 2cos (vecteurs de
+    # norme 1) : 0.65 -> 0.73 et 0.55 -> 0.59. Les embeddings bruts du modèle n'étant
+    # pas de norme 1, l'équivalence exacte dépend du corpus : la vérifier avec
+    # `python manage.py benchmark_index --calibrate` après un changement de modèle ou de corpus
+    'SIMILARITY_THRESHOLD': 0.73,
     'MAX_CONTEXT_LENGTH': 1000,
+    'EMBEDDING_MODEL': 'paraphrase-multilingual-MiniLM-L12-v2',
+    # 'sentence_transformers' (PyTorch), 'onnx' ou 'onnx_int8' (ONNX Runtime, CPU).
+    # Les backends ONNX utilisent le modèle exporté par `manage.py export_onnx_model`.
+    'EMBEDDING_BACKEND': 'sentence_transformers',
+    'ONNX_MODEL_DIR': os.path.join(BASE_DIR, 'chatbot', 'models', 'onnx'),
+    'ONNX_OPTIONS': {'max_length': 128, 'batch_size': 32},
+    # Tous les fichiers *.json de ce dossier sont indexés
+    'CORPUS_DIR': os.path.join(BASE_DIR, 'chatbot', 'data'),
+    # Intervalle (s) de vérification des fichiers du corpus, 0 = pas de rechargement à chaud
+    'CORPUS_RELOAD_INTERVAL': 30,
+    # Artefacts (embeddings + index FAISS) réutilisés entre deux démarrages
+    'INDEX_CACHE_DIR': os.path.join(BASE_DIR, 'chatbot', 'cache'),
+    # Nombre d'embeddings de requêtes gardés en mémoire (0 = désactivé)
+    'QUERY_CACHE_SIZE': 1024,
+    # Résultats de recherche par question normalisée (invalidés au rechargement du corpus)
+    'RESULT_CACHE_SIZE': 1024,
+    # Réponses générées par Groq réutilisées pour les questions quasi identiques
+    # (cosinus >= seuil) au même contexte récupéré ; 0 = désactivé
+    'ANSWER_CACHE_SIZE': 256,
+    'ANSWER_CACHE_TTL': 3600,
+    'ANSWER_CACHE_THRESHOLD': 0.95,
+    # Appels Groq : timeout (s) par tentative, nouvelles tentatives bornées et
+    # disjoncteur (ouvert après N échecs consécutifs, réessai après RECOVERY s)
+    'GROQ_TIMEOUT': 10.0,
+    'GROQ_MAX_RETRIES': 1,
+    'GROQ_RETRY_BACKOFF': 0.5,
+    'GROQ_BREAKER_FAILURES': 3,
+    'GROQ_BREAKER_RECOVERY': 30.0,
+    # Threads pour l'encodage et FAISS des requêtes asynchrones (vue chatbot/ask/)
+    'CPU_EXECUTOR_WORKERS': 4,
+    # Budget de jetons d'entrée du prompt Groq (système + question + contexte + historique).
+    # Jetons comptés avec le tokenizer.json de Llama 3.1 s'il est présent, sinon estimés
+    # (avertissement au démarrage) ; le récupérer avec `python manage.py fetch_prompt_tokenizer`.
+    'PROMPT_TOKEN_BUDGET': 1800,
+    'PROMPT_TOKENIZER': os.path.join(BASE_DIR, 'chatbot', 'models', 'llama', 'tokenizer.json'),
+    # Questions identiques simultanées (hors questions de suivi) : un seul calcul partagé
+    'REQUEST_COALESCING': True,
+    # Similarité entre EXTRACTIVE_MIN_SIMILARITY et le seuil de réponse directe :
+    # réponse assemblée localement à partir des meilleures phrases des réponses
+    # récupérées (method 'extractive'), Groq seulement si aucune phrase ne convient
+    'EXTRACTIVE_COMPOSER': True,
+    'EXTRACTIVE_MIN_SIMILARITY': 0.59,
+    'EXTRACTIVE_MIN_SENTENCE_SCORE': 0.5,
+    'EXTRACTIVE_MAX_SENTENCES': 3,
+    # Historique des conversations : 'memory' (par processus, borné), 'sqlite'
+    # (CONVERSATION_DB partagée par tous les workers gunicorn de la machine) ou
+    # 'database' (mémoire + modèles Conversation/Message écrits en différé par lots,
+    # survit aux redémarrages ; nécessite `python manage.py migrate`). 'memory' par
+    # défaut : rien n'est écrit sur disque (voir core/templates/core/politique.html)
+    'CONVERSATION_STORE': 'memory',
+    'CONVERSATION_DB': os.path.join(BASE_DIR, 'chatbot', 'cache', 'conversations.sqlite3'),
+    'CONVERSATION_IDLE_TTL': 3600,
+    'CONVERSATION_MAX_USERS': 10000,
+    'CONVERSATION_MAX_MB': 64,
+    # Écriture différée ('database') : un lot dès N messages ou au plus tard après N secondes
+    'CONVERSATION_FLUSH_SIZE': 100,
+    'CONVERSATION_FLUSH_INTERVAL': 2.0,
+    # 'database' : conversations supprimées après N jours sans message (purge horaire
+    # par chaque worker, ou `python manage.py purge_conversations`) ; durée annoncée
+    # dans la politique de confidentialité, à garder cohérente
+    'CONVERSATION_RETENTION_DAYS': 30,
+    # Historique à taille fixe : les HISTORY_SUMMARY_TURNS derniers échanges tels quels,
+    # les plus anciens résumés localement par les questions du corpus correspondantes
+    'HISTORY_SUMMARY': False,
+    'HISTORY_SUMMARY_TURNS': 4,
+    'HISTORY_SUMMARY_TOPICS': 5,
+    # Routeur d'intention : écart de similarité (centroïdes suivi / FAQ) exigé
+    # pour classer en question de suivi une question sans indice lexical
+    'INTENT_MARGIN': 0.05,
+    # Questions traitées simultanément par worker via /chatbot/ask/ et /chatbot/stream/ ;
+    # au-delà, réponse 503 immédiate plutôt qu'une file d'attente (0 = pas de limite)
+    'CHAT_MAX_IN_FLIGHT': 32,
+    # Journal échantillonné des questions (question normalisée, méthode, score, latence),
+    # écrit par un thread dédié ; miné par `python manage.py build_warm_questions`.
+    # Désactivé par défaut : les questions de santé ne sont pas conservées (voir
+    # politique.html) ; à n'activer que le temps de constituer la liste de préchauffage
+    'QUERY_LOG': False,
+    'QUERY_LOG_PATH': os.path.join(BASE_DIR, 'chatbot', 'cache', 'query_log.jsonl'),
+    'QUERY_LOG_SAMPLE_RATE': 0.1,
+    # Questions fréquentes préchauffées au démarrage (embeddings, recherche) avant que
+    # /chatbot/ready/ réponde 200. Les réponses Groq des WARM_GENERATE_TOP premières sont
+    # générées une seule fois par `build_warm_questions --warm` et écrites dans la liste ;
+    # chaque worker les remet dans son cache sémantique sans rappeler Groq
+    'WARM_QUESTIONS_FILE': os.path.join(BASE_DIR, 'chatbot', 'cache', 'warm_questions.json'),
+    'WARM_MAX_QUESTIONS': 200,
+    'WARM_GENERATE_TOP': 20,
+    # Regroupe les recherches concurrentes en un seul encodage + appel FAISS
+    'MICRO_BATCHING': False,
+    'MICRO_BATCH_MAX_SIZE': 32,
+    'MICRO_BATCH_WAIT_MS': 5,
+    # Index vectoriel : 'flat_l2' (historique), 'flat_ip' (cosinus exact),
+    # 'hnsw' ou 'ivf_pq' (approximatifs, pour les gros corpus).
+    # Voir `python manage.py benchmark_index` pour choisir.
+    'INDEX_TYPE': 'flat_ip',
+    # Recherche : 'dense' (FAISS), 'hybrid' (FAISS + BM25 fusionnés par RRF)
+    # ou 'lexical' (BM25 seul, sans SentenceTransformer/torch : petits serveurs)
+    'RETRIEVAL_MODE': 'hybrid',
+    'RRF_K': 60,
+    'HYBRID_CANDIDATES': 10,
+    # Embeddings ouverts en np.memmap depuis INDEX_CACHE_DIR : les workers gunicorn
+    # partagent les mêmes pages (recherche exacte sans copie pour flat_ip/flat_l2)
+    'EMBEDDING_MMAP': True,
+    'EMBEDDING_STORE_DTYPE': 'float16',
+    'INDEX_PARAMS': {
+        'hnsw': {'M': 32, 'efConstruction': 80, 'efSearch': 64},
+        'ivf_pq': {'nlist': 1024, 'm': 16, 'nbits': 8, 'nprobe': 16},
+    },
 }
\ No newline at end of file
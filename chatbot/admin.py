@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import Conversation, Message
 
-# Register your models here.
+
+class MessageInline(admin.TabularInline):
+    model = Message
+    extra = 0
+    fields = ('role', 'content', 'topic', 'created_at')
+    readonly_fields = fields
+    can_delete = False
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    """
+    Interface d'administration des conversations du chatbot (lecture seule)
+    """
+    list_display = ('user_id', 'created_at', 'updated_at')
+    date_hierarchy = 'updated_at'
+    search_fields = ('user_id',)
+    readonly_fields = ('user_id', 'created_at', 'updated_at')
+    inlines = [MessageInline]
@@ -0,0 +1,131 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services.corpus import corpus_files, entry_text, load_corpus
+from chatbot.services.embeddings import EMBEDDING_BACKENDS, create_embedding_backend
+from chatbot.services.rag_service import Config
+
+REFERENCE_BACKEND = 'sentence_transformers'
+
+
+def _rss_mb() -> float:
+    """RSS courant du processus (Linux), sinon pic RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class Command(BaseCommand):
+    help = ("Compare les backends d'embeddings (latence, RSS) et vérifie la parité "
+            "des backends ONNX avec PyTorch sur le corpus embarqué")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS),
+                            choices=EMBEDDING_BACKENDS)
+        parser.add_argument('-k', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--parity', action='store_true',
+                            help="Échoue si un backend s'écarte de la référence PyTorch")
+        parser.add_argument('--min-cosine', type=float, default=0.98,
+                            help="Cosinus moyen minimal avec les embeddings PyTorch")
+        parser.add_argument('--min-topk', type=float, default=0.9,
+                            help="Recouvrement top-k minimal avec les résultats PyTorch")
+
+    def handle(self, *args, **options):
+        entries = list(load_corpus(corpus_files(Config.get('CORPUS_DIR'))).values())
+        texts = [entry_text(entry) for entry in entries]
+        questions = [entry['question_originale'] for entry in entries][:options['queries']]
+        model_name = Config.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL)
+
+        # ONNX d'abord : l'import de torch par la référence fausserait leur RSS
+        backends = sorted(options['backends'], key=lambda name: name == REFERENCE_BACKEND)
+        runs = {}
+        for name in backends:
+            try:
+                runs[name] = self._run(name, model_name, texts, questions)
+            except Exception as e:
+                self.stderr.write(f"⚠️  {name} ignoré: {str(e)}")
+
+        self.stdout.write(f"{len(texts)} entrées, {len(questions)} requêtes\n")
+        self.stdout.write(f"{'backend':<24}{'charg. (s)':>11}{'corpus (s)':>11}"
+                          f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'+RSS (Mo)':>11}")
+        for name, run in runs.items():
+            self.stdout.write(
+                f"{name:<24}{run['load']:>11.2f}{run['corpus']:>11.2f}"
+                f"{np.percentile(run['latencies'], 50):>10.2f}"
+                f"{np.percentile(run['latencies'], 95):>10.2f}{run['rss']:>11.0f}"
+            )
+
+        reference = runs.get(REFERENCE_BACKEND)
+        if reference is None:
+            if options['parity']:
+                raise CommandError("Parité impossible sans le backend de référence PyTorch")
+            return
+
+        failures = []
+        k = options['k']
+        self.stdout.write(f"\nParité avec {REFERENCE_BACKEND} (k={k})")
+        for name, run in runs.items():
+            if name == REFERENCE_BACKEND:
+                continue
+            cosines = (_normalize(run['vectors']) * _normalize(reference['vectors'])).sum(axis=1)
+            overlap = self._topk_overlap(reference, run, k)
+            self.stdout.write(f"{name:<24}cosinus moyen {cosines.mean():.4f} "
+                              f"(min {cosines.min():.4f}), top-{k} {overlap:.3f}")
+            if cosines.mean() < options['min_cosine'] or overlap < options['min_topk']:
+                failures.append(name)
+
+        if options['parity'] and failures:
+            raise CommandError(f"Parité non atteinte pour: {', '.join(failures)}")
+
+    def _run(self, name, model_name, texts, questions):
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        backend = create_embedding_backend(
+            name, model_name,
+            model_dir=Config.get('ONNX_MODEL_DIR'),
+            **(Config.get('ONNX_OPTIONS', {}) if name != REFERENCE_BACKEND else {}),
+        )
+        load_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectors = backend.encode(texts)
+        corpus_time = time.perf_counter() - started
+
+        latencies = []
+        for question in questions:
+            started = time.perf_counter()
+            backend.encode([question])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'load': load_time,
+            'corpus': corpus_time,
+            'latencies': latencies,
+            'rss': _rss_mb() - rss_before,
+            'vectors': vectors,
+            'queries': backend.encode(questions),
+        }
+
+    @staticmethod
+    def _topk_overlap(reference, run, k):
+        def topk(run):
+            scores = _normalize(run['queries']) @ _normalize(run['vectors']).T
+            return np.argsort(-scores, axis=1)[:, :k]
+
+        expected, found = topk(reference), topk(run)
+        return float(np.mean([
+            len(set(expected[row]) & set(found[row])) / k for row in range(len(expected))
+        ]))
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import faiss
+from django.core.management.base import BaseCommand
+
+from chatbot.services.corpus import entry_text
+from chatbot.services.rag_service import Config, RAGService
+from chatbot.services.vector_index import INDEX_TYPES, build_index, prepare_vectors
+
+# Seuils réglés avec l'index flat_l2 historique (similarité 1/(1+d²))
+L2_THRESHOLDS = {'SIMILARITY_THRESHOLD': 0.65, 'EXTRACTIVE_MIN_SIMILARITY': 0.55}
+
+
+class Command(BaseCommand):
+    help = "Compare rappel et latence des types d'index FAISS sur le corpus du chatbot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+        parser.add_argument('--size', type=int, default=0,
+                            help="Taille du corpus synthétique (0 = corpus embarqué seul)")
+        parser.add_argument('--noise', type=float, default=0.05,
+                            help="Écart-type du bruit ajouté aux vecteurs synthétiques")
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--calibrate', action='store_true',
+                            help="Seuils cosinus équivalents aux seuils réglés en flat_l2, "
+                                 "au lieu de la comparaison des index")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        k = options['k']
+
+        rag = RAGService()
+        if options['calibrate']:
+            self._calibrate(rag)
+            return
+        corpus = prepare_vectors(rag.embeddings, 'flat_ip')
+        if options['size'] > len(corpus):
+            corpus = self._augment(corpus, options['size'], options['noise'], rng)
+
+        questions = [item['question_originale'] for item in rag.questions_data]
+        picked = rng.choice(len(questions), size=min(options['queries'], len(questions)), replace=False)
+        queries = prepare_vectors(rag.embed_queries([questions[i] for i in picked]), 'flat_ip')
+
+        exact = build_index(corpus, 'flat_ip')
+        _, truth = exact.search(queries, k)
+
+        self.stdout.write(f"Corpus: {len(corpus)} vecteurs (d={corpus.shape[1]}), "
+                          f"{len(queries)} requêtes, k={k}\n")
+        self.stdout.write(f"{'index':<10}{'build (s)':>11}{'recall@k':>10}"
+                          f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'taille (Mo)':>13}")
+
+        for index_type in options['types']:
+            started = time.perf_counter()
+            index = build_index(corpus, index_type, rag.index_params if index_type == rag.index_type else None)
+            build_time = time.perf_counter() - started
+
+            latencies = []
+            found = np.empty_like(truth)
+            for row, query in enumerate(queries):
+                started = time.perf_counter()
+                _, ids = index.search(query.reshape(1, -1), k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found[row] = ids[0]
+
+            recall = np.mean([
+                len(set(found[row]) & set(truth[row])) / k for row in range(len(queries))
+            ])
+            size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+
+            self.stdout.write(
+                f"{index_type:<10}{build_time:>11.2f}{recall:>10.3f}"
+                f"{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 95):>10.3f}"
+                f"{size_mb:>13.1f}"
+            )
+
+    def _calibrate(self, rag: RAGService):
+        """Seuil cosinus qui reproduit au mieux les décisions des seuils flat_l2
+
+        Requêtes : questions du corpus, entières puis tronquées (paraphrases
+        partielles, scores plus dispersés). Pour chacune, meilleure similarité
+        en flat_l2 (vecteurs bruts) et en cosinus ; on retient le seuil cosinus
+        qui donne la même décision (au-dessus / en dessous) le plus souvent.
+        """
+        entries = rag.questions_data
+        corpus = np.asarray(rag.embedding_model.encode([entry_text(e) for e in entries]), dtype='float32')
+        questions = [e['question_originale'] for e in entries]
+        truncated = [' '.join(q.split()[:max(2, len(q.split()) * 3 // 5)]) for q in questions]
+        queries = np.asarray(rag.embed_queries(questions + truncated), dtype='float32')
+
+        squared = ((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ corpus.T
+                   + (corpus ** 2).sum(axis=1)[None, :])
+        l2_best = (1 / (1 + np.clip(squared, 0, None))).max(axis=1)
+        cosine_best = (prepare_vectors(queries, 'flat_ip') @ prepare_vectors(corpus, 'flat_ip').T).max(axis=1)
+
+        self.stdout.write(f"{len(queries)} requêtes, {len(corpus)} entrées, "
+                          f"norme moyenne des embeddings {np.linalg.norm(corpus, axis=1).mean():.2f}\n")
+        self.stdout.write(f"{'réglage':<28}{'flat_l2':>9}{'cosinus':>9}{'accord':>9}{'cos (norme 1)':>15}")
+        candidates = np.unique(np.round(cosine_best, 3))
+        for name, l2_threshold in L2_THRESHOLDS.items():
+            expected = l2_best >= l2_threshold
+            agreement = [np.mean((cosine_best >= c) == expected) for c in candidates]
+            best = candidates[int(np.argmax(agreement))]
+            # Vecteurs de norme 1 : d² = 2 - 2cos
+            unit = 1 - (1 / l2_threshold - 1) / 2
+            self.stdout.write(f"{name:<28}{l2_threshold:>9.2f}{best:>9.3f}{max(agreement):>9.1%}{unit:>15.3f}")
+        self.stdout.write(f"\nValeurs actuelles : SIMILARITY_THRESHOLD={Config.get('SIMILARITY_THRESHOLD')}, "
+                          f"EXTRACTIVE_MIN_SIMILARITY={Config.get('EXTRACTIVE_MIN_SIMILARITY')}")
+
+    @staticmethod
+    def _augment(corpus: np.ndarray, size: int, noise: float, rng) -> np.ndarray:
+        """Étend le corpus avec des variantes bruitées des vecteurs réels"""
+        base = corpus[rng.integers(0, len(corpus), size=size - len(corpus))]
+        synthetic = base + rng.normal(0, noise, size=base.shape).astype('float32')
+        return prepare_vectors(np.vstack([corpus, synthetic]), 'flat_ip')
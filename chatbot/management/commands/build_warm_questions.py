@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services.query_log import frequent_questions
+from chatbot.services.rag_service import ChatbotService, Config
+
+
+class Command(BaseCommand):
+    help = ("Extrait les questions les plus fréquentes du journal des questions et écrit "
+            "la liste préchauffée au démarrage (WARM_QUESTIONS_FILE)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=Config.get('QUERY_LOG_PATH'))
+        parser.add_argument('--output', default=Config.get('WARM_QUESTIONS_FILE'))
+        parser.add_argument('--top', type=int, default=Config.get('WARM_MAX_QUESTIONS', 200))
+        parser.add_argument('--min-count', type=int, default=2,
+                            help="Occurrences minimales (dans l'échantillon) pour retenir une question")
+        parser.add_argument('--days', type=float, default=None,
+                            help="Ne considère que les N derniers jours du journal")
+        parser.add_argument('--warm', action='store_true',
+                            help="Génère une fois (Groq) les réponses des questions les plus fréquentes "
+                                 "et les écrit dans la liste : les workers les remettent en cache au démarrage")
+        parser.add_argument('--generate-top', type=int, default=Config.get('WARM_GENERATE_TOP', 20),
+                            help="Nombre de questions dont la réponse est générée avec --warm")
+
+    def handle(self, *args, **options):
+        log_path, output = options['log'], options['output']
+        if not log_path or not os.path.exists(log_path):
+            raise CommandError(f"Journal des questions introuvable: {log_path}")
+        if not output:
+            raise CommandError("WARM_QUESTIONS_FILE n'est pas configuré (ou passer --output)")
+
+        since = time.time() - options['days'] * 86400 if options['days'] else None
+        ranked = frequent_questions(log_path, top=options['top'], min_count=options['min_count'], since=since)
+        items = [{'question': question, 'count': count} for question, count in ranked]
+
+        if options['warm'] and ranked:
+            started = time.perf_counter()
+            generated = ChatbotService().generate_warm_answers(
+                [question for question, _ in ranked[:options['generate_top']]]
+            )
+            answers = {item['question']: item for item in generated}
+            for item in items:
+                item.update(answers.get(item['question'], {}))
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ {len(generated)} réponses générées en {time.perf_counter() - started:.1f}s"
+            ))
+
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'source': log_path,
+                'questions': items,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output)
+
+        self.stdout.write(f"{len(ranked)} questions retenues -> {output}")
+        for question, count in ranked[:10]:
+            self.stdout.write(f"{count:>8}  {question}")
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot.services.rag_service import RAGService
+
+
+def _mapping_usage(path: str):
+    """(Rss, Pss) en Ko des projections mémoire de `path` dans ce processus (Linux)"""
+    rss = pss = 0
+    current = False
+    try:
+        with open('/proc/self/smaps') as f:
+            for line in f:
+                fields = line.split()
+                if '-' in fields[0] and len(fields) >= 5:
+                    current = len(fields) >= 6 and os.path.realpath(fields[-1]) == path
+                elif current and fields[0] == 'Rss:':
+                    rss += int(fields[1])
+                elif current and fields[0] == 'Pss:':
+                    pss += int(fields[1])
+    except OSError:
+        return None
+    return rss, pss
+
+
+class Command(BaseCommand):
+    help = "Mémoire des embeddings par worker : copie privée float32 contre store partagé (memmap)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        rag = RAGService()
+        embeddings = rag.embeddings
+        count, dimension = embeddings.shape
+        mb = 1024 * 1024
+
+        private_matrix = count * dimension * 4
+        # IndexFlat garde sa propre copie float32 des vecteurs ; HNSW/IVF-PQ ont leur propre structure
+        private_index = private_matrix if rag.index_type in ('flat_l2', 'flat_ip') else 0
+        private_total = private_matrix + private_index
+
+        self.stdout.write(f"Corpus: {count} vecteurs, d={dimension}, index {rag.index_type}")
+        self.stdout.write(f"Avant (float32 par worker) : {private_total / mb:.2f} Mo/worker, "
+                          f"{private_total * workers / mb:.2f} Mo pour {workers} workers")
+
+        if not isinstance(embeddings, np.memmap):
+            self.stdout.write("EMBEDDING_MMAP désactivé : les embeddings sont privés à chaque worker.")
+            return
+
+        path = os.path.realpath(embeddings.filename)
+        shared = os.path.getsize(path)
+        private_now = 0 if rag.shared_flat else private_index
+        self.stdout.write(f"Après ({embeddings.dtype}, memmap partagé) : {shared / mb:.2f} Mo en cache "
+                          f"disque pour tous les workers + {private_now / mb:.2f} Mo privés/worker")
+        total_now = shared + private_now * workers
+        self.stdout.write(f"Gain pour {workers} workers : {(private_total * workers - total_now) / mb:.2f} Mo "
+                          f"({100 * (1 - total_now / (private_total * workers)):.0f} %)")
+
+        # Touche toutes les pages pour mesurer la projection effective
+        float(np.asarray(embeddings[:, 0], dtype='float32').sum())
+        usage = _mapping_usage(path)
+        if usage is not None:
+            self.stdout.write(f"Projection mesurée dans ce processus : Rss {usage[0]} Ko, Pss {usage[1]} Ko "
+                              f"(Pss = part imputée à ce worker quand les pages sont partagées)")
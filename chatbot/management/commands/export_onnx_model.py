@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from chatbot.services.embeddings import (
+    ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE, ONNX_TOKENIZER_FILE, ensure_quantized_model,
+)
+from chatbot.services.rag_service import Config
+
+
+class Command(BaseCommand):
+    help = "Exporte le modèle d'embeddings en ONNX (float32 et int8) pour les backends 'onnx'"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=Config.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL))
+        parser.add_argument('--output', default=Config.get('ONNX_MODEL_DIR'))
+        parser.add_argument('--opset', type=int, default=17)
+        parser.add_argument('--no-quantize', action='store_true')
+
+    def handle(self, *args, **options):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+
+        model = SentenceTransformer(options['model'], device='cpu')
+        transformer = model[0].auto_model.eval()
+        tokenizer = model.tokenizer
+
+        sample = tokenizer(["Quels sont les symptômes du cancer du sein ?"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+
+        model_path = os.path.join(output, ONNX_MODEL_FILE)
+        with torch.no_grad():
+            torch.onnx.export(
+                _token_embeddings_module(transformer),
+                tuple(sample[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=['token_embeddings'],
+                dynamic_axes=dynamic_axes,
+                opset_version=options['opset'],
+            )
+        tokenizer.backend_tokenizer.save(os.path.join(output, ONNX_TOKENIZER_FILE))
+        self.stdout.write(self.style.SUCCESS(f"✓ Modèle exporté: {model_path}"))
+
+        if not options['no_quantize']:
+            quantized_path = os.path.join(output, ONNX_INT8_MODEL_FILE)
+            if os.path.exists(quantized_path):
+                os.remove(quantized_path)
+            self.stdout.write(self.style.SUCCESS(f"✓ Modèle int8: {ensure_quantized_model(output)}"))
+
+
+def _token_embeddings_module(transformer):
+    """Module qui ne renvoie que les embeddings de tokens (le pooling est fait côté backend)"""
+    import torch
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+            ).last_hidden_state
+
+    return TokenEmbeddings(transformer)
@@ -0,0 +1,161 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+COMPLETION_PATHS = ('/openai/v1/chat/completions', '/v1/chat/completions')
+
+ANSWERS = [
+    "Le dépistage précoce du cancer du sein augmente fortement les chances de guérison. "
+    "Pratiquez l'autopalpation chaque mois et consultez un professionnel de santé en cas de doute. 💗",
+    "Une boule dans le sein n'est pas toujours un cancer, mais elle doit être examinée rapidement "
+    "par un médecin. Une échographie ou une mammographie permettra de préciser le diagnostic. 🌸",
+    "Une alimentation équilibrée, une activité physique régulière et la limitation de l'alcool "
+    "réduisent le risque de cancer du sein. Parlez-en à votre médecin au Bénin. 😊",
+]
+
+
+class Command(BaseCommand):
+    help = ("Serveur local compatible OpenAI/Groq (chat.completions) pour les tests de charge : "
+            "latence, débit de jetons et erreurs configurables")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency-ms', type=float, default=300,
+                            help="Délai avant le premier jeton")
+        parser.add_argument('--jitter-ms', type=float, default=100,
+                            help="Variation aléatoire (uniforme ±) du délai")
+        parser.add_argument('--tokens-per-second', type=float, default=200,
+                            help="Débit de génération (0 = instantané)")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Proportion de réponses en erreur")
+        parser.add_argument('--error-status', type=int, default=500,
+                            help="Code HTTP des erreurs injectées (429, 500, 503...)")
+        parser.add_argument('--hang-rate', type=float, default=0.0,
+                            help="Proportion de requêtes qui ne répondent jamais (test des timeouts)")
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        handler = _make_handler(options, rng, threading.Lock())
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        server.daemon_threads = True
+
+        base_url = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(self.style.SUCCESS(f"✓ Faux Groq sur {base_url}"))
+        self.stdout.write(f"  GROQ_BASE_URL={base_url} GROQ_API_KEY=fake python manage.py load_test_chatbot")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def _make_handler(options, rng, rng_lock):
+    class FakeGroqHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if self.path.rstrip('/') not in COMPLETION_PATHS:
+                return self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send_json(400, {'error': {'message': 'Invalid JSON'}})
+
+            with rng_lock:
+                hang = rng.random() < options['hang_rate']
+                error = rng.random() < options['error_rate']
+                delay = max(0.0, options['latency_ms'] + rng.uniform(-1, 1) * options['jitter_ms']) / 1000
+                answer = rng.choice(ANSWERS)
+
+            if hang:
+                time.sleep(3600)
+                return
+            time.sleep(delay)
+            if error:
+                return self._send_json(options['error_status'], {
+                    'error': {'message': 'Injected error', 'type': 'fake_groq_error'}
+                })
+
+            tokens = answer.split(' ')
+            max_tokens = payload.get('max_tokens')
+            if max_tokens:
+                tokens = tokens[:max_tokens]
+            if payload.get('stream'):
+                self._stream(payload, tokens)
+            else:
+                self._sleep_for_tokens(len(tokens))
+                self._send_json(200, self._completion(payload, ' '.join(tokens)))
+
+        def _stream(self, payload, tokens):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            for i, token in enumerate(tokens):
+                self._sleep_for_tokens(1)
+                chunk = {
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'fake'),
+                    'choices': [{
+                        'index': 0,
+                        'delta': {'content': token if i == 0 else ' ' + token},
+                        'finish_reason': None,
+                    }],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _sleep_for_tokens(self, count):
+            if options['tokens_per_second'] > 0:
+                time.sleep(count / options['tokens_per_second'])
+
+        @staticmethod
+        def _completion(payload, content):
+            prompt_tokens = sum(len(str(m.get('content', ''))) for m in payload.get('messages', [])) // 3
+            completion_tokens = len(content.split(' '))
+            return {
+                'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': payload.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                },
+            }
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return FakeGroqHandler
@@ -0,0 +1,46 @@
+import os
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services.prompt_builder import TokenCounter
+from chatbot.services.rag_service import Config
+
+# Dépôt non restreint qui publie le tokenizer.json de Llama 3.1 (identique à celui de meta-llama)
+DEFAULT_REPO = 'unsloth/Meta-Llama-3.1-8B-Instruct'
+
+
+class Command(BaseCommand):
+    help = "Télécharge le tokenizer.json de Llama 3.1 utilisé pour le budget de jetons du prompt (PROMPT_TOKENIZER)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repo', default=DEFAULT_REPO,
+                            help="Dépôt Hugging Face contenant tokenizer.json")
+        parser.add_argument('--output', default=Config.get('PROMPT_TOKENIZER'))
+        parser.add_argument('--force', action='store_true', help="Remplace un tokenizer existant")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if not output:
+            raise CommandError("PROMPT_TOKENIZER n'est pas configuré (ou passer --output)")
+        if os.path.exists(output) and not options['force']:
+            self.stdout.write(f"Tokenizer déjà présent: {output} (--force pour le remplacer)")
+            return
+
+        from huggingface_hub import hf_hub_download
+
+        try:
+            downloaded = hf_hub_download(options['repo'], 'tokenizer.json')
+        except Exception as e:
+            raise CommandError(f"Téléchargement impossible depuis {options['repo']}: {str(e)}")
+
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        shutil.copyfile(downloaded, output)
+
+        counter = TokenCounter(output)
+        if not counter.exact:
+            raise CommandError(f"Fichier téléchargé illisible par tokenizers: {output}")
+        sample = "Quels sont les symptômes du cancer du sein ?"
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Tokenizer installé: {output} ({counter.count(sample)} jetons pour « {sample} »)"
+        ))
@@ -0,0 +1,162 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from chatbot.services.rag_service import ChatbotService
+
+# Proportions par défaut des types de questions envoyées
+DEFAULT_MIX = {'exact': 3, 'paraphrase': 3, 'open': 2, 'greeting': 1, 'followup': 1}
+
+OPEN_QUESTIONS = [
+    "Est-ce que le stress peut provoquer un cancer du sein ?",
+    "Mon téléphone dans la poche de poitrine est-il dangereux ?",
+    "Peut-on avoir un cancer du sein à 20 ans ?",
+    "Les déodorants favorisent-ils le cancer du sein ?",
+    "Combien coûte une mammographie à Cotonou ?",
+    "Est-ce que l'allaitement protège vraiment du cancer ?",
+    "Que faire si ma mère a eu un cancer du sein ?",
+    "Les hommes doivent-ils aussi faire l'autopalpation ?",
+]
+GREETINGS = ["bonjour", "salut", "coucou", "bonsoir", "hello"]
+FOLLOWUPS = ["Pourquoi ?", "Explique mieux s'il te plaît", "Et comment on fait ça ?", "Tu peux préciser ?"]
+PARAPHRASE_PREFIXES = ["", "Dis-moi, ", "Svp ", "J'aimerais savoir : ", "Question : "]
+
+
+class Command(BaseCommand):
+    help = ("Test de charge de ChatbotService.process_question : concurrence fixe, mélange de "
+            "questions réaliste, latences p50/p95/p99, débit et répartition par méthode")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Nombre de conversations")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--mode', choices=('sync', 'async'), default='sync',
+                            help="process_question dans des threads ou aprocess_question")
+        parser.add_argument('--mix', default=None,
+                            help="Ex. exact=3,paraphrase=3,open=2,greeting=1,followup=1")
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--allow-real-groq', action='store_true',
+                            help="Autorise le test sans GROQ_BASE_URL, contre l'API Groq réelle (facturée)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        mix = self._parse_mix(options['mix'])
+
+        base_url = getattr(settings, 'GROQ_BASE_URL', None)
+        if not base_url and not options['allow_real_groq']:
+            raise CommandError(
+                "GROQ_BASE_URL absent : le test de charge enverrait des milliers de requêtes à l'API "
+                "Groq réelle. Lancer `python manage.py fake_groq_server` et définir GROQ_BASE_URL, "
+                "ou passer --allow-real-groq"
+            )
+        self.stdout.write(f"Groq: {base_url or 'API Groq réelle'}")
+        # Trafic synthétique : ni journal des questions (il fausserait la liste de
+        # préchauffage) ni conversations écrites en base
+        with override_settings(CHATBOT_CONFIG={
+            **settings.CHATBOT_CONFIG, 'QUERY_LOG': False, 'CONVERSATION_STORE': 'memory',
+        }):
+            service = ChatbotService()
+        if not service.groq_service.available:
+            self.stderr.write("⚠️  Groq indisponible : seules les réponses locales seront mesurées")
+
+        questions = [item['question_originale'] for item in service.rag_service.questions_data]
+        if not questions:
+            raise CommandError("Corpus vide")
+
+        for i in range(options['warmup']):
+            service.process_question(rng.choice(questions), f"warmup-{i}")
+
+        sessions = [self._session(rng, mix, questions) for _ in range(options['requests'])]
+        self.stdout.write(f"{len(sessions)} conversations ({sum(len(s) for s in sessions)} messages), "
+                          f"concurrence {options['concurrency']}, mode {options['mode']}\n")
+
+        started = time.perf_counter()
+        if options['mode'] == 'async':
+            samples = asyncio.run(self._run_async(service, sessions, options['concurrency']))
+        else:
+            samples = self._run_sync(service, sessions, options['concurrency'])
+        elapsed = time.perf_counter() - started
+
+        self._report(samples, elapsed)
+        health = service.get_health_status()
+        self.stdout.write(f"\nCache des réponses: {health['answer_cache']}")
+        self.stdout.write(f"Circuit Groq: {health['groq_circuit']}")
+
+    @staticmethod
+    def _parse_mix(value):
+        if not value:
+            return DEFAULT_MIX
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name not in DEFAULT_MIX:
+                raise CommandError(f"Type de question inconnu: {name} (choix: {', '.join(DEFAULT_MIX)})")
+            mix[name] = float(weight or 1)
+        return mix
+
+    @staticmethod
+    def _session(rng, mix, questions):
+        """Messages d'une conversation, envoyés dans l'ordre par le même utilisateur"""
+        kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+        if kind == 'exact':
+            return [rng.choice(questions)]
+        if kind == 'paraphrase':
+            question = rng.choice(questions).rstrip(' ?')
+            return [f"{rng.choice(PARAPHRASE_PREFIXES)}{question[0].lower()}{question[1:]} ?"]
+        if kind == 'open':
+            return [rng.choice(OPEN_QUESTIONS)]
+        if kind == 'greeting':
+            return [rng.choice(GREETINGS)]
+        return [rng.choice(questions), rng.choice(FOLLOWUPS)]
+
+    @staticmethod
+    def _run_sync(service, sessions, concurrency):
+        def run(args):
+            index, session = args
+            samples = []
+            for question in session:
+                started = time.perf_counter()
+                result = service.process_question(question, f"load-{index}")
+                samples.append((result.get('method', 'unknown'), time.perf_counter() - started))
+            return samples
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return [sample for samples in pool.map(run, enumerate(sessions)) for sample in samples]
+
+    @staticmethod
+    async def _run_async(service, sessions, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index, session):
+            samples = []
+            async with semaphore:
+                for question in session:
+                    started = time.perf_counter()
+                    result = await service.aprocess_question(question, f"load-{index}")
+                    samples.append((result.get('method', 'unknown'), time.perf_counter() - started))
+            return samples
+
+        results = await asyncio.gather(*(run(i, s) for i, s in enumerate(sessions)))
+        return [sample for samples in results for sample in samples]
+
+    def _report(self, samples, elapsed):
+        latencies = np.array([latency for _, latency in samples]) * 1000
+        self.stdout.write(f"Durée {elapsed:.2f}s, débit {len(samples) / elapsed:.1f} messages/s")
+        self.stdout.write(f"Latence (ms): p50 {np.percentile(latencies, 50):.1f}  "
+                          f"p95 {np.percentile(latencies, 95):.1f}  p99 {np.percentile(latencies, 99):.1f}  "
+                          f"max {latencies.max():.1f}\n")
+
+        by_method = defaultdict(list)
+        for method, latency in samples:
+            by_method[method].append(latency * 1000)
+        self.stdout.write(f"{'méthode':<22}{'n':>6}{'%':>7}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+        for method, values in sorted(by_method.items(), key=lambda item: -len(item[1])):
+            self.stdout.write(f"{method:<22}{len(values):>6}{100 * len(values) / len(samples):>7.1f}"
+                              f"{np.percentile(values, 50):>10.1f}{np.percentile(values, 95):>10.1f}")
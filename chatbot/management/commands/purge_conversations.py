@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.services.conversation_store import purge_conversations
+from chatbot.services.rag_service import Config
+
+
+class Command(BaseCommand):
+    help = ("Supprime les conversations du chatbot (et leurs messages) sans activité depuis "
+            "CONVERSATION_RETENTION_DAYS jours")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=Config.get('CONVERSATION_RETENTION_DAYS', 30))
+
+    def handle(self, *args, **options):
+        if options['days'] <= 0:
+            raise CommandError("--days doit être positif")
+        deleted = purge_conversations(options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {deleted} conversations de plus de {options['days']:g} jours supprimées"
+        ))
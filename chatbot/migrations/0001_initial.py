@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=64, unique=True, verbose_name='Clé de session')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Début')),
+                ('updated_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Dernier message')),
+            ],
+            options={
+                'verbose_name': 'Conversation',
+                'verbose_name_plural': 'Conversations',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('user', 'Utilisateur'), ('assistant', 'ANONTCHIGAN')], max_length=16, verbose_name='Rôle')),
+                ('content', models.TextField(verbose_name='Contenu')),
+                ('topic', models.TextField(blank=True, null=True, verbose_name='Sujet')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chatbot.conversation', verbose_name='Conversation')),
+            ],
+            options={
+                'verbose_name': 'Message du chatbot',
+                'verbose_name_plural': 'Messages du chatbot',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['conversation', '-id'], name='chatbot_msg_conv_recent')],
+            },
+        ),
+    ]
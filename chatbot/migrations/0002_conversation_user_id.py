@@ -0,0 +1,32 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_session_keys(apps, schema_editor):
+    """Les conversations existantes gardent leurs messages, plus la clé de session en clair"""
+    Conversation = apps.get_model('chatbot', 'Conversation')
+    for conversation in Conversation.objects.only('id', 'user_id').iterator():
+        conversation.user_id = hashlib.sha256(conversation.user_id.encode()).hexdigest()
+        conversation.save(update_fields=['user_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='conversation',
+            old_name='session_key',
+            new_name='user_id',
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='user_id',
+            field=models.CharField(max_length=64, unique=True, verbose_name='Identifiant de conversation'),
+        ),
+        migrations.RunPython(hash_session_keys, migrations.RunPython.noop),
+    ]
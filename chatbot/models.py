@@ -1,3 +1,47 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class Conversation(models.Model):
+    """
+    Conversation du chatbot, identifiée par l'identifiant aléatoire gardé en
+    session (jamais par la clé de session Django elle-même)
+    """
+    user_id = models.CharField(max_length=64, unique=True, verbose_name="Identifiant de conversation")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Début")
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Dernier message")
+
+    class Meta:
+        verbose_name = "Conversation"
+        verbose_name_plural = "Conversations"
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"{self.user_id[:8]}… ({self.updated_at.strftime('%d/%m/%Y %H:%M')})"
+
+
+class Message(models.Model):
+    """
+    Message d'une conversation, écrit en différé par lots (voir DatabaseConversationStore)
+    """
+    ROLE_CHOICES = [
+        ('user', 'Utilisateur'),
+        ('assistant', 'ANONTCHIGAN'),
+    ]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages',
+                                     verbose_name="Conversation")
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES, verbose_name="Rôle")
+    content = models.TextField(verbose_name="Contenu")
+    # Question du corpus la plus proche, pour le résumé glissant de l'historique
+    topic = models.TextField(blank=True, null=True, verbose_name="Sujet")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Message du chatbot"
+        verbose_name_plural = "Messages du chatbot"
+        ordering = ['id']
+        indexes = [models.Index(fields=['conversation', '-id'], name='chatbot_msg_conv_recent')]
+
+    def __str__(self):
+        return f"{self.get_role_display()} : {self.content[:50]}"
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class _CachedAnswer:
+    __slots__ = ('vector', 'context_key', 'answer', 'created')
+
+    def __init__(self, vector: np.ndarray, context_key: Hashable, answer: str, created: float):
+        self.vector = vector
+        self.context_key = context_key
+        self.answer = answer
+        self.created = created
+
+
+class SemanticAnswerCache:
+    """Cache LRU + TTL des réponses générées, indexé par l'embedding de la question
+
+    Une réponse est réutilisée si la question est assez proche (cosinus >=
+    `threshold`) d'une question déjà traitée et si le contexte récupéré
+    (identifiants des entrées du corpus) est le même.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600, threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: 'OrderedDict[int, _CachedAnswer]' = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, vector: np.ndarray, context_key: Hashable) -> Optional[str]:
+        if not self.enabled:
+            return None
+        vector = self._normalize(vector)
+        with self._lock:
+            self._expire()
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry.context_key != context_key:
+                    continue
+                score = float(np.dot(entry.vector, vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key].answer
+
+    def put(self, vector: np.ndarray, context_key: Hashable, answer: str):
+        if not self.enabled:
+            return
+        entry = _CachedAnswer(self._normalize(vector), context_key, answer, time.monotonic())
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def _expire(self):
+        if self.ttl <= 0:
+            return
+        deadline = time.monotonic() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry.created < deadline]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32').reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
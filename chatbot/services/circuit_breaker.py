@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Dict
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """Appel refusé sans contacter le service : circuit ouvert"""
+
+
+class CircuitBreaker:
+    """Disjoncteur pour un service distant
+
+    closed : les appels passent ; après `failure_threshold` échecs consécutifs
+    le circuit s'ouvre. open : les appels sont refusés immédiatement pendant
+    `recovery_timeout` secondes. half_open : `half_open_max_calls` appels
+    d'essai passent ; un succès referme le circuit, un échec le rouvre.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._trial_calls = 0
+
+    def release(self):
+        """Appel terminé sans verdict sur la santé du service : libère l'essai half_open"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._current_state() == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._trial_calls = 0
+                self.opens += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'opens': self.opens,
+                'rejected': self.rejected,
+            }
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = STATE_HALF_OPEN
+            self._trial_calls = 0
+        return self._state
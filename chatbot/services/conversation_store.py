@@ -0,0 +1,448 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from .write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+# Valeurs possibles de CHATBOT_CONFIG['CONVERSATION_STORE']
+CONVERSATION_STORES = ('memory', 'sqlite', 'database')
+
+
+class Message:
+    """Message d'historique compact (pas de dict par message)"""
+
+    __slots__ = ('role', 'content', 'topic')
+
+    def __init__(self, role: str, content: str, topic: Optional[str] = None):
+        self.role = role
+        self.content = content
+        # Question du corpus la plus proche, pour le résumé glissant
+        self.topic = topic
+
+    def as_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content}
+
+    @property
+    def size(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+
+def summary_message(topics: Iterable[str]) -> Dict:
+    """Résumé local des échanges sortis de l'historique, à partir de leurs sujets"""
+    return {
+        "role": "system",
+        "content": "Résumé des échanges précédents : l'utilisateur s'est renseigné sur "
+                   + " ; ".join(topic.rstrip(' ?.!') for topic in topics) + ".",
+    }
+
+
+class ConversationStore:
+    """Interface des stockages d'historique : `max_messages` derniers messages par utilisateur
+
+    Avec `summary_topics` > 0, les sujets des messages sortis de l'historique
+    (au plus `summary_topics`, les plus récents) sont gardés et restitués en
+    tête de get_history sous forme d'un court message de résumé.
+    """
+
+    def __init__(self, max_messages: int, summary_topics: int = 0):
+        self.max_messages = max_messages
+        self.summary_topics = summary_topics
+
+    def get_history(self, user_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def add_message(self, user_id: str, role: str, content: str, topic: Optional[str] = None):
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class _Session:
+    __slots__ = ('messages', 'topics', 'size', 'last_access')
+
+    def __init__(self, max_messages: int, summary_topics: int):
+        # Tampons circulaires : taille fixe quelle que soit la longueur de la conversation
+        self.messages: Deque[Message] = deque(maxlen=max_messages)
+        self.topics: Deque[str] = deque(maxlen=summary_topics)
+        self.size = 0
+        self.last_access = time.monotonic()
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Historiques propres au processus, bornés en nombre, en inactivité et en mémoire
+
+    Éviction LRU au-delà de `max_users` conversations ou `max_bytes` octets de
+    texte, et suppression des conversations inactives depuis `idle_ttl` secondes.
+    """
+
+    def __init__(self, max_messages: int, max_users: int = 10000, idle_ttl: float = 3600,
+                 max_bytes: int = 64 * 1024 * 1024, summary_topics: int = 0):
+        super().__init__(max_messages, summary_topics)
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._sessions: 'OrderedDict[str, _Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_history(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return []
+            if self._expired(session, time.monotonic()):
+                self._drop(user_id)
+                self.expirations += 1
+                return []
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(user_id)
+            history = [message.as_dict() for message in session.messages]
+            if session.topics:
+                history.insert(0, summary_message(session.topics))
+            return history
+
+    def add_message(self, user_id: str, role: str, content: str, topic: Optional[str] = None):
+        with self._lock:
+            self._append(user_id, Message(role, content, topic))
+
+    def _append(self, user_id: str, message: Message):
+        now = time.monotonic()
+        session = self._sessions.get(user_id)
+        if session is None or self._expired(session, now):
+            if session is not None:
+                self._drop(user_id)
+                self.expirations += 1
+            session = self._sessions[user_id] = _Session(self.max_messages, self.summary_topics)
+        if len(session.messages) == session.messages.maxlen:
+            self._roll_out(session, session.messages[0])
+        session.messages.append(message)
+        session.size += message.size
+        self._bytes += message.size
+        session.last_access = now
+        self._sessions.move_to_end(user_id)
+        self._evict(now, keep=user_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'users': len(self._sessions),
+                'bytes': self._bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _roll_out(self, session: _Session, message: Message):
+        """Message sur le point de sortir du tampon : seul son sujet est gardé"""
+        session.size -= message.size
+        self._bytes -= message.size
+        if self.summary_topics and message.topic and message.topic not in session.topics:
+            session.topics.append(message.topic)
+
+    def _evict(self, now: float, keep: str):
+        # Les plus anciennes d'abord : inactives puis LRU si les bornes sont dépassées
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if user_id == keep:
+                break
+            if self._expired(session, now):
+                self.expirations += 1
+            elif len(self._sessions) > self.max_users or self._bytes > self.max_bytes:
+                self.evictions += 1
+            else:
+                break
+            self._drop(user_id)
+
+    def _drop(self, user_id: str):
+        session = self._sessions.pop(user_id)
+        self._bytes -= session.size
+
+    def _expired(self, session: _Session, now: float) -> bool:
+        return self.idle_ttl > 0 and now - session.last_access > self.idle_ttl
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Historiques dans une base SQLite partagée par tous les workers d'une machine
+
+    Une connexion par thread, journal WAL pour les lectures concurrentes ; les
+    conversations inactives depuis `idle_ttl` secondes sont purgées périodiquement.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, max_messages: int, idle_ttl: float = 3600, summary_topics: int = 0):
+        super().__init__(max_messages, summary_topics)
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS chatbot_messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " role TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " topic TEXT,"
+                " created REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS chatbot_messages_user ON chatbot_messages (user_id, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS chatbot_messages_created ON chatbot_messages (created)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS chatbot_summaries ("
+                " user_id TEXT PRIMARY KEY,"
+                " topics TEXT NOT NULL)"
+            )
+        logger.info(f"✓ Historiques partagés dans {path}")
+
+    def get_history(self, user_id: str) -> List[Dict]:
+        db = self._connection()
+        rows = db.execute(
+            "SELECT role, content, created FROM chatbot_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, self.max_messages),
+        ).fetchall()
+        if not rows or (self.idle_ttl > 0 and time.time() - rows[0][2] > self.idle_ttl):
+            return []
+        history = [{"role": role, "content": content} for role, content, _ in reversed(rows)]
+        if self.summary_topics:
+            row = db.execute("SELECT topics FROM chatbot_summaries WHERE user_id = ?", (user_id,)).fetchone()
+            if row:
+                history.insert(0, summary_message(json.loads(row[0])))
+        return history
+
+    def add_message(self, user_id: str, role: str, content: str, topic: Optional[str] = None):
+        now = time.time()
+        with self._connection() as db:
+            if self.idle_ttl > 0:
+                # Conversation inactive : on repart de zéro, comme le store en mémoire
+                stale = db.execute(
+                    "DELETE FROM chatbot_messages WHERE user_id = ? AND created < ?",
+                    (user_id, now - self.idle_ttl),
+                ).rowcount
+                if stale:
+                    db.execute("DELETE FROM chatbot_summaries WHERE user_id = ?", (user_id,))
+            db.execute(
+                "INSERT INTO chatbot_messages (user_id, role, content, topic, created) VALUES (?, ?, ?, ?, ?)",
+                (user_id, role, content, topic, now),
+            )
+            rolled_out = db.execute(
+                "SELECT id, topic FROM chatbot_messages WHERE user_id = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (user_id, self.max_messages),
+            ).fetchall()
+            if rolled_out:
+                db.execute(
+                    f"DELETE FROM chatbot_messages WHERE id IN ({','.join('?' * len(rolled_out))})",
+                    [row_id for row_id, _ in rolled_out],
+                )
+                self._summarize(db, user_id, [t for _, t in reversed(rolled_out) if t])
+        self._maybe_purge(now)
+
+    def stats(self) -> Dict:
+        users, messages = self._connection().execute(
+            "SELECT COUNT(DISTINCT user_id), COUNT(*) FROM chatbot_messages"
+        ).fetchone()
+        return {'backend': 'sqlite', 'path': self.path, 'users': users, 'messages': messages}
+
+    def _summarize(self, db: sqlite3.Connection, user_id: str, topics: List[str]):
+        if not (self.summary_topics and topics):
+            return
+        row = db.execute("SELECT topics FROM chatbot_summaries WHERE user_id = ?", (user_id,)).fetchone()
+        kept = json.loads(row[0]) if row else []
+        for topic in topics:
+            if topic not in kept:
+                kept.append(topic)
+        db.execute(
+            "INSERT OR REPLACE INTO chatbot_summaries (user_id, topics) VALUES (?, ?)",
+            (user_id, json.dumps(kept[-self.summary_topics:], ensure_ascii=False)),
+        )
+
+    def _maybe_purge(self, now: float):
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY:
+                return
+        if self.idle_ttl > 0:
+            with self._connection() as db:
+                db.execute("DELETE FROM chatbot_messages WHERE created < ?", (now - self.idle_ttl,))
+                db.execute(
+                    "DELETE FROM chatbot_summaries WHERE user_id NOT IN (SELECT DISTINCT user_id FROM chatbot_messages)"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+
+class DatabaseConversationStore(InMemoryConversationStore):
+    """Historiques en mémoire (mêmes bornes que 'memory') persistés en base en différé
+
+    add_message ne touche que la mémoire et un tampon : un thread écrit les
+    messages par lots (bulk_create) dans les modèles Conversation/Message,
+    dès `flush_size` messages ou après `flush_interval` secondes. Une
+    conversation absente de la mémoire (redémarrage, éviction, autre worker)
+    est réhydratée depuis ses derniers messages en base et ceux encore en attente.
+    Les conversations sans message depuis `retention_days` jours sont
+    supprimées par le même thread, au plus une fois par PURGE_INTERVAL.
+    """
+
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, max_messages: int, max_users: int = 10000, idle_ttl: float = 3600,
+                 max_bytes: int = 64 * 1024 * 1024, summary_topics: int = 0,
+                 flush_size: int = 100, flush_interval: float = 2.0, retention_days: float = 30):
+        super().__init__(max_messages, max_users=max_users, idle_ttl=idle_ttl,
+                         max_bytes=max_bytes, summary_topics=summary_topics)
+        self.retention_days = retention_days
+        self.buffer = WriteBehindBuffer(self._flush_batch, max_batch=flush_size, interval=flush_interval,
+                                        name='chatbot-conversations')
+        self._purged_at: Optional[float] = None
+        self.rehydrated = 0
+        self.rehydrate_errors = 0
+        self.purged = 0
+
+    def get_history(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            cached = user_id in self._sessions
+        if not cached:
+            self._rehydrate(user_id)
+        return super().get_history(user_id)
+
+    def add_message(self, user_id: str, role: str, content: str, topic: Optional[str] = None):
+        from django.utils import timezone
+
+        super().add_message(user_id, role, content, topic)
+        self.buffer.add((user_id, role, content, topic, timezone.now()))
+
+    def flush(self):
+        """Écrit immédiatement les messages en attente (arrêt, commandes)"""
+        self.buffer.flush()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats.update({
+            'backend': 'database',
+            'rehydrated': self.rehydrated,
+            'rehydrate_errors': self.rehydrate_errors,
+            'retention_days': self.retention_days,
+            'purged': self.purged,
+            'write_behind': self.buffer.stats(),
+        })
+        return stats
+
+    def _rehydrate(self, user_id: str):
+        from django.utils import timezone
+        from chatbot.models import Message as MessageModel
+
+        # Quelques messages plus anciens en plus : leurs sujets alimentent le résumé glissant
+        limit = self.max_messages + self.summary_topics * 2
+
+        def read():
+            rows = list(
+                MessageModel.objects.filter(conversation__user_id=user_id)
+                .order_by('-id').values_list('role', 'content', 'topic', 'created_at')[:limit]
+            )
+            rows.reverse()
+            return rows
+
+        try:
+            rows, pending = self.buffer.read_through(read, lambda item: item[0] == user_id)
+        except Exception as e:
+            self.rehydrate_errors += 1
+            logger.warning(f"⚠️  Historique {user_id} non réhydraté: {str(e)}")
+            return
+        rows += [item[1:] for item in pending]
+        if not rows:
+            return
+        if self.idle_ttl > 0 and (timezone.now() - rows[-1][3]).total_seconds() > self.idle_ttl:
+            return
+
+        with self._lock:
+            # Réhydratée entre-temps par une requête concurrente
+            if user_id in self._sessions:
+                return
+            for role, content, topic, _ in rows[-limit:]:
+                self._append(user_id, Message(role, content, topic))
+        self.rehydrated += 1
+
+    def _flush_batch(self, batch: List):
+        self._write(batch)
+        now = time.monotonic()
+        if self.retention_days <= 0 or (self._purged_at is not None and now - self._purged_at < self.PURGE_INTERVAL):
+            return
+        self._purged_at = now
+        # Lot déjà écrit : un échec de la purge ne doit pas le remettre en attente
+        try:
+            self.purged += purge_conversations(self.retention_days)
+        except Exception as e:
+            logger.warning(f"⚠️  Purge des conversations expirées échouée: {str(e)}")
+
+    @staticmethod
+    def _write(batch: List):
+        from django.db import close_old_connections, transaction
+        from django.utils import timezone
+        from chatbot.models import Conversation, Message as MessageModel
+
+        close_old_connections()
+        started = {}
+        for user_id, _, _, _, created in batch:
+            started.setdefault(user_id, created)
+        with transaction.atomic():
+            Conversation.objects.bulk_create(
+                [Conversation(user_id=key, created_at=created, updated_at=created)
+                 for key, created in started.items()],
+                ignore_conflicts=True,
+            )
+            ids = dict(Conversation.objects.filter(user_id__in=started).values_list('user_id', 'id'))
+            MessageModel.objects.bulk_create([
+                MessageModel(conversation_id=ids[user_id], role=role, content=content, topic=topic, created_at=created)
+                for user_id, role, content, topic, created in batch
+            ])
+            Conversation.objects.filter(id__in=ids.values()).update(updated_at=timezone.now())
+
+
+def purge_conversations(retention_days: float) -> int:
+    """Supprime les conversations (et leurs messages) sans activité depuis `retention_days` jours"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from chatbot.models import Conversation
+
+    deadline = timezone.now() - timedelta(days=retention_days)
+    _, deleted = Conversation.objects.filter(updated_at__lt=deadline).delete()
+    return deleted.get('chatbot.Conversation', 0)
+
+
+def create_conversation_store(backend: str, max_messages: int, idle_ttl: float = 3600,
+                              max_users: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                              path: Optional[str] = None, summary_topics: int = 0,
+                              flush_size: int = 100, flush_interval: float = 2.0,
+                              retention_days: float = 30) -> ConversationStore:
+    """Instancie le stockage d'historique configuré"""
+    if backend == 'memory':
+        return InMemoryConversationStore(max_messages, max_users=max_users, idle_ttl=idle_ttl,
+                                         max_bytes=max_bytes, summary_topics=summary_topics)
+    if backend == 'database':
+        return DatabaseConversationStore(max_messages, max_users=max_users, idle_ttl=idle_ttl,
+                                         max_bytes=max_bytes, summary_topics=summary_topics,
+                                         flush_size=flush_size, flush_interval=flush_interval,
+                                         retention_days=retention_days)
+    if backend == 'sqlite':
+        return SQLiteConversationStore(path, max_messages, idle_ttl=idle_ttl, summary_topics=summary_topics)
+    raise ValueError(f"Stockage de conversations inconnu: {backend} (choix: {', '.join(CONVERSATION_STORES)})")
@@ -0,0 +1,86 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .text_utils import normalize_question
+
+logger = logging.getLogger(__name__)
+
+FileState = Dict[str, Tuple[int, int]]
+
+
+def entry_id(question: str, answer: str) -> int:
+    """Identifiant stable (int64 positif) dérivé du contenu de l'entrée"""
+    digest = hashlib.sha1(f"{question}\x00{answer}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+def entry_text(entry: Dict) -> str:
+    """Texte encodé pour une entrée du corpus"""
+    return f"Q: {entry['question_originale']} R: {entry['answer']}"
+
+
+def corpus_files(corpus_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(corpus_dir, '*.json')))
+
+
+def files_state(paths: List[str]) -> FileState:
+    state = {}
+    for path in paths:
+        stat = os.stat(path)
+        state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def load_corpus(paths: List[str]) -> Dict[int, Dict]:
+    """Charge les fichiers Q/R ; les doublons exacts n'apparaissent qu'une fois"""
+    entries: Dict[int, Dict] = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        source = os.path.splitext(os.path.basename(path))[0]
+        for item in data:
+            eid = entry_id(item['question'], item['answer'])
+            if eid in entries:
+                continue
+            entries[eid] = {
+                'id': eid,
+                'question_originale': item['question'],
+                'question_normalisee': normalize_question(item['question']),
+                'answer': item['answer'],
+                'source': item.get('source', source),
+            }
+
+        logger.info(f"✓ {os.path.basename(path)}: {len(data)} questions")
+    return entries
+
+
+class CorpusSnapshot:
+    """État immuable servi aux requêtes : entrées, embeddings alignés et index
+
+    RAGService remplace le snapshot d'un bloc lors d'un rechargement, une
+    recherche en cours continue donc sur un état cohérent.
+    """
+
+    def __init__(self, entries: Dict[int, Dict], ids: np.ndarray, embeddings: Optional[np.ndarray],
+                 index, files: Optional[FileState] = None):
+        self.entries = entries
+        self.ids = ids
+        self.embeddings = embeddings
+        self.index = index
+        self.files = files or {}
+        self.questions_data = list(entries.values())
+        self.rows = {int(eid): row for row, eid in enumerate(ids)}
+        # Index BM25, construit par RAGService hors du mode dense pur
+        self.lexical = None
+
+        # Question normalisée -> id ; en cas de doublon, la première entrée l'emporte
+        self.exact_index: Dict[str, int] = {}
+        for entry in self.questions_data:
+            self.exact_index.setdefault(entry['question_normalisee'], entry['id'])
@@ -0,0 +1,149 @@
+import logging
+import os
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Valeurs possibles de CHATBOT_CONFIG['EMBEDDING_BACKEND']
+EMBEDDING_BACKENDS = ('sentence_transformers', 'onnx', 'onnx_int8')
+
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_INT8_MODEL_FILE = 'model_int8.onnx'
+ONNX_TOKENIZER_FILE = 'tokenizer.json'
+
+
+class EmbeddingBackend:
+    """Interface commune des backends d'embeddings"""
+
+    name = 'base'
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def signature(self) -> str:
+        """Identifie les vecteurs produits (clé du cache d'artefacts)"""
+        return f"{self.name}:{self.model_name}"
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Modèle SentenceTransformer exécuté avec PyTorch"""
+
+    name = 'sentence_transformers'
+
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        vectors = self.model.encode(texts, show_progress_bar=show_progress_bar)
+        return np.asarray(vectors, dtype='float32')
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """Même modèle exporté en ONNX (voir `manage.py export_onnx_model`), CPU uniquement
+
+    Reproduit le pooling moyen de SentenceTransformer sur la sortie du
+    transformeur. Avec `quantized`, utilise la variante int8 (quantification
+    dynamique des poids), générée à la volée si elle n'existe pas encore.
+    """
+
+    def __init__(self, model_name: str, model_dir: str, quantized: bool = False,
+                 max_length: int = 128, batch_size: int = 32, threads: Optional[int] = None):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.name = 'onnx_int8' if quantized else 'onnx'
+        self.batch_size = batch_size
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if quantized:
+            model_path = ensure_quantized_model(model_dir)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"Modèle ONNX introuvable: {model_path} (lancer `python manage.py export_onnx_model`)"
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        logger.info(f"✓ Backend ONNX chargé ({os.path.basename(model_path)})")
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        batches = [
+            self._encode_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if not batches:
+            return np.empty((0, 0), dtype='float32')
+        return np.vstack(batches)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype='int64')
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype='int64')
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Pooling moyen pondéré par le masque, comme le module Pooling de SentenceTransformer
+        mask = attention_mask[..., None].astype('float32')
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype('float32')
+
+
+def ensure_quantized_model(model_dir: str) -> str:
+    """Chemin du modèle int8, créé depuis le modèle float32 si nécessaire
+
+    Écrit dans un fichier temporaire puis renommé : un worker qui démarre
+    en même temps ne voit jamais un modèle à moitié écrit (au pire, les
+    deux quantifient et le dernier renommage l'emporte).
+    """
+    quantized_path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE)
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("⚙️  Quantification int8 du modèle ONNX...")
+        fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix='.model_int8.', suffix='.onnx')
+        os.close(fd)
+        try:
+            quantize_dynamic(
+                os.path.join(model_dir, ONNX_MODEL_FILE),
+                tmp_path,
+                weight_type=QuantType.QInt8,
+            )
+            os.replace(tmp_path, quantized_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return quantized_path
+
+
+def create_embedding_backend(backend: str, model_name: str, model_dir: Optional[str] = None,
+                             **options) -> EmbeddingBackend:
+    """Instancie le backend configuré"""
+    if backend == 'sentence_transformers':
+        return SentenceTransformerBackend(model_name)
+    if backend in ('onnx', 'onnx_int8'):
+        return OnnxEmbeddingBackend(model_name, model_dir, quantized=backend == 'onnx_int8', **options)
+    raise ValueError(f"Backend d'embeddings inconnu: {backend} (choix: {', '.join(EMBEDDING_BACKENDS)})")
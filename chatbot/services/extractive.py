@@ -0,0 +1,86 @@
+import re
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .query_cache import QueryEmbeddingCache
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+MIN_SENTENCE_LENGTH = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if len(s.strip()) >= MIN_SENTENCE_LENGTH]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+
+class ExtractiveComposer:
+    """Réponse composée localement à partir des phrases des réponses récupérées
+
+    Les phrases des meilleures réponses sont notées par similarité cosinus
+    avec l'embedding de la question ; les meilleures (au-dessus de
+    `min_sentence_score`, sans quasi-doublons) sont assemblées dans leur
+    ordre d'origine. Retourne None si aucune phrase ne couvre la question.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], min_sentence_score: float = 0.5,
+                 max_sentences: int = 3, max_chars: int = 600, dedup_threshold: float = 0.9,
+                 cache_size: int = 4096):
+        self.encode = encode
+        self.min_sentence_score = min_sentence_score
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.dedup_threshold = dedup_threshold
+        # Les phrases viennent du corpus (ensemble fini) : leurs embeddings sont gardés
+        self.sentence_cache = QueryEmbeddingCache(cache_size)
+
+    def compose(self, query_vector: np.ndarray, results: List[Dict]) -> Optional[str]:
+        sentences = []  # (rang de la réponse, position, texte)
+        seen = set()
+        for rank, result in enumerate(results):
+            for position, sentence in enumerate(split_sentences(result['answer'])):
+                if sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append((rank, position, sentence))
+        if not sentences:
+            return None
+
+        vectors = self._sentence_vectors([text for _, _, text in sentences])
+        scores = vectors @ _normalize(query_vector).reshape(-1)
+
+        selected: List[int] = []
+        length = 0
+        for i in np.argsort(-scores):
+            if scores[i] < self.min_sentence_score or len(selected) >= self.max_sentences:
+                break
+            if any(float(vectors[i] @ vectors[j]) >= self.dedup_threshold for j in selected):
+                continue
+            text_length = len(sentences[i][2]) + 1
+            if selected and length + text_length > self.max_chars:
+                continue
+            selected.append(int(i))
+            length += text_length
+
+        if not selected:
+            return None
+        selected.sort(key=lambda i: sentences[i][:2])
+        return ' '.join(sentences[i][2] for i in selected)
+
+    def _sentence_vectors(self, texts: List[str]) -> np.ndarray:
+        vectors = {}
+        missing = []
+        for text in texts:
+            cached = self.sentence_cache.get(text)
+            if cached is None:
+                missing.append(text)
+            else:
+                vectors[text] = cached
+        if missing:
+            for text, vector in zip(missing, _normalize(self.encode(missing))):
+                self.sentence_cache.put(text, vector)
+                vectors[text] = vector
+        return np.vstack([vectors[text] for text in texts])
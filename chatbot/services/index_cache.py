@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import faiss
+
+from core.metrics import INDEX_CACHE_LOADS
+
+logger = logging.getLogger(__name__)
+
+# À incrémenter dès que le format des textes encodés ou des artefacts change
+CACHE_FORMAT_VERSION = 2
+
+
+class IndexArtifactCache:
+    """Cache disque de la matrice d'embeddings et de l'index FAISS"""
+
+    # Compteurs du processus : un démarrage = un 'hit' ou un 'rebuild'
+    stats = {'hit': 0, 'incremental': 0, 'rebuild': 0}
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def compute_key(data_files: Iterable[str], signature: str) -> str:
+        """Clé '<signature>_<contenu>' : modèle et type d'index, puis contenu des fichiers
+
+        Deux clés de même préfixe ont des embeddings compatibles, ce qui
+        permet de ne ré-encoder que les entrées modifiées.
+        """
+        signature_digest = hashlib.sha256(f"v{CACHE_FORMAT_VERSION}|{signature}".encode('utf-8'))
+        content_digest = hashlib.sha256()
+        for path in sorted(data_files):
+            content_digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    content_digest.update(chunk)
+        return f"{signature_digest.hexdigest()[:8]}_{content_digest.hexdigest()[:16]}"
+
+    def _paths(self, key: str) -> Tuple[str, str, str]:
+        return (
+            os.path.join(self.cache_dir, f"ids_{key}.npy"),
+            os.path.join(self.cache_dir, f"embeddings_{key}.npy"),
+            os.path.join(self.cache_dir, f"index_{key}.faiss"),
+        )
+
+    def load(self, key: str, mmap: bool = False,
+             with_index: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray, Optional[faiss.Index]]]:
+        """Retourne (ids, embeddings, index) si les artefacts existent pour cette clé
+
+        Avec `mmap`, la matrice est projetée en mémoire en lecture seule
+        (np.memmap) : les processus qui ouvrent le même fichier partagent
+        ses pages. Sans `with_index`, l'index FAISS n'est pas lu (None).
+        """
+        ids_path, embeddings_path, index_path = self._paths(key)
+        required = (ids_path, embeddings_path, index_path) if with_index else (ids_path, embeddings_path)
+        if not all(os.path.exists(path) for path in required):
+            return None
+
+        try:
+            ids = np.load(ids_path)
+            embeddings = np.load(embeddings_path, mmap_mode='r' if mmap else None)
+            index = faiss.read_index(index_path) if with_index else None
+        except Exception as e:
+            logger.warning(f"⚠️  Artefacts d'index illisibles ({key}): {str(e)}")
+            return None
+
+        if len(embeddings) != len(ids) or (index is not None and index.ntotal != len(ids)):
+            logger.warning(f"⚠️  Artefacts d'index incohérents ({key}), reconstruction")
+            return None
+
+        return ids, embeddings, index
+
+    def load_stale(self, key: str, **options) -> Optional[Tuple[np.ndarray, np.ndarray, Optional[faiss.Index]]]:
+        """Artefacts d'un contenu précédent de même signature, pour ne ré-encoder que le delta"""
+        if not os.path.isdir(self.cache_dir):
+            return None
+        prefix = 'ids_' + key.split('_')[0] + '_'
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.npy') and key not in name:
+                return self.load(name[len('ids_'):-len('.npy')], **options)
+        return None
+
+    def embeddings_path(self, key: str) -> str:
+        return self._paths(key)[1]
+
+    def save(self, key: str, ids: np.ndarray, embeddings: np.ndarray, index: Optional[faiss.Index] = None):
+        """Écrit les artefacts de façon atomique puis supprime les anciens
+
+        Les ids sont écrits en dernier : leur présence signale un jeu complet.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        ids_path, embeddings_path, index_path = self._paths(key)
+
+        try:
+            self._write_array(embeddings, embeddings_path)
+
+            if index is not None:
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.faiss.tmp')
+                os.close(fd)
+                faiss.write_index(index, tmp_path)
+                os.replace(tmp_path, index_path)
+
+            self._write_array(ids, ids_path)
+        except Exception as e:
+            logger.warning(f"⚠️  Impossible d'écrire le cache d'index: {str(e)}")
+            return
+
+        self._remove_stale(keep=key)
+        logger.info(f"✓ Cache d'index écrit ({key})")
+
+    def _write_array(self, array: np.ndarray, path: str):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def _remove_stale(self, keep: str):
+        for name in os.listdir(self.cache_dir):
+            if not name.startswith(('ids_', 'embeddings_', 'index_')) or keep in name:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    @classmethod
+    def record(cls, outcome: str):
+        cls.stats[outcome] = cls.stats.get(outcome, 0) + 1
+        INDEX_CACHE_LOADS.inc(outcome=outcome)
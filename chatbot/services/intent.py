@@ -0,0 +1,155 @@
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.metrics import span
+
+from .text_utils import normalize_question
+
+logger = logging.getLogger(__name__)
+
+INTENT_GREETING = 'greeting'
+INTENT_FOLLOWUP = 'followup'
+INTENT_FAQ = 'faq'
+
+GREETINGS = frozenset(["cc", "bonjour", "salut", "coucou", "hello", "akwe", "yo", "bonsoir", "hi"])
+
+# Renvoient à la conversation où qu'ils apparaissent
+ANAPHORA = [
+    'ça', 'cela', 'celui', 'celle', 'ceux', 'celles',
+    'explique', 'détaille', 'précise', 'développe',
+    'tu as dit', 'tu disais', 'tu parlais', 'tu mentionnais',
+    'précédemment', 'plus tôt', 'tantôt',
+    'je comprends pas', 'je ne comprends pas', 'pas clair',
+]
+# Indices faibles, seulement en début de question (« Et pour les hommes ? », « Pourquoi ? »)
+LEADING_WORDS = [
+    'pourquoi', 'comment', 'quand', 'où', 'combien',
+    'et', 'mais', 'donc', 'alors', 'aussi', 'encore', 'avant',
+    'il', 'elle', 'ils', 'elles', 'le', 'la', 'les',
+]
+# Questions de suivi types : centroïde de la classe « suivi »
+FOLLOWUP_PROTOTYPES = [
+    "Pourquoi ?",
+    "Explique mieux s'il te plaît",
+    "Tu peux préciser ce que tu as dit ?",
+    "Et ça, c'est grave ?",
+    "Peux-tu développer ce point ?",
+    "Je ne comprends pas, tu peux reformuler ?",
+    "Et pour les hommes ?",
+    "C'est-à-dire ?",
+    "Et ensuite, que faut-il faire ?",
+    "Comment ça ?",
+]
+
+
+def _alternation(phrases: List[str]) -> str:
+    # Les plus longues d'abord pour que « tu as dit » l'emporte sur « tu »
+    return '|'.join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+
+
+# Frontières de mots Unicode : 'et', 'la' ou 'il' ne correspondent plus à l'intérieur d'un mot
+_ANAPHORA_RE = re.compile(rf"(?<!\w)(?:{_alternation(ANAPHORA)})(?!\w)")
+_LEADING_RE = re.compile(rf"^\W*(?:{_alternation(LEADING_WORDS)})(?!\w)")
+
+
+class IntentDecision:
+    __slots__ = ('intent', 'reason', 'followup_score', 'faq_score')
+
+    def __init__(self, intent: str, reason: str, followup_score: Optional[float] = None,
+                 faq_score: Optional[float] = None):
+        self.intent = intent
+        self.reason = reason
+        self.followup_score = followup_score
+        self.faq_score = faq_score
+
+
+class IntentRouter:
+    """Classe une question en salutation, question de suivi ou question FAQ, en une passe
+
+    Salutations : ensemble de formes normalisées. Suivi : expressions
+    anaphoriques (frontières de mots, automate précompilé), puis pour les
+    cas ambigus (mot de liaison en tête, question très courte) ou sans
+    indice lexical, comparaison de l'embedding de la question, déjà
+    calculé pour la recherche, aux centroïdes « suivi » et « corpus FAQ ».
+    Une question identique à une entrée de la FAQ est classée sans encodage.
+    """
+
+    def __init__(self, rag_service, margin: float = 0.05):
+        self.rag_service = rag_service
+        self.margin = margin
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._faq_source = None
+        self._faq_centroid: Optional[np.ndarray] = None
+        self._followup_centroid: Optional[np.ndarray] = None
+        if rag_service.dense_enabled:
+            # Seul appel au modèle du routeur, au démarrage
+            self._followup_centroid = self._centroid(rag_service.embed_queries(FOLLOWUP_PROTOTYPES))
+
+    def route(self, question: str, history: List[Dict]) -> IntentDecision:
+        with span('chatbot', 'route'):
+            decision = self._decide(question, history)
+        with self._lock:
+            self.counts[decision.intent] += 1
+        scores = ''
+        if decision.followup_score is not None:
+            scores = f", suivi {decision.followup_score:.2f} / faq {decision.faq_score:.2f}"
+        logger.info(f"🧭 Intention: {decision.intent} ({decision.reason}{scores})")
+        return decision
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def _decide(self, question: str, history: List[Dict]) -> IntentDecision:
+        if normalize_question(question) in GREETINGS:
+            return IntentDecision(INTENT_GREETING, 'salutation')
+        if not history:
+            return IntentDecision(INTENT_FAQ, 'sans historique')
+
+        text = question.lower().strip()
+        anaphora = _ANAPHORA_RE.search(text)
+        if anaphora:
+            return IntentDecision(INTENT_FOLLOWUP, f"anaphore '{anaphora.group(0)}'")
+
+        leading = _LEADING_RE.match(text)
+        weak = leading is not None or len(text.split()) <= 3
+        reason = f"début '{leading.group(0).strip()}'" if leading else ('question courte' if weak else 'aucun indice')
+
+        if self._followup_centroid is None:
+            return IntentDecision(INTENT_FOLLOWUP if weak else INTENT_FAQ, reason)
+
+        # Question identique à une entrée de la FAQ : réponse exacte, pas d'encodage
+        if self.rag_service.lookup_exact(question) is not None:
+            return IntentDecision(INTENT_FAQ, 'question exacte de la FAQ')
+
+        vector = self.rag_service.embed_query(question)[0]
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        followup_score = float(vector @ self._followup_centroid)
+        faq_score = float(vector @ self._faq_centroid_for_corpus())
+        # Indice lexical : le doute profite au suivi ; sinon il faut un écart net
+        if weak:
+            is_followup = followup_score >= faq_score - self.margin
+        else:
+            is_followup = followup_score > faq_score + self.margin
+        return IntentDecision(INTENT_FOLLOWUP if is_followup else INTENT_FAQ, reason, followup_score, faq_score)
+
+    def _faq_centroid_for_corpus(self) -> np.ndarray:
+        embeddings = self.rag_service.embeddings
+        if embeddings is not self._faq_source:
+            # Corpus rechargé à chaud : centroïde recalculé une fois
+            self._faq_centroid = self._centroid(embeddings)
+            self._faq_source = embeddings
+        return self._faq_centroid
+
+    @staticmethod
+    def _centroid(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype='float32')
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        centroid = vectors.mean(axis=0)
+        return centroid / max(float(np.linalg.norm(centroid)), 1e-12)
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from .text_utils import strip_accents
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Mots vides français (sans accents, après normalisation)
+FRENCH_STOPWORDS = frozenset("""
+a ai aie aient aies ait as au aura aurai auraient aurais aurait auras aurez auriez aurions
+aurons auront aux avaient avais avait avec avez aviez avions avons ayant ayez ayons c ce
+ceci cela celle celles celui ces cet cette d dans de des du elle elles en es est et etaient
+etais etait etant ete etes etiez etions etre eu eue eues eurent eus eusse eut eux fais fait
+faut il ils j je l la le les leur leurs lui m ma mais me meme mes moi mon n ne nos notre
+nous on ont ou par pas peut peuvent plus pour puis qu quand que quel quelle quelles quels
+qui s sa sans se ses si son sont sur t ta te tes toi ton tu un une vos votre vous y
+""".split())
+
+
+def stem(token: str) -> str:
+    """Racinisation légère du français : pluriels et 'e' final"""
+    if len(token) > 4 and token[-1] in 'sx':
+        token = token[:-1]
+    if len(token) > 4 and token.endswith('e'):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenisation française : minuscules, accents retirés, élisions et mots vides filtrés"""
+    tokens = _TOKEN_RE.findall(strip_accents(text.lower()))
+    return [stem(t) for t in tokens if len(t) > 1 and t not in FRENCH_STOPWORDS]
+
+
+class BM25Index:
+    """Index inversé BM25 sur les entrées question/réponse du corpus"""
+
+    def __init__(self, documents: Iterable[Tuple[int, str, str]],
+                 k1: float = 1.5, b: float = 0.75, question_weight: int = 2):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[int] = []
+        self.question_terms: List[Counter] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        for doc_id, question, answer in documents:
+            question_tokens = tokenize(question)
+            terms = Counter(question_tokens * question_weight + tokenize(answer))
+            position = len(self.ids)
+            self.ids.append(doc_id)
+            self.question_terms.append(Counter(question_tokens))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings[term].append((position, tf))
+
+        count = len(self.ids)
+        self.avg_length = (sum(self.lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        # Terme absent du corpus (fréquence documentaire nulle) : le plus discriminant
+        self.unknown_idf = math.log(1 + (count + 0.5) / 0.5)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict], **kwargs) -> 'BM25Index':
+        return cls(((e['id'], e['question_originale'], e['answer']) for e in entries), **kwargs)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float, float]]:
+        """Retourne [(id, score BM25, similarité lexicale)] par score décroissant"""
+        query_terms = tokenize(query)
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(query_terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / self.avg_length)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (self.ids[position], score, self._similarity(query_terms, position))
+            for position, score in best
+        ]
+
+    def _similarity(self, query_terms: List[str], position: int) -> float:
+        """Recouvrement pondéré par l'IDF entre la requête et la question (Dice, dans [0, 1])"""
+        query_set = set(query_terms)
+        question_set = set(self.question_terms[position])
+        total = self._weight(query_set) + self._weight(question_set)
+        if total == 0:
+            return 0.0
+        return 2 * self._weight(query_set & question_set) / total
+
+    def _weight(self, terms) -> float:
+        # Un mot de la requête inconnu du corpus doit faire baisser la similarité
+        return sum(self.idf.get(term, self.unknown_idf) for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fusionne plusieurs classements d'ids par Reciprocal Rank Fusion"""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from core.metrics import record_chat
+
+logger = logging.getLogger(__name__)
+
+STATE_NOT_STARTED = 'not_started'
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_DEGRADED = 'degraded'
+STATE_FAILED = 'failed'
+
+SERVING_STATES = (STATE_READY, STATE_DEGRADED)
+
+LOADING_ANSWER = ("ANONTCHIGAN est en cours de démarrage. Merci de réessayer dans quelques "
+                  "instants. 🌸")
+UNAVAILABLE_ANSWER = ("Le service est momentanément indisponible. Pour toute inquiétude, "
+                      "consultez un professionnel de santé. 💗")
+
+
+class ChatbotServiceLoader:
+    """Construit ChatbotService dans un thread d'arrière-plan et expose son état
+
+    États : not_started -> loading -> ready | degraded (Groq indisponible,
+    réponses locales uniquement) | failed. Tant que le service n'est pas
+    prêt, process_question répond immédiatement sans bloquer la requête.
+    Le thread ne survit pas à un fork : ne pas utiliser `gunicorn --preload`.
+    """
+
+    def __init__(self, factory: Optional[Callable] = None):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.state = STATE_NOT_STARTED
+        self.service = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+
+    def start(self):
+        """Lance le chargement s'il n'a pas déjà commencé"""
+        with self._lock:
+            if self.state != STATE_NOT_STARTED:
+                return
+            self.state = STATE_LOADING
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._load, name='chatbot-loader', daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        logger.info("⏳ Chargement du ChatbotService en arrière-plan...")
+        try:
+            factory = self._factory
+            if factory is None:
+                from .rag_service import ChatbotService
+                factory = ChatbotService
+            service = factory()
+            self._warm(service)
+        except Exception as e:
+            logger.error(f"❌ Échec du chargement du ChatbotService: {str(e)}")
+            self.error = str(e)
+            self.state = STATE_FAILED
+            return
+        finally:
+            self.loaded_at = time.monotonic()
+
+        self.service = service
+        self.state = STATE_READY if service.groq_service.available else STATE_DEGRADED
+        logger.info(f"✓ ChatbotService {self.state} en {self.loaded_at - self.started_at:.1f}s")
+
+    @staticmethod
+    def _warm(service):
+        """Préchauffe les caches avant d'annoncer le service prêt ; un échec n'est pas bloquant"""
+        warm_start = getattr(service, 'warm_start', None)
+        if warm_start is None:
+            return
+        try:
+            warm_start()
+        except Exception as e:
+            logger.warning(f"⚠️  Préchauffage des caches ignoré: {str(e)}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin du chargement (commandes, tests) ; True si le service répond"""
+        self.start()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_serving
+
+    @property
+    def is_serving(self) -> bool:
+        return self.state in SERVING_STATES
+
+    def get_service(self):
+        """ChatbotService s'il est prêt, sinon None (démarre le chargement au besoin)"""
+        if self.state == STATE_NOT_STARTED:
+            self.start()
+        return self.service if self.is_serving else None
+
+    def process_question(self, question: str, user_id: str) -> Dict:
+        service = self.get_service()
+        if service is not None:
+            return service.process_question(question, user_id)
+        return self._not_ready_result()
+
+    async def aprocess_question(self, question: str, user_id: str) -> Dict:
+        service = self.get_service()
+        if service is not None:
+            return await service.aprocess_question(question, user_id)
+        return self._not_ready_result()
+
+    def _not_ready_result(self) -> Dict:
+        """Réponse immédiate tant que le service n'est pas prêt (comptée dans /metrics)"""
+        if self.state == STATE_FAILED:
+            result = {'answer': UNAVAILABLE_ANSWER, 'method': 'unavailable'}
+        else:
+            result = {'answer': LOADING_ANSWER, 'method': 'loading'}
+        record_chat(result['method'], 0.0)
+        return result
+
+    def status(self) -> Dict:
+        status = {
+            'state': self.state,
+            'ready': self.is_serving,
+            'error': self.error,
+        }
+        if self.started_at is not None:
+            end = self.loaded_at if self.loaded_at is not None else time.monotonic()
+            status['load_seconds'] = round(end - self.started_at, 2)
+        if self.is_serving:
+            status['health'] = self.service.get_health_status()
+        return status
+
+
+chatbot_loader = ChatbotServiceLoader()
+
+
+def preload():
+    """Lance le chargement si CHATBOT_CONFIG['PRELOAD'] est actif
+
+    Appelé par wsgi.py / asgi.py uniquement : les commandes manage.py, les
+    tests et les scripts qui font django.setup() ne chargent rien. Lit les
+    settings sans importer rag_service (ni faiss ni le modèle).
+    """
+    from django.conf import settings
+
+    if getattr(settings, 'CHATBOT_CONFIG', {}).get('PRELOAD', False):
+        chatbot_loader.start()
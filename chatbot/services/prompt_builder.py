@@ -0,0 +1,103 @@
+import logging
+import math
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Jetons ajoutés par le gabarit de chat Llama 3 autour de chaque message
+# (<|start_header_id|>rôle<|end_header_id|>\n\n ... <|eot_id|>)
+MESSAGE_OVERHEAD = 4
+# Estimation sans tokenizer : ~3 caractères par jeton pour du français avec le BPE Llama 3
+CHARS_PER_TOKEN = 3.0
+
+
+class TokenCounter:
+    """Compte les jetons avec le tokenizer Llama (tokenizer.json) ou, à défaut, par estimation"""
+
+    def __init__(self, tokenizer_path: Optional[str] = None):
+        self.tokenizer = None
+        if tokenizer_path and os.path.exists(tokenizer_path):
+            try:
+                from tokenizers import Tokenizer
+                self.tokenizer = Tokenizer.from_file(tokenizer_path)
+                logger.info(f"✓ Tokenizer du prompt chargé ({os.path.basename(tokenizer_path)})")
+            except Exception as e:
+                logger.warning(f"⚠️  Tokenizer indisponible, estimation par caractères: {str(e)}")
+        else:
+            logger.warning(f"⚠️  Tokenizer Llama absent ({tokenizer_path}) : jetons du prompt estimés par "
+                           f"caractères, budget approximatif (lancer `python manage.py fetch_prompt_tokenizer`)")
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def count_message(self, message: Dict) -> int:
+        return self.count(message['content']) + MESSAGE_OVERHEAD
+
+
+class PromptBuilder:
+    """Assemble les messages envoyés au LLM dans un budget de jetons d'entrée
+
+    Priorités : prompt système, question, éléments de contexte dans l'ordre
+    de pertinence, historique récent (les messages les plus anciens sont
+    abandonnés en premier), puis résumé des échanges plus anciens s'il
+    reste de la place. Le prompt système et la question sont
+    toujours envoyés, même s'ils dépassent seuls le budget.
+    """
+
+    def __init__(self, counter: TokenCounter, budget: int, max_history: int = 6):
+        self.counter = counter
+        self.budget = budget
+        self.max_history = max_history
+
+    def build(self, system_template: str, context_items: Sequence[str], question_message: str,
+              history: Sequence[Dict]) -> Tuple[List[Dict], Dict]:
+        """Retourne (messages, statistiques) ; `system_template` contient `{context}`"""
+        question = {"role": "user", "content": question_message}
+        used = self.counter.count_message(question)
+        used += self.counter.count_message({"role": "system", "content": system_template.format(context='')})
+
+        kept_context = []
+        for item in context_items:
+            cost = self.counter.count(item) + 1  # séparateur
+            if used + cost > self.budget:
+                break
+            kept_context.append(item)
+            used += cost
+
+        history = list(history)
+        # Le résumé des échanges anciens (message système en tête) est hors fenêtre max_history
+        summary = history.pop(0) if history and history[0].get('role') == 'system' else None
+        recent = history[-self.max_history:] if self.max_history else []
+        kept_history: List[Dict] = []
+        for message in reversed(recent):
+            cost = self.counter.count_message(message)
+            if used + cost > self.budget:
+                break
+            kept_history.append(message)
+            used += cost
+        kept_history.reverse()
+        if summary is not None and used + self.counter.count_message(summary) <= self.budget:
+            kept_history.insert(0, summary)
+            used += self.counter.count_message(summary)
+
+        system = {"role": "system", "content": system_template.format(context="\n\n".join(kept_context))}
+        messages = [system] + kept_history + [question]
+        stats = {
+            'input_tokens': sum(self.counter.count_message(m) for m in messages),
+            'budget': self.budget,
+            'exact': self.counter.exact,
+            'context_items': len(kept_context),
+            'context_available': len(context_items),
+            'history_messages': len(kept_history),
+            'history_available': len(recent),
+        }
+        return messages, stats
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    """Cache LRU borné des embeddings de requêtes"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        vector = np.asarray(vector, dtype='float32')
+        vector.flags.writeable = False
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class SearchResultCache:
+    """Cache LRU borné des résultats de recherche, valable pour un snapshot du corpus
+
+    Un rechargement du corpus remplace le snapshot : les entrées de l'ancien
+    ne sont plus jamais servies et sortent par l'LRU.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[str, int], Tuple[object, List[Dict]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, snapshot, key: str, k: int) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get((key, k))
+            if entry is None or entry[0] is not snapshot:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, k))
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, snapshot, key: str, k: int, results: List[Dict]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[(key, k)] = (snapshot, list(results))
+            self._entries.move_to_end((key, k))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        return {'size': size, 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,157 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .text_utils import normalize_query, normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Méthodes dont la réponse ne dépend que de la question : les seules utiles au préchauffage
+WARMABLE_METHODS = frozenset({'exact', 'direct', 'extractive', 'generated'})
+
+
+class QueryLog:
+    """Journal des questions, échantillonné et en ajout seul (JSON Lines)
+
+    `record` ne fait qu'un tirage et un put_nowait : la normalisation et
+    l'écriture sont faites par un thread dédié, par lots. File pleine =
+    entrée perdue (comptée dans `dropped`), jamais de blocage de la requête.
+    Les workers écrivent dans le même fichier en mode ajout, un lot par write.
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, path: str, sample_rate: float = 0.1, max_pending: int = 10000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._queue: 'queue.Queue[Tuple]' = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._writer_pid: Optional[int] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def record(self, question: str, method: str, score: Optional[float], latency: float):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((time.time(), question, method, score, latency))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_writer()
+
+    def flush(self):
+        """Attend l'écriture des entrées en attente (commandes, arrêt)"""
+        if self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def _ensure_writer(self):
+        # Un thread par processus : celui du parent ne survit pas à un fork
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            threading.Thread(target=self._run, name='chatbot-query-log', daemon=True).start()
+            if self._writer_pid is None:
+                atexit.register(self.flush)
+            self._writer_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.write_errors += 1
+                logger.warning(f"⚠️  Journal des questions non écrit: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[Tuple]):
+        lines = []
+        for ts, question, method, score, latency in batch:
+            lines.append(json.dumps({
+                'ts': round(ts, 3),
+                'question': normalize_query(question),
+                'method': method,
+                'score': None if score is None else round(float(score), 4),
+                'latency_ms': round(latency * 1000, 1),
+            }, ensure_ascii=False) + '\n')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        self.recorded += len(batch)
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'sample_rate': self.sample_rate,
+            'pending': self._queue.qsize(),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+        }
+
+
+def frequent_questions(path: str, top: int = 200, min_count: int = 2,
+                       since: Optional[float] = None) -> List[Tuple[str, int]]:
+    """Questions les plus fréquentes du journal, regroupées à la ponctuation près
+
+    Chaque groupe est représenté par sa variante la plus fréquente, telle
+    qu'elle arrive dans les caches (normalize_query).
+    """
+    groups: Dict[str, Counter] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('method') not in WARMABLE_METHODS:
+                continue
+            if since is not None and entry.get('ts', 0) < since:
+                continue
+            question = entry.get('question') or ''
+            key = normalize_question(question)
+            if key:
+                groups.setdefault(key, Counter())[question] += 1
+
+    ranked = sorted(
+        ((variants.most_common(1)[0][0], sum(variants.values())) for variants in groups.values()),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return [(question, count) for question, count in ranked if count >= min_count][:top]
+
+
+def load_warm_list(path: str) -> List[Dict]:
+    """Liste de préchauffage écrite par `build_warm_questions` ([] si absente)
+
+    Chaque élément a une `question` et, pour les plus fréquentes générées
+    avec --warm, la réponse Groq (`answer`) et son `context_key`.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Liste de préchauffage illisible ({path}): {str(e)}")
+        return []
+    return [item for item in payload.get('questions', []) if item.get('question')]
@@ -1,12 +1,37 @@
-import json
+import asyncio
 import os
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 import random
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
+
+from core.metrics import GROQ_CALLS, record_chat, span
+
+from .answer_cache import SemanticAnswerCache
+from .batching import MicroBatcher
+from .circuit_breaker import STATE_OPEN, CircuitBreaker, CircuitOpenError
+from .conversation_store import ConversationStore, create_conversation_store
+from .corpus import CorpusSnapshot, corpus_files, entry_text, files_state, load_corpus
+from .embeddings import create_embedding_backend
+from .extractive import ExtractiveComposer
+from .index_cache import IndexArtifactCache
+from .intent import INTENT_FOLLOWUP, INTENT_GREETING, IntentDecision, IntentRouter
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .prompt_builder import PromptBuilder, TokenCounter
+from .query_cache import QueryEmbeddingCache, SearchResultCache
+from .query_log import QueryLog, load_warm_list
+from .singleflight import SingleFlight
+from .streaming import StreamPostProcessor
+from .text_utils import normalize_query, normalize_question
+from .vector_index import (
+    SHARED_INDEX_TYPES, SharedFlatIndex, apply_delta, build_index, configure_search, index_signature,
+    prepare_vectors, score_vectors, to_similarity, uses_cosine,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,19 +44,67 @@ class Config:
     MAX_ANSWER_LENGTH = 600
     FAISS_RESULTS_COUNT = 3
     MIN_ANSWER_LENGTH = 30
+    EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+    QUERY_CACHE_SIZE = 1024
+    RESULT_CACHE_SIZE = 1024
+    ANSWER_CACHE_SIZE = 256
+    ANSWER_CACHE_TTL = 3600
+    ANSWER_CACHE_THRESHOLD = 0.95
+    GROQ_TIMEOUT = 10.0
+    GROQ_MAX_RETRIES = 1
+    GROQ_RETRY_BACKOFF = 0.5
+    GROQ_BREAKER_FAILURES = 3
+    GROQ_BREAKER_RECOVERY = 30.0
+    CPU_EXECUTOR_WORKERS = 4
+    PROMPT_TOKEN_BUDGET = 1800
+    REQUEST_COALESCING = True
+    EXTRACTIVE_MIN_SIMILARITY = 0.55
+    EXTRACTIVE_MIN_SENTENCE_SCORE = 0.5
+    EXTRACTIVE_MAX_SENTENCES = 3
+
+    @staticmethod
+    def get(key: str, default=None):
+        """Lit une option de settings.CHATBOT_CONFIG"""
+        from django.conf import settings
+        return getattr(settings, 'CHATBOT_CONFIG', {}).get(key, default)
 
 
 class GroqService:
     """Service de génération avec Groq"""
     
+    # Formules d'introduction retirées du début des réponses
+    UNWANTED_INTROS = (
+        'bonjour', 'salut', 'coucou', 'hello', 'akwè', 'yo', 'bonsoir', 'hi',
+        'excellente question', 'je suis ravi', 'permettez-moi'
+    )
+    
     def __init__(self):
         self.client = None
-        self.available = False
+        self.timeout = Config.get('GROQ_TIMEOUT', Config.GROQ_TIMEOUT)
+        self.max_retries = Config.get('GROQ_MAX_RETRIES', Config.GROQ_MAX_RETRIES)
+        self.retry_backoff = Config.get('GROQ_RETRY_BACKOFF', Config.GROQ_RETRY_BACKOFF)
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.get('GROQ_BREAKER_FAILURES', Config.GROQ_BREAKER_FAILURES),
+            recovery_timeout=Config.get('GROQ_BREAKER_RECOVERY', Config.GROQ_BREAKER_RECOVERY),
+        )
+        self._retryable_errors: Tuple = ()
+        self._status_errors: Tuple = ()
+        self._async_factory = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.prompt_builder = PromptBuilder(
+            TokenCounter(Config.get('PROMPT_TOKENIZER')),
+            budget=Config.get('PROMPT_TOKEN_BUDGET', Config.PROMPT_TOKEN_BUDGET),
+        )
         self._initialize_groq()
     
+    @property
+    def available(self) -> bool:
+        """Client configuré et circuit non ouvert (la disponibilité réelle se constate à l'appel)"""
+        return self.client is not None and self.breaker.state != STATE_OPEN
+    
     def _initialize_groq(self):
         try:
-            from groq import Groq
+            import groq
             from django.conf import settings
             
             api_key = getattr(settings, 'GROQ_API_KEY', None)
@@ -40,41 +113,133 @@ class GroqService:
                 logger.warning("⚠️  Clé API Groq manquante dans settings.py")
                 return
             
-            self.client = Groq(api_key=api_key)
+            base_url = getattr(settings, 'GROQ_BASE_URL', None)
+            options = {'api_key': api_key, 'base_url': base_url, 'timeout': self.timeout, 'max_retries': 0}
             
-            # Test de connexion
-            self.client.chat.completions.create(
-                messages=[{"role": "user", "content": "test"}],
-                model="llama-3.1-8b-instant",
-                max_tokens=5,
-            )
-            self.available = True
-            logger.info("✓ Service Groq initialisé")
+            # Pas d'appel de test : les nouvelles tentatives sont gérées par _create_completion
+            self.client = groq.Groq(**options)
+            self._async_factory = lambda: groq.AsyncGroq(**options)
+            # Transport, timeout, 429 et 5xx : défaillances du service (nouvelle tentative, disjoncteur)
+            self._retryable_errors = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+            self._status_errors = (groq.APIStatusError,)
+            logger.info(f"✓ Service Groq initialisé{f' ({base_url})' if base_url else ''}")
             
         except ImportError:
             logger.warning("⚠️  Bibliothèque groq non installée")
         except Exception as e:
             logger.warning(f"⚠️  Service Groq non disponible: {str(e)}")
     
+    def _create_completion(self, **params):
+        """Appel Groq protégé par le disjoncteur, avec timeout et nouvelles tentatives bornées"""
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow_request():
+                GROQ_CALLS.inc(outcome='rejected')
+                raise CircuitOpenError("Circuit Groq ouvert")
+            try:
+                with span('chatbot', 'groq_call'):
+                    response = self.client.chat.completions.create(timeout=self.timeout, **params)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            self.breaker.record_success()
+            GROQ_CALLS.inc(outcome='success')
+            return response
+    
+    async def _acreate_completion(self, **params):
+        """Équivalent asynchrone de _create_completion (AsyncGroq)"""
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow_request():
+                GROQ_CALLS.inc(outcome='rejected')
+                raise CircuitOpenError("Circuit Groq ouvert")
+            try:
+                with span('chatbot', 'groq_call'):
+                    response = await self._async_client().chat.completions.create(timeout=self.timeout, **params)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+                continue
+            self.breaker.record_success()
+            GROQ_CALLS.inc(outcome='success')
+            return response
+    
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Enregistre l'échec auprès du disjoncteur ; True si une nouvelle tentative est permise
+        
+        Seules les défaillances du service comptent pour le disjoncteur : une
+        requête refusée (4xx hors 429 : requête invalide, contexte trop long)
+        prouve au contraire que Groq répond.
+        """
+        if not isinstance(error, self._retryable_errors):
+            if isinstance(error, self._status_errors):
+                self.breaker.record_success()
+            else:
+                self.breaker.release()
+            GROQ_CALLS.inc(outcome='client_error')
+            return False
+        self.breaker.record_failure()
+        GROQ_CALLS.inc(outcome='failure')
+        if attempt == self.max_retries:
+            return False
+        logger.warning(f"⚠️  Appel Groq échoué ({str(error)}), nouvelle tentative")
+        return True
+    
+    def _async_client(self):
+        """Client AsyncGroq propre à la boucle d'événements courante (ses connexions y sont liées)
+        
+        Prévu pour un serveur ASGI : une seule boucle par worker, donc un seul
+        client et un seul pool de connexions pour toute la vie du processus.
+        Sous WSGI, chat_api passe par le pipeline synchrone (voir views.chat_api).
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_factory()
+            self._async_clients[loop] = client
+        return client
+    
     def generate_response(self, question: str, context: str, history: List[Dict]) -> str:
         """Génère une réponse complète sans coupure"""
         if not self.available:
             raise RuntimeError("Service Groq non disponible")
         
         try:
-            context_short = self._prepare_context(context)
-            messages = self._prepare_messages(question, context_short, history)
+            with span('chatbot', 'prompt_build'):
+                context_items = self._prepare_context(context)
+                messages = self._prepare_messages(question, context_items, history)
             
             logger.info("🤖 Génération avec Groq...")
             
-            response = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=messages,
-                max_tokens=600,
-                temperature=0.7,
-                top_p=0.9,
-            )
+            response = self._create_completion(messages=messages, **self._completion_params())
+            return self._finalize_answer(response)
             
+        except Exception as e:
+            logger.error(f"❌ Erreur Groq: {str(e)}")
+            raise
+    
+    async def agenerate_response(self, question: str, context: str, history: List[Dict]) -> str:
+        """Version asynchrone de generate_response : aucun thread bloqué pendant l'appel"""
+        if not self.available or self._async_factory is None:
+            raise RuntimeError("Service Groq non disponible")
+        
+        try:
+            with span('chatbot', 'prompt_build'):
+                context_items = self._prepare_context(context)
+                messages = self._prepare_messages(question, context_items, history)
+            
+            logger.info("🤖 Génération asynchrone avec Groq...")
+            
+            response = await self._acreate_completion(messages=messages, **self._completion_params())
+            return self._finalize_answer(response)
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur Groq: {str(e)}")
+            raise
+    
+    def _finalize_answer(self, response) -> str:
+        with span('chatbot', 'post_process'):
             answer = response.choices[0].message.content.strip()
             answer = self._clean_response(answer)
             
@@ -82,20 +247,65 @@ class GroqService:
                 raise ValueError("Réponse trop courte")
                 
             answer = self._ensure_complete_response(answer)
+        
+        logger.info(f"✓ Réponse générée ({len(answer)} caractères)")
+        return answer
+    
+    def stream_response(self, question: str, context: str, history: List[Dict]) -> Iterator[str]:
+        """Génère la réponse en streaming, nettoyée au fil de l'eau"""
+        if not self.available:
+            raise RuntimeError("Service Groq non disponible")
+        
+        try:
+            with span('chatbot', 'prompt_build'):
+                context_items = self._prepare_context(context)
+                messages = self._prepare_messages(question, context_items, history)
             
-            logger.info(f"✓ Réponse générée ({len(answer)} caractères)")
-            return answer
+            logger.info("🤖 Génération en streaming avec Groq...")
+            
+            stream = self._create_completion(messages=messages, stream=True, **self._completion_params())
+            processor = StreamPostProcessor(self.UNWANTED_INTROS, self._ensure_complete_response)
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    text = processor.feed(chunk.choices[0].delta.content or '')
+                    if text:
+                        yield text
+            except Exception:
+                # Flux interrompu en cours de route : compte comme un échec du service
+                self.breaker.record_failure()
+                raise
+            
+            text = processor.finish()
+            if text:
+                yield text
+            
+            # Déjà envoyée : une réponse trop courte est seulement signalée
+            if not self._is_valid_answer(processor.text):
+                logger.warning("⚠️  Réponse streamée trop courte")
+            logger.info(f"✓ Réponse streamée ({len(processor.text)} caractères)")
             
         except Exception as e:
             logger.error(f"❌ Erreur Groq: {str(e)}")
             raise
     
-    def _prepare_context(self, context: str) -> str:
-        lines = context.split('\n')[:5]
-        context_short = '\n'.join(lines)
-        if len(context_short) > Config.MAX_CONTEXT_LENGTH:
-            context_short = context_short[:Config.MAX_CONTEXT_LENGTH-3] + "..."
-        return context_short
+    @staticmethod
+    def _completion_params() -> Dict:
+        return {
+            'model': "llama-3.1-8b-instant",
+            'max_tokens': 600,
+            'temperature': 0.7,
+            'top_p': 0.9,
+        }
+    
+    def _prepare_context(self, context: str) -> List[str]:
+        """Éléments du contexte, du plus pertinent au moins pertinent (le budget de jetons fait le tri)"""
+        items = [item for item in context.split('\n\n') if item.strip()]
+        return [
+            item if len(item) <= Config.MAX_CONTEXT_LENGTH else item[:Config.MAX_CONTEXT_LENGTH-3] + "..."
+            for item in items
+        ]
     
 
 
@@ -165,8 +375,9 @@ class GroqService:
 
 
 
-    def _prepare_messages(self, question: str, context: str, history: List[Dict]) -> List[Dict]:
-        system_prompt = f"""Tu es ANONTCHIGAN, assistante IA professionnelle spécialisée dans la sensibilisation au cancer du sein au Bénin.
+    def _prepare_messages(self, question: str, context: List[str], history: List[Dict]) -> List[Dict]:
+        # Gabarit : {context} est rempli par le PromptBuilder selon le budget de jetons
+        system_prompt = """Tu es ANONTCHIGAN, assistante IA professionnelle spécialisée dans la sensibilisation au cancer du sein au Bénin.
 
     CONTEXTE À UTILISER :
     {context}
@@ -209,29 +420,25 @@ class GroqService:
     - Ne coupe PAS en milieu de phrase
     - Termine par un point final"""
 
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Inclure historique récent
-        history_to_include = history[-6:] if len(history) > 6 else history
-        for msg in history_to_include:
-            messages.append(msg)
-        
-        messages.append({
-            "role": "user", 
-            "content": f"QUESTION: {question}\n\nRéponds de façon COMPLÈTE. Tiens compte de notre conversation si pertinent. Utilise 'Atassa!' si approprié pour l'humour ou l'étonnement."
-        })
+        messages, stats = self.prompt_builder.build(
+            system_prompt,
+            context,
+            f"QUESTION: {question}\n\nRéponds de façon COMPLÈTE. Tiens compte de notre conversation si pertinent. Utilise 'Atassa!' si approprié pour l'humour ou l'étonnement.",
+            history,
+        )
         
+        logger.info(
+            f"🧮 Prompt: {stats['input_tokens']} jetons en entrée"
+            f"{'' if stats['exact'] else ' (estimés)'} / budget {stats['budget']}, "
+            f"contexte {stats['context_items']}/{stats['context_available']}, "
+            f"historique {stats['history_messages']}/{stats['history_available']}"
+        )
         return messages
 
     
     def _clean_response(self, answer: str) -> str:
-        unwanted_intros = [
-            'bonjour', 'salut', 'coucou', 'hello', 'akwè', 'yo', 'bonsoir', 'hi',
-            'excellente question', 'je suis ravi', 'permettez-moi'
-        ]
-        
         answer_lower = answer.lower()
-        for phrase in unwanted_intros:
+        for phrase in self.UNWANTED_INTROS:
             if answer_lower.startswith(phrase):
                 sentences = answer.split('.')
                 if len(sentences) > 1:
@@ -282,28 +489,60 @@ class RAGService:
     def __init__(self):
         from django.conf import settings
         
-        self.questions_data = []
         self.embedding_model = None
-        self.index = None
-        self.embeddings = None
+        self.index_cache_status = None
+        self._snapshot: Optional[CorpusSnapshot] = None
+        self._reload_lock = threading.Lock()
+        
+        self.model_name = Config.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL)
+        # 'dense' (FAISS), 'hybrid' (FAISS + BM25) ou 'lexical' (BM25 seul, sans modèle)
+        self.retrieval_mode = Config.get('RETRIEVAL_MODE', 'dense')
+        self.dense_enabled = self.retrieval_mode != 'lexical'
+        self.rrf_k = Config.get('RRF_K', 60)
+        self.index_type = Config.get('INDEX_TYPE', 'flat_l2')
+        self.index_params = Config.get('INDEX_PARAMS', {}).get(self.index_type, {})
+        # Matrice d'embeddings partagée entre workers (np.memmap) et stockée en float16/float32
+        self.mmap_embeddings = Config.get('EMBEDDING_MMAP', False)
+        self.store_dtype = Config.get('EMBEDDING_STORE_DTYPE', 'float32')
+        self.shared_flat = self.mmap_embeddings and self.index_type in SHARED_INDEX_TYPES
+        self.corpus_dir = Config.get('CORPUS_DIR', os.path.join(settings.BASE_DIR, 'chatbot', 'data'))
+        cache_dir = Config.get('INDEX_CACHE_DIR', os.path.join(settings.BASE_DIR, 'chatbot', 'cache'))
+        self.artifact_cache = IndexArtifactCache(cache_dir)
+        self.query_cache = QueryEmbeddingCache(Config.get('QUERY_CACHE_SIZE', Config.QUERY_CACHE_SIZE))
+        self.result_cache = SearchResultCache(Config.get('RESULT_CACHE_SIZE', Config.RESULT_CACHE_SIZE))
+        
+        self.batcher = None
+        if Config.get('MICRO_BATCHING', False):
+            self.batcher = MicroBatcher(
+                self._search_batch,
+                max_batch_size=Config.get('MICRO_BATCH_MAX_SIZE', 32),
+                max_wait_ms=Config.get('MICRO_BATCH_WAIT_MS', 5),
+                name='rag-micro-batcher',
+            )
         
-        data_path = os.path.join(settings.BASE_DIR, 'chatbot', 'data', 'cancer_sein.json')
-        self._load_data(data_path)
         self._initialize_embeddings()
+        
+        reload_interval = Config.get('CORPUS_RELOAD_INTERVAL', 0)
+        if reload_interval > 0:
+            self._start_watcher(reload_interval)
     
-    def _load_data(self, data_file: str):
+    @property
+    def questions_data(self) -> List[Dict]:
+        return self._snapshot.questions_data
+    
+    @property
+    def index(self):
+        return self._snapshot.index
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._snapshot.embeddings
+    
+    def _load_data(self, data_files: List[str]) -> Dict[int, Dict]:
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            for item in data:
-                self.questions_data.append({
-                    'question_originale': item['question'],
-                    'question_normalisee': item['question'].lower().strip(),
-                    'answer': item['answer']
-                })
-            
-            logger.info(f"✓ {len(self.questions_data)} questions chargées")
+            entries = load_corpus(data_files)
+            logger.info(f"✓ {len(entries)} questions chargées ({len(data_files)} fichiers)")
+            return entries
             
         except Exception as e:
             logger.error(f"❌ Erreur chargement données: {str(e)}")
@@ -311,74 +550,378 @@ class RAGService:
     
     def _initialize_embeddings(self):
         try:
-            self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-            
-            all_texts = [
-                f"Q: {item['question_originale']} R: {item['answer']}"
-                for item in self.questions_data
-            ]
-            
-            self.embeddings = self.embedding_model.encode(all_texts, show_progress_bar=False)
-            self.embeddings = np.array(self.embeddings).astype('float32')
-            
-            dimension = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(self.embeddings)
-            
-            logger.info(f"✓ Index FAISS créé ({len(self.embeddings)} vecteurs)")
+            if self.dense_enabled:
+                self.embedding_model = create_embedding_backend(
+                    Config.get('EMBEDDING_BACKEND', 'sentence_transformers'),
+                    self.model_name,
+                    model_dir=Config.get('ONNX_MODEL_DIR'),
+                    **Config.get('ONNX_OPTIONS', {}),
+                )
+            else:
+                logger.info("ℹ️  Mode lexical : modèle d'embeddings non chargé")
+            self._snapshot = self._build_snapshot(previous=None)
             
         except Exception as e:
             logger.error(f"❌ Erreur initialisation embeddings: {str(e)}")
             raise
     
+    def _build_snapshot(self, previous: Optional[CorpusSnapshot]) -> CorpusSnapshot:
+        """Charge le corpus et produit un snapshot, en ré-encodant le moins possible"""
+        data_files = corpus_files(self.corpus_dir)
+        if not data_files:
+            raise FileNotFoundError(f"Aucun fichier de corpus dans {self.corpus_dir}")
+        
+        # L'état est relevé avant la lecture : une écriture concurrente sera vue au prochain passage
+        state = files_state(data_files)
+        entries = self._load_data(data_files)
+        
+        if self.dense_enabled:
+            snapshot = self._build_dense_snapshot(data_files, entries, state, previous)
+        else:
+            ids = np.fromiter(entries.keys(), dtype='int64', count=len(entries))
+            snapshot = CorpusSnapshot(entries, ids, None, None, state)
+        
+        if self.retrieval_mode != 'dense':
+            snapshot.lexical = BM25Index.from_entries(snapshot.questions_data)
+        return snapshot
+    
+    def _build_dense_snapshot(self, data_files: List[str], entries: Dict[int, Dict], state,
+                              previous: Optional[CorpusSnapshot]) -> CorpusSnapshot:
+        signature = (f"{self.embedding_model.signature}|{index_signature(self.index_type, self.index_params)}"
+                     f"|{self.store_dtype}{'|shared' if self.shared_flat else ''}")
+        cache_key = IndexArtifactCache.compute_key(data_files, signature)
+        load_options = {'mmap': self.mmap_embeddings, 'with_index': not self.shared_flat}
+        
+        if previous is None:
+            cached = self.artifact_cache.load(cache_key, **load_options)
+            if cached is not None:
+                ids, embeddings, index = cached
+                self.index_cache_status = 'hit'
+                IndexArtifactCache.record('hit')
+                logger.info(f"✓ Index FAISS chargé depuis le cache ({len(ids)} vecteurs)")
+                return CorpusSnapshot(entries, ids, embeddings, self._restore_index(ids, embeddings, index), state)
+            
+            stale = self.artifact_cache.load_stale(cache_key, **load_options)
+            if stale is not None:
+                ids, embeddings, index = stale
+                previous = CorpusSnapshot({}, ids, embeddings, self._restore_index(ids, embeddings, index))
+        
+        snapshot, outcome = self._apply_changes(entries, previous, state)
+        self.index_cache_status = outcome
+        IndexArtifactCache.record(outcome)
+        self.artifact_cache.save(
+            cache_key, snapshot.ids, snapshot.embeddings.astype(self.store_dtype, copy=False),
+            None if self.shared_flat else snapshot.index,
+        )
+        
+        if self.mmap_embeddings:
+            # On sert la version disque partagée plutôt que la copie privée qui vient d'être calculée
+            reopened = self.artifact_cache.load(cache_key, mmap=True, with_index=False)
+            if reopened is not None:
+                ids, embeddings, _ = reopened
+                index = SharedFlatIndex(embeddings, ids, self.index_type) if self.shared_flat else snapshot.index
+                snapshot = CorpusSnapshot(entries, ids, embeddings, index, state)
+        return snapshot
+    
+    def _restore_index(self, ids: np.ndarray, embeddings: np.ndarray, index):
+        if self.shared_flat:
+            return SharedFlatIndex(embeddings, ids, self.index_type)
+        configure_search(index, self.index_type, self.index_params)
+        return index
+    
+    def _make_index(self, embeddings: np.ndarray, ids: np.ndarray):
+        if self.shared_flat:
+            return SharedFlatIndex(embeddings, ids, self.index_type)
+        vectors = np.ascontiguousarray(embeddings, dtype='float32')
+        return build_index(vectors, self.index_type, self.index_params, ids=ids)
+    
+    def _apply_changes(self, entries: Dict[int, Dict], previous: Optional[CorpusSnapshot],
+                       state) -> Tuple[CorpusSnapshot, str]:
+        ids = np.fromiter(entries.keys(), dtype='int64', count=len(entries))
+        
+        if previous is None:
+            embeddings = self._encode_entries(list(entries.values()))
+            index = self._make_index(embeddings, ids)
+            logger.info(f"✓ Index FAISS {self.index_type} créé ({len(ids)} vecteurs)")
+            return CorpusSnapshot(entries, ids, embeddings, index, state), 'rebuild'
+        
+        known = set(previous.ids.tolist())
+        added_ids = np.array([eid for eid in entries if eid not in known], dtype='int64')
+        keep_mask = np.isin(previous.ids, ids)
+        removed_ids = previous.ids[~keep_mask]
+        
+        added_vectors = self._encode_entries([entries[eid] for eid in added_ids.tolist()])
+        if not len(added_vectors):
+            added_vectors = np.empty((0, previous.embeddings.shape[1]), dtype='float32')
+        
+        new_ids = np.concatenate([previous.ids[keep_mask], added_ids])
+        embeddings = np.vstack([previous.embeddings[keep_mask], added_vectors]).astype('float32', copy=False)
+        
+        index = None
+        if not self.shared_flat:
+            index = apply_delta(previous.index, self.index_type, self.index_params,
+                                removed_ids, added_vectors, added_ids)
+        if index is None:
+            index = self._make_index(embeddings, new_ids)
+        
+        logger.info(f"✓ Index FAISS mis à jour (+{len(added_ids)} / -{len(removed_ids)} entrées)")
+        return CorpusSnapshot(entries, new_ids, embeddings, index, state), 'incremental'
+    
+    def _encode_entries(self, entries: List[Dict]) -> np.ndarray:
+        if not entries:
+            return np.empty((0, 0), dtype='float32')
+        vectors = self.embedding_model.encode([entry_text(e) for e in entries], show_progress_bar=False)
+        return prepare_vectors(vectors, self.index_type)
+    
+    def reload(self) -> bool:
+        """Recharge le corpus si un fichier a changé ; True si un nouvel index est servi"""
+        with self._reload_lock:
+            current = self._snapshot
+            if files_state(corpus_files(self.corpus_dir)) == current.files:
+                return False
+            
+            try:
+                self._snapshot = self._build_snapshot(previous=current)
+            except Exception as e:
+                logger.error(f"❌ Rechargement du corpus échoué: {str(e)}")
+                return False
+            
+            logger.info("🔄 Corpus rechargé")
+            return True
+    
+    def _start_watcher(self, interval: float):
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"❌ Surveillance du corpus: {str(e)}")
+        
+        threading.Thread(target=watch, name='rag-corpus-watcher', daemon=True).start()
+    
+    def lookup_exact(self, question: str) -> Optional[Dict]:
+        """Entrée dont la question normalisée est identique, sans appel au modèle"""
+        snapshot = self._snapshot
+        with span('chatbot', 'normalize'):
+            key = normalize_question(question)
+        eid = snapshot.exact_index.get(key)
+        if eid is None:
+            return None
+        return self._result(snapshot.entries[eid], 1.0, 0.0)
+    
+    @staticmethod
+    def _result(entry: Dict, similarity: float, distance, **extra) -> Dict:
+        return {
+            'id': entry['id'],
+            'question': entry['question_originale'],
+            'answer': entry['answer'],
+            'source': entry['source'],
+            'similarity': similarity,
+            'distance': distance,
+            **extra
+        }
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embedding (1, d) de la requête, servi depuis le cache LRU si possible"""
+        return self.embed_queries([query])
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings (n, d) des requêtes, les absentes du cache en une seule passe"""
+        keys = [normalize_query(q) for q in queries]
+        vectors: Dict[str, np.ndarray] = {}
+        to_encode: Dict[str, str] = {}
+        
+        for key, query in zip(keys, queries):
+            if key in vectors or key in to_encode:
+                continue
+            cached = self.query_cache.get(key)
+            if cached is None:
+                to_encode[key] = query
+            else:
+                vectors[key] = cached
+        
+        if to_encode:
+            with span('chatbot', 'embed'):
+                encoded = self.embedding_model.encode(list(to_encode.values()), show_progress_bar=False)
+            encoded = np.array(encoded).astype('float32')
+            for key, vector in zip(to_encode, encoded):
+                vectors[key] = vector.reshape(1, -1)
+                self.query_cache.put(key, vectors[key])
+        
+        return np.vstack([vectors[key] for key in keys])
+    
     def search(self, query: str, k: int = Config.FAISS_RESULTS_COUNT) -> List[Dict]:
+        if self.batcher is not None:
+            try:
+                return self.batcher.submit((query, k))
+            except Exception as e:
+                logger.error(f"❌ Erreur recherche FAISS: {str(e)}")
+                return []
+        return self.search_many([query], k)[0]
+    
+    def search_many(self, queries: List[str], k: int = Config.FAISS_RESULTS_COUNT) -> List[List[Dict]]:
+        """Recherche groupée : un seul encodage et un seul appel FAISS"""
+        if not queries:
+            return []
+        
         try:
-            query_embedding = self.embedding_model.encode([query])
-            query_embedding = np.array(query_embedding).astype('float32')
-            
-            distances, indices = self.index.search(query_embedding, k)
-            
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.questions_data):
-                    similarity = 1 / (1 + distances[0][i])
-                    results.append({
-                        'question': self.questions_data[idx]['question_originale'],
-                        'answer': self.questions_data[idx]['answer'],
-                        'similarity': similarity,
-                        'distance': distances[0][i]
-                    })
-            
+            snapshot = self._snapshot
+            keys = [normalize_query(query) for query in queries]
+            results = [self.result_cache.get(snapshot, key, k) for key in keys]
+            missing = [row for row, found in enumerate(results) if found is None]
+            if missing:
+                fresh = self._search_snapshot(snapshot, [queries[row] for row in missing], k)
+                for row, found in zip(missing, fresh):
+                    results[row] = found
+                    self.result_cache.put(snapshot, keys[row], k, found)
             return results
             
         except Exception as e:
             logger.error(f"❌ Erreur recherche FAISS: {str(e)}")
-            return []
+            return [[] for _ in queries]
+    
+    def _search_snapshot(self, snapshot: CorpusSnapshot, queries: List[str], k: int) -> List[List[Dict]]:
+        if not self.dense_enabled:
+            with span('chatbot', 'lexical_search'):
+                return [self._lexical_search(snapshot, query, k) for query in queries]
+        
+        query_embeddings = self.embed_queries(queries)
+        if uses_cosine(self.index_type):
+            query_embeddings = prepare_vectors(query_embeddings, self.index_type)
+        
+        hybrid = self.retrieval_mode == 'hybrid'
+        fetch = max(k, Config.get('HYBRID_CANDIDATES', 10)) if hybrid else k
+        with span('chatbot', 'faiss_search'):
+            distances, ids = snapshot.index.search(query_embeddings, fetch)
+        
+        results = []
+        for row, query in enumerate(queries):
+            dense = self._format_results(snapshot, distances[row], ids[row])
+            if hybrid:
+                with span('chatbot', 'hybrid_fusion'):
+                    dense = self._fuse(snapshot, query, query_embeddings[row], dense, fetch)
+            results.append(dense[:k])
+        return results
+    
+    def _format_results(self, snapshot: CorpusSnapshot, distances: np.ndarray,
+                        ids: np.ndarray) -> List[Dict]:
+        results = []
+        similarities = to_similarity(distances, self.index_type)
+        for i, eid in enumerate(ids):
+            entry = snapshot.entries.get(int(eid))
+            if entry is not None:
+                results.append(self._result(entry, similarities[i], distances[i]))
+        return results
+    
+    def _lexical_search(self, snapshot: CorpusSnapshot, query: str, k: int) -> List[Dict]:
+        return [
+            self._result(snapshot.entries[eid], similarity, None, bm25_score=score)
+            for eid, score, similarity in snapshot.lexical.search(query, k)
+        ]
+    
+    def _fuse(self, snapshot: CorpusSnapshot, query: str, query_vector: np.ndarray,
+              dense: List[Dict], k: int) -> List[Dict]:
+        """Fusion RRF des résultats FAISS et BM25 ; 'similarity' reste le score dense"""
+        lexical_hits = snapshot.lexical.search(query, k)
+        bm25_scores = {eid: score for eid, score, _ in lexical_hits}
+        by_id = {result['id']: result for result in dense}
+        
+        fused = reciprocal_rank_fusion(
+            [[result['id'] for result in dense], [eid for eid, _, _ in lexical_hits]],
+            k=self.rrf_k,
+        )
+        
+        results = []
+        for eid, rrf_score in fused[:k]:
+            result = by_id.get(eid)
+            if result is None:
+                # Trouvé par BM25 seulement : score dense recalculé depuis les embeddings du snapshot
+                row = snapshot.rows[eid]
+                raw = score_vectors(query_vector, snapshot.embeddings[row:row + 1], self.index_type)
+                result = self._result(snapshot.entries[eid], to_similarity(raw, self.index_type)[0], raw[0])
+            result['rrf_score'] = rrf_score
+            if eid in bm25_scores:
+                result['bm25_score'] = bm25_scores[eid]
+            results.append(result)
+        return results
+    
+    def _search_batch(self, items: List) -> List[List[Dict]]:
+        """Point d'entrée du micro-batching : items = [(query, k), ...]"""
+        max_k = max(k for _, k in items)
+        results = self.search_many([query for query, _ in items], max_k)
+        return [found[:k] for found, (_, k) in zip(results, items)]
 
 
 class ConversationManager:
-    """Gestionnaire de conversations"""
+    """Gestionnaire de conversations
     
-    def __init__(self):
-        self.conversations: Dict[str, List[Dict]] = {}
+    L'historique est délégué à un ConversationStore : 'memory' (propre au
+    processus, borné), 'sqlite' (partagé par les workers de la machine) ou
+    'database' (mémoire + modèles Conversation/Message écrits en différé).
+    Avec HISTORY_SUMMARY, seuls les HISTORY_SUMMARY_TURNS derniers échanges
+    sont gardés tels quels ; les plus anciens sont remplacés par un résumé
+    construit à partir des questions du corpus qui leur correspondaient.
+    """
+    
+    def __init__(self, store: Optional[ConversationStore] = None):
+        if Config.get('HISTORY_SUMMARY', False):
+            max_messages = Config.get('HISTORY_SUMMARY_TURNS', 4) * 2
+            summary_topics = Config.get('HISTORY_SUMMARY_TOPICS', 5)
+        else:
+            max_messages = Config.MAX_HISTORY_LENGTH * 2
+            summary_topics = 0
+        self.store = store or create_conversation_store(
+            Config.get('CONVERSATION_STORE', 'memory'),
+            max_messages,
+            idle_ttl=Config.get('CONVERSATION_IDLE_TTL', 3600),
+            max_users=Config.get('CONVERSATION_MAX_USERS', 10000),
+            max_bytes=Config.get('CONVERSATION_MAX_MB', 64) * 1024 * 1024,
+            path=Config.get('CONVERSATION_DB'),
+            summary_topics=summary_topics,
+            flush_size=Config.get('CONVERSATION_FLUSH_SIZE', 100),
+            flush_interval=Config.get('CONVERSATION_FLUSH_INTERVAL', 2.0),
+            retention_days=Config.get('CONVERSATION_RETENTION_DAYS', 30),
+        )
     
     def get_history(self, user_id: str) -> List[Dict]:
-        return self.conversations.get(user_id, [])
+        return self.store.get_history(user_id)
     
-    def add_message(self, user_id: str, role: str, content: str):
-        if user_id not in self.conversations:
-            self.conversations[user_id] = []
-        
-        self.conversations[user_id].append({"role": role, "content": content})
-        
-        if len(self.conversations[user_id]) > Config.MAX_HISTORY_LENGTH * 2:
-            self.conversations[user_id] = self.conversations[user_id][-Config.MAX_HISTORY_LENGTH * 2:]
+    def add_message(self, user_id: str, role: str, content: str, topic: Optional[str] = None):
+        self.store.add_message(user_id, role, content, topic)
+    
+    def stats(self) -> Dict:
+        return self.store.stats()
+
+
 
 
 
 
 
 
+class GenerationRequest:
+    """Réponse à faire générer par Groq, avec ses réponses de repli"""
+    
+    def __init__(self, question: str, context: str, history: List[Dict], method: str,
+                 score: Optional[float], fallback: str, error_fallback: str, context_key: Tuple = (),
+                 topic: Optional[str] = None):
+        self.question = question
+        self.context = context
+        self.history = history
+        self.method = method
+        self.score = score
+        self.fallback = fallback
+        self.error_fallback = error_fallback
+        # Identifie le contexte fourni au LLM (clé du cache sémantique des réponses) :
+        # l'historique entre dans le prompt, une réponse façonnée par la conversation
+        # d'un utilisateur ne doit pas être servie à un autre
+        self.context_key = (method,) + tuple(context_key)
+        if history:
+            self.context_key += (hash(tuple((msg['role'], msg['content']) for msg in history)),)
+        # Question du corpus la plus proche (résumé glissant de l'historique)
+        self.topic = topic
+        self.embedding: Optional[np.ndarray] = None
 
 
 class ChatbotService:
@@ -388,180 +931,450 @@ class ChatbotService:
         self.groq_service = GroqService()
         self.rag_service = RAGService()
         self.conversation_manager = ConversationManager()
+        self.answer_cache = SemanticAnswerCache(
+            max_size=Config.get('ANSWER_CACHE_SIZE', Config.ANSWER_CACHE_SIZE),
+            ttl=Config.get('ANSWER_CACHE_TTL', Config.ANSWER_CACHE_TTL),
+            threshold=Config.get('ANSWER_CACHE_THRESHOLD', Config.ANSWER_CACHE_THRESHOLD),
+        )
+        self.router = IntentRouter(self.rag_service, margin=Config.get('INTENT_MARGIN', 0.05))
+        # Bande de similarité [EXTRACTIVE_MIN_SIMILARITY, SIMILARITY_THRESHOLD[ : réponse composée localement
+        self.composer = None
+        if Config.get('EXTRACTIVE_COMPOSER', True) and self.rag_service.dense_enabled:
+            self.composer = ExtractiveComposer(
+                lambda texts: self.rag_service.embedding_model.encode(texts, show_progress_bar=False),
+                min_sentence_score=Config.get('EXTRACTIVE_MIN_SENTENCE_SCORE', Config.EXTRACTIVE_MIN_SENTENCE_SCORE),
+                max_sentences=Config.get('EXTRACTIVE_MAX_SENTENCES', Config.EXTRACTIVE_MAX_SENTENCES),
+                max_chars=Config.MAX_ANSWER_LENGTH,
+            )
+        self.extractive_min_similarity = Config.get('EXTRACTIVE_MIN_SIMILARITY', Config.EXTRACTIVE_MIN_SIMILARITY)
+        # Seuil de réponse directe, en similarité cosinus (voir INDEX_TYPE)
+        self.similarity_threshold = Config.get('SIMILARITY_THRESHOLD', Config.SIMILARITY_THRESHOLD)
+        # Questions identiques simultanées : un seul calcul partagé
+        self.single_flight = SingleFlight() if Config.get('REQUEST_COALESCING', Config.REQUEST_COALESCING) else None
+        # Embeddings et recherche FAISS (CPU) des requêtes asynchrones
+        self.cpu_executor = ThreadPoolExecutor(
+            max_workers=Config.get('CPU_EXECUTOR_WORKERS', Config.CPU_EXECUTOR_WORKERS),
+            thread_name_prefix='chatbot-cpu',
+        )
+        # Échantillon des questions reçues, miné par `build_warm_questions`
+        self.query_log = None
+        if Config.get('QUERY_LOG', False) and Config.get('QUERY_LOG_PATH'):
+            self.query_log = QueryLog(
+                Config.get('QUERY_LOG_PATH'),
+                sample_rate=Config.get('QUERY_LOG_SAMPLE_RATE', 0.1),
+            )
         logger.info("✓ ChatbotService initialisé")
     
+    def warm_start(self) -> Optional[Dict]:
+        """Préchauffe les caches avec la liste WARM_QUESTIONS_FILE, si elle existe"""
+        path = Config.get('WARM_QUESTIONS_FILE')
+        items = load_warm_list(path)[:Config.get('WARM_MAX_QUESTIONS', 200)] if path else []
+        if not items:
+            return None
+        answers = {item['question']: item for item in items if item.get('answer')}
+        return self.warm_up([item['question'] for item in items], answers)
+    
+    def warm_up(self, questions: List[str], answers: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Remplit les caches d'embeddings, de recherche et de réponses générées
+        
+        Embeddings et recherches en un seul lot. Aucun appel à Groq : les
+        réponses de `answers` (générées une fois par `build_warm_questions
+        --warm`) sont remises dans le cache sémantique si le contexte récupéré
+        est toujours le même. Rien n'est enregistré dans les conversations ni
+        le journal des questions ; les métriques comptent les étapes
+        d'encodage et de recherche et les décisions du routeur.
+        """
+        started = time.perf_counter()
+        self.rag_service.search_many(questions)
+        
+        preloaded = 0
+        if answers and self.answer_cache.enabled and self.rag_service.dense_enabled:
+            for question in questions:
+                stored = answers.get(question)
+                request = self._warm_request(question) if stored else None
+                if request is None or list(request.context_key) != stored.get('context_key'):
+                    continue
+                request.embedding = self.rag_service.embed_query(question)[0]
+                self._cache_answer(request, stored['answer'])
+                preloaded += 1
+        
+        stats = {
+            'questions': len(questions),
+            'preloaded': preloaded,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"🔥 Caches préchauffés: {stats['questions']} questions, "
+                    f"{stats['preloaded']} réponses remises en cache en {stats['seconds']}s")
+        return stats
+    
+    def generate_warm_answers(self, questions: List[str]) -> List[Dict]:
+        """Réponses Groq des questions à générer, pour la liste de préchauffage
+        
+        Appelé une fois par `build_warm_questions --warm` : les workers
+        relisent ces réponses au démarrage au lieu de rappeler Groq.
+        """
+        if not self.groq_service.available:
+            return []
+        requests = [request for request in map(self._warm_request, questions) if request is not None]
+        
+        def generate(request: GenerationRequest) -> Optional[str]:
+            try:
+                return self.groq_service.generate_response(request.question, request.context, request.history)
+            except Exception as e:
+                logger.warning(f"⚠️  Réponse de préchauffage non générée: {str(e)}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix='chatbot-warmup') as pool:
+            generated = list(pool.map(generate, requests))
+        return [
+            {'question': request.question, 'answer': answer, 'context_key': list(request.context_key)}
+            for request, answer in zip(requests, generated) if answer
+        ]
+    
+    def _warm_request(self, question: str) -> Optional[GenerationRequest]:
+        prepared = self._prepare(question, 'warmup', [], self.router.route(question, []))
+        return prepared if isinstance(prepared, GenerationRequest) else None
+    
+    def _observe(self, question: str, result: Dict, elapsed: float):
+        record_chat(result['method'], elapsed)
+        if self.query_log is not None:
+            self.query_log.record(question, result['method'], result.get('score'), elapsed)
+    
     def process_question(self, question: str, user_id: str) -> Dict:
         """Traite une question et retourne une réponse"""
-        
+        started = time.perf_counter()
+        result = self._process_question(question, user_id)
+        self._observe(question, result, time.perf_counter() - started)
+        return result
+    
+    def _process_question(self, question: str, user_id: str) -> Dict:
         try:
             history = self.conversation_manager.get_history(user_id)
-            logger.info(f"📜 Historique utilisateur {user_id}: {len(history)} messages")
-            
-            # Gestion des salutations
-            salutations = ["cc", "bonjour", "salut", "coucou", "hello", "akwe", "yo", "bonsoir", "hi"]
-            question_lower = question.lower().strip()
-            
-            if any(salut == question_lower for salut in salutations) and len(history) == 0:
-                responses = [
-                    "Je suis ANONTCHIGAN, assistante pour la sensibilisation au cancer du sein. Comment puis-je vous aider ? 💗",
-                    "Bonjour ! Je suis ANONTCHIGAN. Que souhaitez-vous savoir sur le cancer du sein ? 🌸",
-                    "ANONTCHIGAN à votre service. Posez-moi vos questions sur la prévention du cancer du sein. 😊"
-                ]
-                answer = random.choice(responses)
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", answer)
-                
-                return {'answer': answer, 'method': 'salutation'}
+            decision = self.router.route(question, history)
             
-            if any(salut == question_lower for salut in salutations) and len(history) > 0:
-                answer = "Je suis toujours là ! 😊 Continuons notre discussion sur la santé mammaire. Que voulez-vous savoir ?"
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", answer)
-                
-                return {'answer': answer, 'method': 'salutation_continue'}
+            def compute() -> Dict:
+                prepared = self._prepare(question, user_id, history, decision)
+                if isinstance(prepared, GenerationRequest):
+                    prepared = self._complete(prepared, self._generate(prepared))
+                return prepared
             
-            # Recherche FAISS
-            faiss_results = self.rag_service.search(question)
+            key = self._flight_key(question, history, decision)
+            if key is None:
+                result = compute()
+            else:
+                result, shared = self.single_flight.do(key, compute)
+                result = self._shared_result(result, shared)
+            return self._record(user_id, question, result)
+                
+        except Exception as e:
+            logger.error(f"❌ Erreur: {str(e)}")
+            return self._error_result()
+    
+    async def aprocess_question(self, question: str, user_id: str) -> Dict:
+        """Version asynchrone de process_question
+        
+        L'appel à Groq est attendu sans bloquer de thread ; l'encodage et la
+        recherche FAISS passent par l'exécuteur borné `cpu_executor`.
+        """
+        started = time.perf_counter()
+        result = await self._aprocess_question(question, user_id)
+        self._observe(question, result, time.perf_counter() - started)
+        return result
+    
+    async def _aprocess_question(self, question: str, user_id: str) -> Dict:
+        loop = asyncio.get_running_loop()
+        try:
+            # Le stockage peut faire des E/S (SQLite) : hors de la boucle d'événements
+            history = await loop.run_in_executor(None, self.conversation_manager.get_history, user_id)
+            decision = await loop.run_in_executor(self.cpu_executor, self.router.route, question, history)
             
-            # Détecter question de suivi
-            is_followup = self._is_followup_question(question, history)
+            async def compute() -> Dict:
+                prepared = await loop.run_in_executor(
+                    self.cpu_executor, self._prepare, question, user_id, history, decision
+                )
+                if isinstance(prepared, GenerationRequest):
+                    prepared = self._complete(prepared, await self._agenerate(prepared))
+                return prepared
             
-            if is_followup and len(history) > 0:
-                logger.info("🔗 Question de suivi détectée - priorité à l'historique")
-                
-                context_parts = []
-                recent_history = history[-4:] if len(history) > 4 else history
-                for i, msg in enumerate(recent_history):
-                    if msg['role'] == 'assistant':
-                        context_parts.append(f"Message précédent {i+1}: {msg['content'][:200]}")
-                
-                for i, result in enumerate(faiss_results[:2], 1):
-                    answer_truncated = result['answer']
-                    if len(answer_truncated) > 200:
-                        answer_truncated = answer_truncated[:197] + "..."
-                    context_parts.append(f"{i}. Q: {result['question']}\n   R: {answer_truncated}")
-                
-                context = "\n\n".join(context_parts)
-                
-                try:
-                    if self.groq_service.available:
-                        generated_answer = self.groq_service.generate_response(question, context, history)
-                    else:
-                        generated_answer = "Je me base sur notre discussion précédente, mais pour plus de détails, consultez un professionnel. 💗"
-                except Exception as e:
-                    logger.warning(f"Génération échouée: {str(e)}")
-                    generated_answer = "Pour continuer cette discussion, consultez un médecin spécialisé. 🌸"
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", generated_answer)
+            key = self._flight_key(question, history, decision)
+            if key is None:
+                result = await compute()
+            else:
+                result, shared = await self.single_flight.ado(key, compute)
+                result = self._shared_result(result, shared)
+            return await loop.run_in_executor(None, self._record, user_id, question, result)
                 
+        except Exception as e:
+            logger.error(f"❌ Erreur: {str(e)}")
+            return self._error_result()
+    
+    def process_question_stream(self, question: str, user_id: str) -> Iterator[Dict]:
+        """Variante de process_question qui produit la réponse au fil de la génération
+        
+        Émet des événements {'type': 'token', 'text': ...} puis un
+        {'type': 'done', ...} qui porte le même résultat que process_question.
+        """
+        started = time.perf_counter()
+        for event in self._process_question_stream(question, user_id):
+            if event['type'] == 'done':
+                self._observe(question, event, time.perf_counter() - started)
+            yield event
+    
+    def _process_question_stream(self, question: str, user_id: str) -> Iterator[Dict]:
+        try:
+            history = self.conversation_manager.get_history(user_id)
+            prepared = self._prepare(question, user_id, history, self.router.route(question, history))
+        except Exception as e:
+            logger.error(f"❌ Erreur: {str(e)}")
+            yield {'type': 'done', **self._error_result()}
+            return
+        
+        if isinstance(prepared, GenerationRequest):
+            parts = []
+            for text in self._generate_stream(prepared):
+                parts.append(text)
+                yield {'type': 'token', 'text': text}
+            prepared = self._complete(prepared, ''.join(parts))
+        else:
+            yield {'type': 'token', 'text': prepared['answer']}
+        
+        yield {'type': 'done', **self._record(user_id, question, prepared)}
+    
+    def _flight_key(self, question: str, history: List[Dict],
+                    decision: IntentDecision) -> Optional[str]:
+        """Clé de coalescence, ou None si la réponse dépend de l'historique de l'utilisateur
+        
+        Seules les premières questions d'une conversation sont partagées :
+        l'historique entre dans le prompt envoyé au LLM, partager le résultat
+        d'un autre utilisateur exposerait sa conversation.
+        """
+        if self.single_flight is None:
+            return None
+        if history or decision.intent == INTENT_FOLLOWUP:
+            return None
+        return normalize_question(question)
+    
+    def _shared_result(self, result: Dict, shared: bool) -> Dict:
+        if shared:
+            logger.info("🔀 Question identique en cours de traitement : résultat partagé")
+            method = result.get('method')
+            if method in ('generated', 'followup_generated'):
+                self.single_flight.note_saved('llm_calls')
+            if method not in ('salutation', 'salutation_continue'):
+                self.single_flight.note_saved('retrievals')
+        return dict(result)
+    
+    def _prepare(self, question: str, user_id: str, history: List[Dict], decision: IntentDecision):
+        """Décide de la réponse : résultat final (dict) ou GenerationRequest pour le LLM"""
+        logger.info(f"📜 Historique utilisateur {user_id}: {len(history)} messages")
+        
+        # Gestion des salutations
+        is_greeting = decision.intent == INTENT_GREETING
+        
+        if is_greeting and len(history) == 0:
+            responses = [
+                "Je suis ANONTCHIGAN, assistante pour la sensibilisation au cancer du sein. Comment puis-je vous aider ? 💗",
+                "Bonjour ! Je suis ANONTCHIGAN. Que souhaitez-vous savoir sur le cancer du sein ? 🌸",
+                "ANONTCHIGAN à votre service. Posez-moi vos questions sur la prévention du cancer du sein. 😊"
+            ]
+            return {'answer': random.choice(responses), 'method': 'salutation'}
+        
+        if is_greeting and len(history) > 0:
+            answer = "Je suis toujours là ! 😊 Continuons notre discussion sur la santé mammaire. Que voulez-vous savoir ?"
+            return {'answer': answer, 'method': 'salutation_continue'}
+        
+        # Question de suivi (décidée par le routeur d'intention)
+        is_followup = decision.intent == INTENT_FOLLOWUP
+        
+        # Question identique à une entrée de la FAQ : réponse sans passer par le modèle
+        if not (is_followup and len(history) > 0):
+            exact_match = self.rag_service.lookup_exact(question)
+            if exact_match is not None:
                 return {
-                    'answer': generated_answer,
-                    'method': 'followup_generated',
-                    'score': None
+                    'answer': exact_match['answer'],
+                    'method': 'exact',
+                    'score': 1.0,
+                    'matched_question': exact_match['question']
                 }
+        
+        # Recherche FAISS
+        faiss_results = self.rag_service.search(question)
+        
+        if is_followup and len(history) > 0:
+            logger.info("🔗 Question de suivi détectée - priorité à l'historique")
             
-            if not faiss_results:
-                answer = "Les informations disponibles ne couvrent pas ce point. Je vous recommande de consulter un professionnel de santé au Bénin. 💗"
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", answer)
-                
-                return {'answer': answer, 'method': 'no_result'}
+            context_parts = []
+            recent_history = history[-4:] if len(history) > 4 else history
+            for i, msg in enumerate(recent_history):
+                if msg['role'] == 'assistant':
+                    context_parts.append(f"Message précédent {i+1}: {msg['content'][:200]}")
+            history_key = hash(tuple(msg['content'] for msg in recent_history))
             
-            best_result = faiss_results[0]
-            similarity = best_result['similarity']
+            for i, result in enumerate(faiss_results[:2], 1):
+                answer_truncated = result['answer']
+                if len(answer_truncated) > 200:
+                    answer_truncated = answer_truncated[:197] + "..."
+                context_parts.append(f"{i}. Q: {result['question']}\n   R: {answer_truncated}")
             
-            if similarity >= Config.SIMILARITY_THRESHOLD:
-                answer = best_result['answer']
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", answer)
-                
+            return GenerationRequest(
+                question, "\n\n".join(context_parts), history,
+                method='followup_generated',
+                score=None,
+                fallback="Je me base sur notre discussion précédente, mais pour plus de détails, consultez un professionnel. 💗",
+                error_fallback="Pour continuer cette discussion, consultez un médecin spécialisé. 🌸",
+                context_key=[history_key] + [result['id'] for result in faiss_results[:2]],
+            )
+        
+        if not faiss_results:
+            answer = "Les informations disponibles ne couvrent pas ce point. Je vous recommande de consulter un professionnel de santé au Bénin. 💗"
+            return {'answer': answer, 'method': 'no_result'}
+        
+        # En hybride l'ordre est celui de la fusion RRF : la bande de réponse se décide
+        # sur la meilleure similarité dense, l'ordre RRF ne sert qu'au contexte
+        best_result = max(faiss_results, key=lambda result: result['similarity'])
+        similarity = best_result['similarity']
+        
+        if similarity >= self.similarity_threshold:
+            return {
+                'answer': best_result['answer'],
+                'method': 'direct',
+                'score': float(similarity),
+                'matched_question': best_result['question']
+            }
+        
+        if self.composer is not None and similarity >= self.extractive_min_similarity:
+            composed = self.composer.compose(self.rag_service.embed_query(question)[0], faiss_results)
+            if composed:
+                logger.info("🧩 Réponse composée localement à partir des réponses proches")
                 return {
-                    'answer': answer,
-                    'method': 'direct',
+                    'answer': composed,
+                    'method': 'extractive',
                     'score': float(similarity),
                     'matched_question': best_result['question']
                 }
-            else:
-                context_parts = []
-                for i, result in enumerate(faiss_results[:3], 1):
-                    answer_truncated = result['answer']
-                    if len(answer_truncated) > 200:
-                        answer_truncated = answer_truncated[:197] + "..."
-                    context_parts.append(f"{i}. Q: {result['question']}\n   R: {answer_truncated}")
-                
-                context = "\n\n".join(context_parts)
-                
-                try:
-                    if self.groq_service.available:
-                        generated_answer = self.groq_service.generate_response(question, context, history)
-                    else:
-                        generated_answer = "Pour cette question, consultez un professionnel de santé. La prévention précoce est essentielle. 💗"
-                except Exception as e:
-                    logger.warning(f"Génération échouée: {str(e)}")
-                    generated_answer = "Pour des informations précises, consultez un médecin spécialisé au Bénin. 🌸"
-                
-                self.conversation_manager.add_message(user_id, "user", question)
-                self.conversation_manager.add_message(user_id, "assistant", generated_answer)
-                
-                return {
-                    'answer': generated_answer,
-                    'method': 'generated',
-                    'score': float(similarity)
-                }
-                
+        
+        context_parts = []
+        for i, result in enumerate(faiss_results[:3], 1):
+            answer_truncated = result['answer']
+            if len(answer_truncated) > 200:
+                answer_truncated = answer_truncated[:197] + "..."
+            context_parts.append(f"{i}. Q: {result['question']}\n   R: {answer_truncated}")
+        
+        return GenerationRequest(
+            question, "\n\n".join(context_parts), history,
+            method='generated',
+            score=float(similarity),
+            fallback="Pour cette question, consultez un professionnel de santé. La prévention précoce est essentielle. 💗",
+            error_fallback="Pour des informations précises, consultez un médecin spécialisé au Bénin. 🌸",
+            context_key=[result['id'] for result in faiss_results[:3]],
+            topic=best_result['question'],
+        )
+    
+    def _generate(self, request: 'GenerationRequest') -> str:
+        cached = self._cached_answer(request)
+        if cached is not None:
+            return cached
+        try:
+            if self.groq_service.available:
+                answer = self.groq_service.generate_response(request.question, request.context, request.history)
+                self._cache_answer(request, answer)
+                return answer
+            return request.fallback
         except Exception as e:
-            logger.error(f"❌ Erreur: {str(e)}")
-            return {
-                'answer': "Désolé, une erreur s'est produite. Veuillez réessayer.",
-                'method': 'error'
-            }
+            logger.warning(f"Génération échouée: {str(e)}")
+            return request.error_fallback
+    
+    async def _agenerate(self, request: 'GenerationRequest') -> str:
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(self.cpu_executor, self._cached_answer, request)
+        if cached is not None:
+            return cached
+        try:
+            if self.groq_service.available:
+                answer = await self.groq_service.agenerate_response(request.question, request.context, request.history)
+                self._cache_answer(request, answer)
+                return answer
+            return request.fallback
+        except Exception as e:
+            logger.warning(f"Génération échouée: {str(e)}")
+            return request.error_fallback
+    
+    def _generate_stream(self, request: 'GenerationRequest') -> Iterator[str]:
+        cached = self._cached_answer(request)
+        if cached is not None:
+            yield cached
+            return
+        if not self.groq_service.available:
+            yield request.fallback
+            return
+        
+        parts = []
+        try:
+            for text in self.groq_service.stream_response(request.question, request.context, request.history):
+                parts.append(text)
+                yield text
+        except Exception as e:
+            logger.warning(f"Génération échouée: {str(e)}")
+            if not parts:
+                yield request.error_fallback
+            return
+        # Même contrôle que le chemin non streamé : une réponse trop courte n'est pas mise en cache
+        answer = ''.join(parts)
+        if self.groq_service._is_valid_answer(answer):
+            self._cache_answer(request, answer)
+    
+    def _cached_answer(self, request: 'GenerationRequest') -> Optional[str]:
+        """Réponse déjà générée pour une question quasi identique et le même contexte"""
+        if not (self.answer_cache.enabled and self.rag_service.dense_enabled):
+            return None
+        # Embedding déjà calculé par la recherche : servi par le cache des requêtes
+        request.embedding = self.rag_service.embed_query(request.question)[0]
+        answer = self.answer_cache.get(request.embedding, request.context_key)
+        if answer is not None:
+            logger.info("♻️  Réponse générée servie depuis le cache sémantique")
+        return answer
+    
+    def _cache_answer(self, request: 'GenerationRequest', answer: str):
+        if request.embedding is not None and answer:
+            self.answer_cache.put(request.embedding, request.context_key, answer)
+    
+    @staticmethod
+    def _error_result() -> Dict:
+        return {
+            'answer': "Désolé, une erreur s'est produite. Veuillez réessayer.",
+            'method': 'error'
+        }
+    
+    @staticmethod
+    def _complete(request: 'GenerationRequest', answer: str) -> Dict:
+        return {'answer': answer, 'method': request.method, 'score': request.score, 'topic': request.topic}
+    
+    def _record(self, user_id: str, question: str, result: Dict) -> Dict:
+        topic = result.get('topic') or result.get('matched_question')
+        self.conversation_manager.add_message(user_id, "user", question, topic)
+        self.conversation_manager.add_message(user_id, "assistant", result['answer'])
+        return {key: value for key, value in result.items() if key != 'topic'}
     
     def get_health_status(self) -> Dict:
         """Retourne l'état de santé du service"""
         return {
             'groq_available': self.groq_service.available,
-            'questions_count': len(self.rag_service.questions_data)
+            'groq_circuit': self.groq_service.breaker.stats(),
+            'questions_count': len(self.rag_service.questions_data),
+            'retrieval_mode': self.rag_service.retrieval_mode,
+            'index_cache': {
+                'status': self.rag_service.index_cache_status,
+                **IndexArtifactCache.stats,
+            },
+            'query_cache': self.rag_service.query_cache.stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'conversations': self.conversation_manager.stats(),
+            'intents': self.router.stats(),
+            'coalescing': self.single_flight.stats() if self.single_flight else None,
+            'micro_batching': self.rag_service.batcher.stats() if self.rag_service.batcher else None,
+            'result_cache': self.rag_service.result_cache.stats(),
+            'query_log': self.query_log.stats() if self.query_log else None,
         }
-    
-    def _is_followup_question(self, question: str, history: List[Dict]) -> bool:
-        """Détecte si la question fait référence à la conversation précédente"""
-        if len(history) == 0:
-            return False
-        
-        followup_keywords = [
-            'ça', 'cela', 'celui', 'celle', 'ceux', 'celles',
-            'pourquoi', 'comment', 'quand', 'où', 'combien',
-            'explique', 'détaille', 'précise', 'développe',
-            'tu as dit', 'tu disais', 'tu parlais', 'tu mentionnais',
-            'avant', 'précédemment', 'plus tôt', 'tantôt',
-            'je comprends pas', 'je ne comprends pas', 'pas clair',
-            'et', 'mais', 'donc', 'alors', 'aussi', 'encore',
-            'il', 'elle', 'ils', 'elles', 'le', 'la', 'les',
-        ]
-        
-        question_lower = question.lower()
-        
-        # Question très courte
-        if len(question.split()) <= 3:
-            return True
-        
-        # Commence par mot-clé
-        for keyword in followup_keywords:
-            if question_lower.startswith(keyword):
-                return True
-        
-        # Plusieurs mots-clés
-        keyword_count = sum(1 for kw in followup_keywords if kw in question_lower)
-        if keyword_count >= 2:
-            return True
-        
-        return False
 
 
     
-
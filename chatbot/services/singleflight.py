@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalescence des appels identiques simultanés
+
+    Le premier appel pour une clé exécute le calcul ; les appels concurrents
+    de même clé attendent son résultat (ou son exception) au lieu de le
+    refaire. Rien n'est gardé une fois le calcul terminé (ce n'est pas un cache).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.saved: Counter = Counter()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Retourne (résultat, partagé) ; `partagé` vaut True si le calcul d'un autre appel a été réutilisé"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Équivalent asynchrone de do, limité aux appels de la même boucle d'événements"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[loop_key] = loop.create_future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # Évite l'avertissement « exception never retrieved » quand personne n'attendait
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._async_calls[loop_key]
+        return result, False
+
+    def note_saved(self, label: str):
+        """Compte un appel amont (ex. LLM) évité grâce à la coalescence"""
+        with self._lock:
+            self.saved[label] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'saved': dict(self.saved),
+            }
@@ -0,0 +1,87 @@
+from typing import Callable, List, Sequence
+
+
+class StreamPostProcessor:
+    """Version incrémentale de GroqService._clean_response et _ensure_complete_response
+
+    Le début de la réponse est retenu tant qu'il peut encore devenir une
+    formule d'introduction indésirable (retirée jusqu'au premier point), et
+    les derniers caractères le sont jusqu'à la fin du flux pour que la
+    correction des réponses coupées puisse encore s'appliquer.
+    """
+
+    TAIL_SIZE = 16
+
+    def __init__(self, unwanted_intros: Sequence[str], ensure_complete: Callable[[str], str]):
+        self.unwanted_intros = tuple(unwanted_intros)
+        self.ensure_complete = ensure_complete
+        self._head = ''
+        self._head_done = False
+        self._capitalize = False
+        self._tail = ''
+        self._sent: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Texte déjà émis"""
+        return ''.join(self._sent)
+
+    def feed(self, delta: str) -> str:
+        """Ajoute un fragment du modèle ; retourne le texte publiable immédiatement"""
+        if not self._head_done:
+            self._head += delta
+            delta = self._resolve_head(final=False)
+            if delta is None:
+                return ''
+        return self._emit(delta)
+
+    def finish(self) -> str:
+        """Fin du flux : retourne le reste du texte, réponse complétée si coupée"""
+        emitted = ''
+        if not self._head_done:
+            emitted = self._emit(self._resolve_head(final=True))
+
+        sent = self.text
+        fixed = self.ensure_complete((sent + self._tail).rstrip())
+        # Le texte déjà émis ne peut plus être corrigé
+        rest = fixed[len(sent):] if fixed.startswith(sent) else self._tail
+        self._tail = ''
+        self._sent.append(rest)
+        return emitted + rest
+
+    def _resolve_head(self, final: bool):
+        head = self._head.lstrip()
+        lower = head.lower()
+        matched = any(lower.startswith(phrase) for phrase in self.unwanted_intros)
+
+        if not matched:
+            if not final and any(phrase.startswith(lower) for phrase in self.unwanted_intros):
+                return None
+            self._head_done = True
+            return head
+
+        if '.' not in head:
+            if not final:
+                return None
+            self._head_done = True
+            return head.rstrip()
+
+        self._head_done = True
+        self._capitalize = True
+        return head.split('.', 1)[1]
+
+    def _emit(self, text: str) -> str:
+        if self._capitalize:
+            text = text.lstrip()
+            if not text:
+                return ''
+            text = text[0].upper() + text[1:]
+            self._capitalize = False
+
+        combined = self._tail + text
+        if len(combined) <= self.TAIL_SIZE:
+            self._tail = combined
+            return ''
+        out, self._tail = combined[:-self.TAIL_SIZE], combined[-self.TAIL_SIZE:]
+        self._sent.append(out)
+        return out
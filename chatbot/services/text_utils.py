@@ -0,0 +1,21 @@
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]|_')
+
+
+def strip_accents(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize_query(text: str) -> str:
+    """Normalise une question : casse, accents et espaces"""
+    return _WHITESPACE_RE.sub(' ', strip_accents(text.lower())).strip()
+
+
+def normalize_question(text: str) -> str:
+    """Normalisation complète pour la recherche exacte : normalize_query + ponctuation"""
+    text = _PUNCTUATION_RE.sub(' ', strip_accents(text.lower()))
+    return _WHITESPACE_RE.sub(' ', text).strip()
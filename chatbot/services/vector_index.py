@@ -0,0 +1,190 @@
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# Types d'index disponibles via CHATBOT_CONFIG['INDEX_TYPE']
+INDEX_TYPES = ('flat_l2', 'flat_ip', 'hnsw', 'ivf_pq')
+
+# Types servis par SharedFlatIndex quand les embeddings sont partagés (memmap)
+SHARED_INDEX_TYPES = ('flat_l2', 'flat_ip')
+
+DEFAULT_PARAMS = {
+    'hnsw': {'M': 32, 'efConstruction': 80, 'efSearch': 64},
+    'ivf_pq': {'nlist': 1024, 'm': 16, 'nbits': 8, 'nprobe': 16},
+}
+
+
+def uses_cosine(index_type: str) -> bool:
+    """Tous les index sauf 'flat_l2' travaillent en produit scalaire sur vecteurs normalisés"""
+    return index_type != 'flat_l2'
+
+
+def prepare_vectors(vectors: np.ndarray, index_type: str) -> np.ndarray:
+    """Copie float32 contiguë, normalisée L2 si l'index est en cosinus"""
+    vectors = np.array(vectors, dtype='float32', order='C', copy=True)
+    if uses_cosine(index_type):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def to_similarity(scores: np.ndarray, index_type: str) -> np.ndarray:
+    """Convertit les scores FAISS en similarité dans [0, 1]"""
+    if uses_cosine(index_type):
+        return np.clip(scores, 0.0, 1.0)
+    return 1 / (1 + scores)
+
+
+def score_vectors(query: np.ndarray, vectors: np.ndarray, index_type: str) -> np.ndarray:
+    """Scores bruts (comme FAISS) d'une requête préparée contre quelques vecteurs"""
+    if uses_cosine(index_type):
+        return vectors @ query
+    return ((vectors - query) ** 2).sum(axis=1)
+
+
+def resolve_params(index_type: str, params: Optional[Dict] = None) -> Dict:
+    resolved = dict(DEFAULT_PARAMS.get(index_type, {}))
+    resolved.update(params or {})
+    return resolved
+
+
+def build_index(vectors: np.ndarray, index_type: str = 'flat_l2',
+                params: Optional[Dict] = None, ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """Construit un index FAISS à partir de vecteurs déjà préparés (prepare_vectors)
+
+    Avec `ids`, l'index est enveloppé dans un IndexIDMap2 et la recherche
+    retourne ces identifiants au lieu des positions.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu: {index_type} (choix: {', '.join(INDEX_TYPES)})")
+
+    params = resolve_params(index_type, params)
+    count, dimension = vectors.shape
+
+    if index_type == 'flat_l2':
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == 'flat_ip':
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, params['M'], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params['efConstruction']
+    else:
+        index = _build_ivf_pq(vectors, params)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    else:
+        index.add(vectors)
+    configure_search(index, index_type, params)
+    return index
+
+
+def apply_delta(index: faiss.Index, index_type: str, params: Optional[Dict],
+                removed_ids: np.ndarray, vectors: np.ndarray, ids: np.ndarray) -> Optional[faiss.Index]:
+    """Copie de l'index avec les entrées retirées/ajoutées, sans toucher à l'original
+
+    Retourne None si le type d'index ne sait pas supprimer (HNSW) : l'appelant
+    reconstruit alors l'index depuis les vecteurs déjà calculés.
+    """
+    updated = faiss.clone_index(index)
+    try:
+        if len(removed_ids):
+            updated.remove_ids(np.asarray(removed_ids, dtype='int64'))
+        if len(ids):
+            updated.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    except RuntimeError as e:
+        logger.info(f"ℹ️  Mise à jour incrémentale impossible pour {index_type}: {str(e).splitlines()[0]}")
+        return None
+    configure_search(updated, index_type, params)
+    return updated
+
+
+def _build_ivf_pq(vectors: np.ndarray, params: Dict) -> faiss.Index:
+    count, dimension = vectors.shape
+
+    # Petits corpus : on réduit nlist et nbits pour garder un entraînement valable
+    nlist = max(1, min(params['nlist'], count // 39))
+    nbits = params['nbits']
+    while nbits > 4 and count < 39 * (1 << nbits):
+        nbits -= 1
+    m = params['m']
+    while dimension % m:
+        m -= 1
+
+    if (nlist, m, nbits) != (params['nlist'], params['m'], params['nbits']):
+        logger.info(f"ℹ️  IVF-PQ ajusté à la taille du corpus: nlist={nlist}, m={m}, nbits={nbits}")
+
+    quantizer = faiss.IndexFlatIP(dimension)
+    index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index, index_type: str, params: Optional[Dict] = None):
+    """Applique les paramètres de recherche (non conservés par la sérialisation)"""
+    params = resolve_params(index_type, params)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if index_type == 'hnsw':
+        index.hnsw.efSearch = params['efSearch']
+    elif index_type == 'ivf_pq':
+        index.nprobe = min(params['nprobe'], index.nlist)
+
+
+class SharedFlatIndex:
+    """Recherche exacte directement sur la matrice d'embeddings, sans la copier
+
+    Remplace IndexFlat quand la matrice est un np.memmap : tous les workers
+    lisent alors les mêmes pages du cache disque au lieu de garder chacun
+    leur copie. Les blocs sont convertis en float32 à la volée, ce qui
+    autorise un stockage float16. Même interface de recherche que FAISS.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, index_type: str,
+                 chunk_size: int = 8192):
+        if index_type not in SHARED_INDEX_TYPES:
+            raise ValueError(f"SharedFlatIndex ne gère pas {index_type}")
+        self.vectors = vectors
+        self.ids = np.asarray(ids, dtype='int64')
+        self.index_type = index_type
+        self.chunk_size = chunk_size
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int):
+        """Retourne (scores, ids) comme faiss.Index.search ; -1 pour les places vides"""
+        count = len(queries)
+        cosine = uses_cosine(self.index_type)
+        best_scores = np.full((count, k), -np.inf if cosine else np.inf, dtype='float32')
+        best_rows = np.full((count, k), -1, dtype='int64')
+
+        for start in range(0, self.ntotal, self.chunk_size):
+            block = np.asarray(self.vectors[start:start + self.chunk_size], dtype='float32')
+            if cosine:
+                scores = queries @ block.T
+            else:
+                scores = ((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ block.T
+                          + (block ** 2).sum(axis=1)[None, :])
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+
+            merged_scores = np.hstack([best_scores, scores])
+            merged_rows = np.hstack([best_rows, rows])
+            order = np.argsort(-merged_scores if cosine else merged_scores, axis=1, kind='stable')[:, :k]
+            best_scores = np.take_along_axis(merged_scores, order, axis=1)
+            best_rows = np.take_along_axis(merged_rows, order, axis=1)
+
+        ids = np.where(best_rows >= 0, self.ids[np.clip(best_rows, 0, None)], -1)
+        return best_scores, ids
+
+
+def index_signature(index_type: str, params: Optional[Dict] = None) -> str:
+    """Identifiant stable du type d'index et de ses paramètres de construction"""
+    params = resolve_params(index_type, params)
+    build_params = {k: v for k, v in params.items() if k not in ('efSearch', 'nprobe')}
+    return index_type + ''.join(f"|{k}={v}" for k, v in sorted(build_params.items()))
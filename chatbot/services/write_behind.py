@@ -0,0 +1,128 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Tampon d'écriture différée : `flush_fn(lot)` appelé par un thread dédié
+
+    Un lot part dès `max_batch` éléments ou au plus tard `interval` secondes
+    après le premier élément en attente. Un lot en échec est remis en tête
+    du tampon (borné à `max_pending`, les plus anciens sont perdus au-delà).
+    Le tampon est vidé à l'arrêt normal du processus (atexit : fin de
+    runserver, arrêt gracieux d'un worker gunicorn sur SIGTERM).
+    """
+
+    def __init__(self, flush_fn: Callable[[List], None], max_batch: int = 100,
+                 interval: float = 2.0, max_pending: int = 100000, name: str = 'write-behind'):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self.name = name
+        self._pending: List = []
+        self._first_pending_at: Optional[float] = None
+        # Après un échec, pas de nouvelle tentative avant cette échéance
+        self._retry_after = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer_pid: Optional[int] = None
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def add(self, item):
+        with self._cond:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append(item)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        self._ensure_writer()
+
+    def read_through(self, read_fn: Callable, predicate: Callable) -> Tuple[object, List]:
+        """(read_fn(), éléments en attente qui vérifient `predicate`)
+
+        Aucun lot n'est en cours d'écriture pendant la lecture : un élément
+        est soit déjà lu par read_fn, soit dans la liste, jamais les deux.
+        """
+        with self._flush_lock:
+            stored = read_fn()
+            with self._cond:
+                return stored, [item for item in self._pending if predicate(item)]
+
+    def flush(self):
+        """Écrit tout ce qui est en attente, dans le thread appelant"""
+        while self._flush_once():
+            pass
+
+    def _flush_once(self) -> bool:
+        # Un seul flush à la fois : l'ordre des lots est celui des ajouts
+        with self._flush_lock:
+            with self._cond:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:len(batch)]
+                self._first_pending_at = time.monotonic() if self._pending else None
+            if not batch:
+                return False
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Écriture différée ({self.name}) échouée, {len(batch)} éléments remis en attente: {str(e)}")
+                with self._cond:
+                    self._pending[:0] = batch
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self.dropped += overflow
+                    self._first_pending_at = time.monotonic()
+                    self._retry_after = time.monotonic() + self.interval
+                return False
+            self.flushed += len(batch)
+            self.batches += 1
+            return True
+
+    def _ensure_writer(self):
+        # Un thread par processus : celui du parent ne survit pas à un fork
+        if self._writer_pid == os.getpid():
+            return
+        with self._cond:
+            if self._writer_pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+            if self._writer_pid is None:
+                atexit.register(self.flush)
+            self._writer_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    full = len(self._pending) >= self.max_batch
+                    due = max(now if full else self._first_pending_at + self.interval, self._retry_after)
+                    if due <= now:
+                        break
+                    self._cond.wait(due - now)
+            self._flush_once()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failures': self.failures,
+            'dropped': self.dropped,
+        }
@@ -1,3 +1,1387 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from chatbot import views
+from chatbot.services.answer_cache import SemanticAnswerCache
+from chatbot.services.batching import MicroBatcher
+from chatbot.services.circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+from chatbot.services.conversation_store import InMemoryConversationStore, Message
+from chatbot.services.corpus import corpus_files, entry_id, entry_text, load_corpus
+from chatbot.services.extractive import ExtractiveComposer
+from chatbot.services.embeddings import (
+    ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE, EmbeddingBackend, create_embedding_backend, ensure_quantized_model,
+)
+from chatbot.services.index_cache import IndexArtifactCache
+from chatbot.services.loader import LOADING_ANSWER, STATE_LOADING, STATE_READY, ChatbotServiceLoader
+from chatbot.services.intent import INTENT_FAQ, INTENT_FOLLOWUP, IntentDecision, IntentRouter
+from chatbot.services.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+from chatbot.services.prompt_builder import MESSAGE_OVERHEAD, PromptBuilder, TokenCounter
+from chatbot.services.query_cache import QueryEmbeddingCache
+from chatbot.services.query_log import QueryLog, frequent_questions, load_warm_list
+from chatbot.services.rag_service import ChatbotService, Config, GenerationRequest, GroqService, RAGService
+from chatbot.services.singleflight import SingleFlight
+from chatbot.services.streaming import StreamPostProcessor
+from chatbot.services.text_utils import normalize_query, normalize_question, strip_accents
+from chatbot.services.vector_index import (
+    INDEX_TYPES, SharedFlatIndex, apply_delta, build_index, prepare_vectors, to_similarity,
+)
+from chatbot.services.write_behind import WriteBehindBuffer
+from core.metrics import REGISTRY
+
+
+def _result(eid, similarity):
+    return {'id': eid, 'question': f"Question {eid} ?", 'answer': f"Réponse {eid}.", 'similarity': similarity}
+
+
+def _bare_chatbot(results):
+    """ChatbotService sans modèles : seule la décision de _prepare est testée"""
+    service = ChatbotService.__new__(ChatbotService)
+    service.rag_service = mock.Mock()
+    service.rag_service.lookup_exact.return_value = None
+    service.rag_service.search.return_value = results
+    service.composer = None
+    service.similarity_threshold = 0.75
+    service.extractive_min_similarity = 0.55
+    return service
+
+
+CORPUS = [
+    {'question': "Qu'est-ce que le cancer du sein ?",
+     'answer': "Le cancer du sein est une tumeur maligne qui se développe dans les tissus du sein."},
+    {'question': "Comment faire un auto-examen des seins ?",
+     'answer': "Observez vos seins devant un miroir puis palpez-les avec la pulpe des doigts."},
+    {'question': "À quel âge commencer la mammographie ?",
+     'answer': "La mammographie de dépistage est recommandée tous les deux ans à partir de 40 ans."},
+    {'question': "L'allaitement protège-t-il du cancer du sein ?",
+     'answer': "L'allaitement réduit légèrement le risque de cancer du sein."},
+]
+
+
+class HashingBackend(EmbeddingBackend):
+    """Embeddings déterministes sans modèle : sac de mots haché"""
+
+    name = 'test_hashing'
+    DIMENSION = 256
+
+    def __init__(self, model_name: str = 'hashing'):
+        super().__init__(model_name)
+        self.encoded = 0
+        self.calls = 0
+
+    def encode(self, texts, show_progress_bar=False):
+        self.calls += 1
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.DIMENSION), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', strip_accents(text.lower())):
+                vectors[row, sum(map(ord, word)) * 31 % self.DIMENSION] += 1.0
+        return vectors
+
+
+class CorpusTestMixin:
+    """RAGService sur un corpus temporaire, avec HashingBackend à la place du modèle"""
+
+    def setUp(self):
+        super().setUp()
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.corpus_dir = os.path.join(self.tmp_dir, 'data')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        os.makedirs(self.corpus_dir)
+        self.backend = HashingBackend()
+        patcher = mock.patch('chatbot.services.rag_service.create_embedding_backend',
+                             lambda *args, **kwargs: self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_corpus(self, items, name='faq'):
+        path = os.path.join(self.corpus_dir, f'{name}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        # mtime distinct même si la taille du fichier ne change pas
+        os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+        return path
+
+    def rag_service(self, **config) -> RAGService:
+        override = override_settings(CHATBOT_CONFIG={
+            **settings.CHATBOT_CONFIG,
+            'CORPUS_DIR': self.corpus_dir,
+            'INDEX_CACHE_DIR': self.cache_dir,
+            'CORPUS_RELOAD_INTERVAL': 0,
+            'RETRIEVAL_MODE': 'dense',
+            'INDEX_TYPE': 'flat_ip',
+            'EMBEDDING_MMAP': False,
+            'MICRO_BATCHING': False,
+            **config,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        return RAGService()
+
+
+class IndexArtifactCacheTests(CorpusTestMixin, SimpleTestCase):
+
+    def test_key_changes_with_content_and_signature(self):
+        path = self.write_corpus(CORPUS)
+        key = IndexArtifactCache.compute_key([path], 'modèle|flat_ip')
+        self.assertEqual(key, IndexArtifactCache.compute_key([path], 'modèle|flat_ip'))
+        self.write_corpus(CORPUS[:2])
+        changed = IndexArtifactCache.compute_key([path], 'modèle|flat_ip')
+        self.assertNotEqual(key, changed)
+        # Même signature : préfixe commun, le delta peut être ré-encodé seul
+        self.assertEqual(key.split('_')[0], changed.split('_')[0])
+        self.assertNotEqual(key.split('_')[0], IndexArtifactCache.compute_key([path], 'modèle|hnsw').split('_')[0])
+
+    def test_second_boot_reuses_the_artifacts(self):
+        self.write_corpus(CORPUS)
+        first = self.rag_service()
+        self.assertEqual(first.index_cache_status, 'rebuild')
+        encoded = self.backend.encoded
+        second = self.rag_service()
+        self.assertEqual(second.index_cache_status, 'hit')
+        self.assertEqual(self.backend.encoded, encoded)
+        self.assertEqual(second.search(CORPUS[1]['question'])[0]['answer'], CORPUS[1]['answer'])
+
+    def test_changed_corpus_reencodes_only_the_delta(self):
+        self.write_corpus(CORPUS[:3])
+        self.rag_service()
+        encoded = self.backend.encoded
+        self.write_corpus(CORPUS)
+        service = self.rag_service()
+        self.assertEqual(service.index_cache_status, 'incremental')
+        self.assertEqual(self.backend.encoded - encoded, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+        self.assertEqual(service.search(CORPUS[3]['question'])[0]['answer'], CORPUS[3]['answer'])
+
+    def test_inconsistent_artifacts_are_rebuilt(self):
+        self.write_corpus(CORPUS)
+        self.rag_service()
+        ids_file = next(name for name in os.listdir(self.cache_dir) if name.startswith('ids_'))
+        np.save(os.path.join(self.cache_dir, ids_file), np.arange(2, dtype='int64'))
+        self.assertEqual(self.rag_service().index_cache_status, 'rebuild')
+
+    def test_outcomes_are_exported_to_metrics(self):
+        self.write_corpus(CORPUS)
+        self.rag_service()
+        self.rag_service()
+        output = REGISTRY.render()
+        self.assertIn('anontchigan_index_cache_loads_total{outcome="rebuild"}', output)
+        self.assertIn('anontchigan_index_cache_loads_total{outcome="hit"}', output)
+
+
+class QueryCacheTests(CorpusTestMixin, SimpleTestCase):
+
+    def test_embedding_cache_is_a_bounded_lru(self):
+        cache = QueryEmbeddingCache(max_size=2)
+        cache.put('a', np.ones(3))
+        cache.put('b', np.ones(3))
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('c', np.ones(3))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_repeated_query_is_encoded_once(self):
+        self.write_corpus(CORPUS)
+        service = self.rag_service()
+        encoded = self.backend.encoded
+        service.embed_query("Comment faire un auto-examen ?")
+        service.embed_queries(["comment  faire un AUTO-EXAMEN ?", "Comment faire un auto-examen ?"])
+        self.assertEqual(self.backend.encoded - encoded, 1)
+        # Les doublons d'un même lot ne sont cherchés qu'une fois
+        self.assertEqual(service.query_cache.stats()['hits'], 1)
+
+    def test_search_results_are_cached_until_the_corpus_reloads(self):
+        self.write_corpus(CORPUS[:3])
+        service = self.rag_service()
+        question = "L'allaitement protège-t-il du cancer du sein ?"
+        service.search(question)
+        service.search(question)
+        self.assertEqual(service.result_cache.stats()['hits'], 1)
+
+        self.write_corpus(CORPUS)
+        self.assertTrue(service.reload())
+        encoded = self.backend.encoded
+        self.assertEqual(service.search(question)[0]['answer'], CORPUS[3]['answer'])
+        self.assertEqual(service.result_cache.stats()['hits'], 1)
+        # L'embedding de la requête ne dépend pas du corpus : toujours servi par le cache
+        self.assertEqual(self.backend.encoded, encoded)
+
+
+class MicroBatchingTests(CorpusTestMixin, SimpleTestCase):
+
+    def _concurrently(self, fn, args):
+        barrier = threading.Barrier(len(args))
+        results = [None] * len(args)
+
+        def call(row):
+            barrier.wait(5)
+            results[row] = fn(args[row])
+
+        threads = [threading.Thread(target=call, args=(row,)) for row in range(len(args))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_submits_share_one_batch_in_order(self):
+        batches = []
+        batcher = MicroBatcher(lambda items: batches.append(list(items)) or [item * 2 for item in items],
+                               max_batch_size=8, max_wait_ms=200)
+        self.assertEqual(self._concurrently(batcher.submit, [1, 2, 3, 4]), [2, 4, 6, 8])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(sorted(batches[0]), [1, 2, 3, 4])
+
+    def test_batch_failure_reaches_every_caller(self):
+        def fail(items):
+            raise RuntimeError("FAISS indisponible")
+
+        batcher = MicroBatcher(fail, max_wait_ms=50)
+        logging.disable(logging.ERROR)
+        with self.assertRaises(RuntimeError):
+            batcher.submit('question')
+
+    def test_search_many_encodes_all_queries_in_one_pass(self):
+        self.write_corpus(CORPUS)
+        service = self.rag_service()
+        calls = self.backend.calls
+        results = service.search_many([item['question'] for item in CORPUS])
+        self.assertEqual(self.backend.calls - calls, 1)
+        self.assertEqual([found[0]['answer'] for found in results], [item['answer'] for item in CORPUS])
+
+    def test_concurrent_searches_are_micro_batched(self):
+        self.write_corpus(CORPUS)
+        service = self.rag_service(MICRO_BATCHING=True, MICRO_BATCH_WAIT_MS=200)
+        calls = self.backend.calls
+        questions = [item['question'] for item in CORPUS]
+        results = self._concurrently(service.search, questions)
+        self.assertEqual(self.backend.calls - calls, 1)
+        self.assertEqual([found[0]['answer'] for found in results], [item['answer'] for item in CORPUS])
+
+
+class VectorIndexTests(CorpusTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        # Grappes bien séparées : même les index approximatifs retrouvent le plus proche voisin
+        centers = rng.normal(size=(40, 32)).astype('float32') * 4
+        self.vectors = np.repeat(centers, 16, axis=0) + rng.normal(scale=0.05, size=(640, 32)).astype('float32')
+        self.ids = np.arange(1000, 1640, dtype='int64')
+
+    def _index(self, index_type, rows=slice(None)):
+        vectors = prepare_vectors(self.vectors[rows], index_type)
+        return build_index(vectors, index_type, ids=self.ids[rows])
+
+    def _nearest(self, index, index_type, rows):
+        _, found = index.search(prepare_vectors(self.vectors[rows], index_type), 1)
+        return found[:, 0]
+
+    def test_every_index_type_finds_the_query_cluster(self):
+        rows = np.arange(0, 640, 16)
+        for index_type in INDEX_TYPES:
+            with self.subTest(index_type=index_type):
+                index = self._index(index_type)
+                found = self._nearest(index, index_type, rows)
+                # Même grappe : même centre, ids consécutifs par blocs de 16
+                np.testing.assert_array_equal((found - 1000) // 16, rows // 16)
+
+    def test_similarity_scales(self):
+        np.testing.assert_allclose(to_similarity(np.array([0.0, 1.0]), 'flat_l2'), [1.0, 0.5])
+        np.testing.assert_allclose(to_similarity(np.array([1.2, 0.4, -0.3]), 'flat_ip'), [1.0, 0.4, 0.0])
+
+    def test_apply_delta_removes_and_adds_without_touching_the_original(self):
+        for index_type in ('flat_l2', 'flat_ip', 'ivf_pq'):
+            with self.subTest(index_type=index_type):
+                index = self._index(index_type, slice(0, 624))
+                added = prepare_vectors(self.vectors[624:], index_type)
+                updated = apply_delta(index, index_type, None, self.ids[:16], added, self.ids[624:])
+                self.assertIsNotNone(updated)
+                self.assertEqual(index.ntotal, 624)
+                self.assertEqual(updated.ntotal, 624)
+                self.assertEqual((self._nearest(updated, index_type, [630])[0] - 1000) // 16, 39)
+                self.assertNotEqual((self._nearest(updated, index_type, [0])[0] - 1000) // 16, 0)
+
+    def test_hnsw_delta_returns_none(self):
+        index = self._index('hnsw', slice(0, 624))
+        added = prepare_vectors(self.vectors[624:], 'hnsw')
+        self.assertIsNone(apply_delta(index, 'hnsw', None, self.ids[:16], added, self.ids[624:]))
+
+    def test_hnsw_corpus_change_rebuilds_the_index(self):
+        self.write_corpus(CORPUS[1:])
+        self.rag_service(INDEX_TYPE='hnsw')
+        self.write_corpus(CORPUS[:3])
+        service = self.rag_service(INDEX_TYPE='hnsw')
+        self.assertEqual(service.index_cache_status, 'incremental')
+        self.assertEqual(service.index.ntotal, 3)
+        self.assertEqual(service.search(CORPUS[0]['question'])[0]['answer'], CORPUS[0]['answer'])
+
+
+class CorpusLoadingTests(CorpusTestMixin, SimpleTestCase):
+
+    def test_every_file_is_loaded_and_duplicates_appear_once(self):
+        self.write_corpus(CORPUS[:2], name='faq_a')
+        self.write_corpus([CORPUS[1], {**CORPUS[2], 'source': 'depistage'}], name='faq_b')
+        entries = load_corpus(corpus_files(self.corpus_dir))
+        self.assertEqual(len(entries), 3)
+        sources = {entry['question_originale']: entry['source'] for entry in entries.values()}
+        self.assertEqual(sources[CORPUS[0]['question']], 'faq_a')
+        self.assertEqual(sources[CORPUS[2]['question']], 'depistage')
+        self.assertIn(entry_id(CORPUS[1]['question'], CORPUS[1]['answer']), entries)
+
+    def test_reload_serves_new_files_and_keeps_the_index_on_failure(self):
+        self.write_corpus(CORPUS[:3], name='faq_a')
+        service = self.rag_service()
+        self.assertFalse(service.reload())
+
+        self.write_corpus(CORPUS[3:], name='faq_b')
+        self.assertTrue(service.reload())
+        self.assertEqual(len(service.questions_data), 4)
+        self.assertEqual(service.search(CORPUS[3]['question'])[0]['answer'], CORPUS[3]['answer'])
+
+        with open(os.path.join(self.corpus_dir, 'faq_c.json'), 'w', encoding='utf-8') as f:
+            f.write('[{"question": ')
+        logging.disable(logging.CRITICAL)
+        self.assertFalse(service.reload())
+        self.assertEqual(len(service.questions_data), 4)
+
+
+class ExactLookupTests(CorpusTestMixin, SimpleTestCase):
+
+    def test_normalization(self):
+        self.assertEqual(normalize_question("  À QUEL âge commencer la   mammographie?! "),
+                         "a quel age commencer la mammographie")
+        self.assertEqual(normalize_question("L'allaitement protège-t-il ?"), "l allaitement protege t il")
+        # normalize_query garde la ponctuation (clé des caches de requêtes)
+        self.assertEqual(normalize_query("  Quoi   de NEUF ? "), "quoi de neuf ?")
+
+    def test_variants_are_answered_without_the_model(self):
+        self.write_corpus(CORPUS)
+        service = self.rag_service()
+        calls = self.backend.calls
+        for variant in ("a quel age commencer la mammographie", "À QUEL ÂGE commencer la mammographie ??"):
+            with self.subTest(variant=variant):
+                match = service.lookup_exact(variant)
+                self.assertEqual(match['answer'], CORPUS[2]['answer'])
+                self.assertEqual(match['similarity'], 1.0)
+        self.assertIsNone(service.lookup_exact("À quel âge arrêter la mammographie ?"))
+        self.assertEqual(self.backend.calls, calls)
+
+
+class LexicalSearchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = BM25Index((i, item['question'], item['answer']) for i, item in enumerate(CORPUS))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("L'allaitement protège-t-il des cancers ?"), ['allaitement', 'proteg', 'cancer'])
+        self.assertEqual(tokenize("Qu'est-ce que le cancer du sein ?"), ['cancer', 'sein'])
+
+    def test_ranking_prefers_the_matching_entry(self):
+        hits = self.index.search("mammographie : à quel âge ?", 4)
+        self.assertEqual(hits[0][0], 2)
+        scores = [score for _, score, _ in hits]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_similarity_scale(self):
+        similarity = {eid: sim for eid, _, sim in self.index.search("Qu'est-ce que le cancer du sein ?", 4)}
+        self.assertAlmostEqual(similarity[0], 1.0)
+        self.assertTrue(all(0.0 <= value <= 1.0 for value in similarity.values()))
+
+    def test_unknown_query_terms_lower_the_similarity(self):
+        for question in ("Mon chat a-t-il un cancer ?", "Le cancer du poumon est-il contagieux ?",
+                         "Les déodorants favorisent-ils le cancer ?"):
+            with self.subTest(question=question):
+                similarity = {eid: sim for eid, _, sim in self.index.search(question, 4)}
+                self.assertLess(similarity.get(0, 0.0), Config.get('EXTRACTIVE_MIN_SIMILARITY'))
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+        self.assertEqual([eid for eid, _ in fused], [1, 3, 2])
+        self.assertAlmostEqual(dict(fused)[1], 1 / 61 + 1 / 62)
+
+
+class SharedFlatIndexTests(CorpusTestMixin, SimpleTestCase):
+    """La recherche sur la matrice float16 partagée rend les mêmes ids que FAISS"""
+
+    def test_memmap_float16_search_matches_faiss(self):
+        rng = np.random.default_rng(1)
+        ids = np.arange(500, 1800, dtype='int64')
+        for index_type in ('flat_ip', 'flat_l2'):
+            with self.subTest(index_type=index_type):
+                vectors = prepare_vectors(rng.normal(size=(len(ids), 48)), index_type).astype('float16')
+                path = os.path.join(self.tmp_dir, f'{index_type}.npy')
+                np.save(path, vectors)
+                shared = SharedFlatIndex(np.load(path, mmap_mode='r'), ids, index_type, chunk_size=256)
+                reference = build_index(vectors.astype('float32'), index_type, ids=ids)
+
+                queries = prepare_vectors(rng.normal(size=(20, 48)), index_type)
+                shared_scores, shared_ids = shared.search(queries, 10)
+                faiss_scores, faiss_ids = reference.search(queries, 10)
+                np.testing.assert_array_equal(shared_ids, faiss_ids)
+                np.testing.assert_allclose(shared_scores, faiss_scores, rtol=1e-4, atol=1e-4)
+
+    def test_short_index_pads_like_faiss(self):
+        vectors = prepare_vectors(np.eye(3, 8), 'flat_ip')
+        scores, ids = SharedFlatIndex(vectors, np.array([7, 8, 9]), 'flat_ip').search(vectors[:1], 5)
+        self.assertEqual(ids[0].tolist(), [7, 8, 9, -1, -1])
+
+    def test_corpus_delta_is_served_from_the_shared_store(self):
+        self.write_corpus(CORPUS[:3])
+        config = {'EMBEDDING_MMAP': True, 'EMBEDDING_STORE_DTYPE': 'float16'}
+        self.rag_service(**config)
+        self.write_corpus(CORPUS[1:])
+        service = self.rag_service(**config)
+        self.assertEqual(service.index_cache_status, 'incremental')
+        self.assertIsInstance(service.index, SharedFlatIndex)
+        self.assertIsInstance(service.embeddings, np.memmap)
+        self.assertEqual(service.embeddings.dtype, np.float16)
+        self.assertEqual(service.index.ntotal, 3)
+        results = service.search(CORPUS[3]['question'])
+        self.assertEqual(results[0]['answer'], CORPUS[3]['answer'])
+        removed = entry_id(CORPUS[0]['question'], CORPUS[0]['answer'])
+        self.assertNotIn(removed, [result['id'] for result in service.search(CORPUS[0]['question'])])
+
+
+class ChatStreamTests(SimpleTestCase):
+    """Flux SSE : itérateur asynchrone sous ASGI, créneau libéré en fin de flux"""
+
+    EVENTS = [{'type': 'token', 'text': 'Bonjour'}, {'type': 'done', 'answer': 'Bonjour', 'method': 'generated'}]
+
+    def setUp(self):
+        self.slots = views._ChatSlots(1)
+        patches = [
+            mock.patch.object(views, '_chat_slots', self.slots),
+            mock.patch.object(views, 'chatbot_loader'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        views.chatbot_loader.get_service.return_value.process_question_stream.return_value = iter(self.EVENTS)
+
+    def _post(self, factory):
+        request = factory.post('/chatbot/stream/', {'question': 'Bonjour ?'}, content_type='application/json')
+        request.session = importlib.import_module(settings.SESSION_ENGINE).SessionStore()
+        return views.chat_stream(request)
+
+    def test_asgi_request_streams_asynchronously(self):
+        response = self._post(AsyncRequestFactory())
+        self.assertTrue(response.is_async)
+        self.assertFalse(self.slots.acquire())
+
+        async def consume():
+            return [chunk async for chunk in response.streaming_content]
+
+        chunks = asyncio.run(consume())
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(chunks[0].startswith(b'event: token\n'))
+        self.assertTrue(chunks[1].startswith(b'event: done\n'))
+        self.assertTrue(self.slots.acquire())
+        self.slots.release()
+
+    def test_wsgi_request_keeps_the_sync_iterator(self):
+        response = self._post(RequestFactory())
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(list(response.streaming_content)), 2)
+        self.assertTrue(self.slots.acquire())
+        self.slots.release()
+
+
+class StreamedAnswerCacheTests(SimpleTestCase):
+    """Une réponse streamée n'entre dans le cache que si elle est valide"""
+
+    def _stream(self, parts):
+        service = ChatbotService.__new__(ChatbotService)
+        service.groq_service = GroqService.__new__(GroqService)
+        service.groq_service.stream_response = mock.Mock(return_value=iter(parts))
+        service._cached_answer = mock.Mock(return_value=None)
+        service._cache_answer = mock.Mock()
+        request = GenerationRequest('Question ?', '', [], 'generated', 0.6, 'repli', 'erreur')
+        with mock.patch.object(GroqService, 'available', new_callable=mock.PropertyMock, return_value=True):
+            self.assertEqual(''.join(service._generate_stream(request)), ''.join(parts))
+        return service._cache_answer
+
+    def test_short_answer_is_not_cached(self):
+        self._stream(['Trop ', 'court.']).assert_not_called()
+
+    def test_refusal_is_not_cached(self):
+        self._stream(['Désolé, je ne peux pas répondre ', 'à cette question précise.']).assert_not_called()
+
+    def test_valid_answer_is_cached(self):
+        parts = ['La mammographie est recommandée ', 'tous les deux ans à partir de 40 ans.']
+        cache_answer = self._stream(parts)
+        cache_answer.assert_called_once_with(mock.ANY, ''.join(parts))
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    """Cache sémantique des réponses : seuil, contexte, TTL et LRU"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('chatbot.services.answer_cache.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _vector(angle):
+        return np.array([np.cos(angle), np.sin(angle), 0.0])
+
+    def test_threshold_on_cosine(self):
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.put(self._vector(0.0), ('generated', 1), 'réponse')
+        self.assertEqual(cache.get(self._vector(0.2) * 3, ('generated', 1)), 'réponse')  # cos 0.98
+        self.assertIsNone(cache.get(self._vector(0.4), ('generated', 1)))  # cos 0.92
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_context_key_must_match(self):
+        cache = SemanticAnswerCache()
+        cache.put(self._vector(0.0), ('generated', 1, 2), 'réponse')
+        self.assertIsNone(cache.get(self._vector(0.0), ('generated', 1, 3)))
+        self.assertIsNone(cache.get(self._vector(0.0), ('followup_generated', 1, 2)))
+
+    def test_entries_expire_after_ttl(self):
+        cache = SemanticAnswerCache(ttl=60)
+        cache.put(self._vector(0.0), ('generated',), 'réponse')
+        self.now += 59
+        self.assertEqual(cache.get(self._vector(0.0), ('generated',)), 'réponse')
+        self.now += 2
+        self.assertIsNone(cache.get(self._vector(0.0), ('generated',)))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = SemanticAnswerCache(max_size=2)
+        cache.put(self._vector(0.0), ('a',), 'A')
+        cache.put(self._vector(0.0), ('b',), 'B')
+        self.assertEqual(cache.get(self._vector(0.0), ('a',)), 'A')
+        cache.put(self._vector(0.0), ('c',), 'C')
+        self.assertIsNone(cache.get(self._vector(0.0), ('b',)))
+        self.assertEqual(cache.get(self._vector(0.0), ('a',)), 'A')
+        self.assertEqual(cache.evictions, 1)
+
+    def test_history_enters_the_context_key(self):
+        history = [{'role': 'user', 'content': "J'ai 35 ans."}, {'role': 'assistant', 'content': 'Noté.'}]
+        other = [{'role': 'user', 'content': "J'ai 60 ans."}, {'role': 'assistant', 'content': 'Noté.'}]
+
+        def key(history):
+            return GenerationRequest('Question ?', '', history, 'generated', 0.6, '', '', context_key=[1, 2]).context_key
+
+        self.assertEqual(key([]), ('generated', 1, 2))
+        self.assertEqual(key(history), key(list(history)))
+        self.assertNotEqual(key(history), key([]))
+        self.assertNotEqual(key(history), key(other))
+
+
+class LoadTestCommandTests(SimpleTestCase):
+    """Le test de charge ne vise pas l'API Groq réelle par mégarde"""
+
+    @override_settings(GROQ_BASE_URL=None)
+    def test_refuses_to_run_against_the_real_api(self):
+        with mock.patch('chatbot.management.commands.load_test_chatbot.ChatbotService') as service:
+            with self.assertRaisesMessage(CommandError, '--allow-real-groq'):
+                call_command('load_test_chatbot', '--requests', '1')
+        service.assert_not_called()
+
+    @override_settings(GROQ_BASE_URL=None)
+    def test_real_api_needs_the_explicit_flag(self):
+        with mock.patch('chatbot.management.commands.load_test_chatbot.ChatbotService') as service:
+            service.return_value.rag_service.questions_data = []
+            with self.assertRaisesMessage(CommandError, 'Corpus vide'):
+                call_command('load_test_chatbot', '--allow-real-groq', stdout=io.StringIO(), stderr=io.StringIO())
+        service.assert_called_once_with()
+
+
+class ExtractiveComposerTests(SimpleTestCase):
+    """Sélection des phrases de la réponse composée localement"""
+
+    # Vecteurs des phrases : la question vaut [1, 0, 0]
+    VECTORS = {
+        "La mammographie se fait tous les deux ans.": [0.9, 0.1, 0.0],
+        "Elle est indolore pour la plupart des femmes.": [0.0, 1.0, 0.0],
+        "Le dépistage commence à partir de 40 ans.": [0.8, 0.0, 0.6],
+        "La mammographie a lieu tous les deux ans.": [0.9, 0.12, 0.0],
+        "Consultez un médecin en cas de doute.": [0.6, -0.8, 0.0],
+    }
+    QUERY = np.array([1.0, 0.0, 0.0])
+
+    def setUp(self):
+        self.encode = mock.Mock(side_effect=lambda texts: np.array([self.VECTORS[text] for text in texts]))
+        self.results = [
+            {'answer': "Elle est indolore pour la plupart des femmes. La mammographie se fait tous les deux ans."},
+            {'answer': "Le dépistage commence à partir de 40 ans. La mammographie a lieu tous les deux ans."},
+            {'answer': "Consultez un médecin en cas de doute. Oui."},
+        ]
+
+    def test_best_sentences_are_kept_in_their_original_order(self):
+        composer = ExtractiveComposer(self.encode, min_sentence_score=0.5)
+        self.assertEqual(
+            composer.compose(self.QUERY, self.results),
+            "La mammographie se fait tous les deux ans. Le dépistage commence à partir de 40 ans. "
+            "Consultez un médecin en cas de doute.",
+        )
+
+    def test_max_sentences_keeps_the_highest_scores(self):
+        composer = ExtractiveComposer(self.encode, min_sentence_score=0.5, max_sentences=2)
+        self.assertEqual(
+            composer.compose(self.QUERY, self.results),
+            "La mammographie se fait tous les deux ans. Le dépistage commence à partir de 40 ans.",
+        )
+
+    def test_no_sentence_above_the_score_gives_none(self):
+        composer = ExtractiveComposer(self.encode, min_sentence_score=0.999)
+        self.assertIsNone(composer.compose(self.QUERY, self.results))
+        self.assertIsNone(composer.compose(self.QUERY, [{'answer': "Oui."}]))
+
+    def test_sentence_embeddings_are_cached(self):
+        composer = ExtractiveComposer(self.encode)
+        composer.compose(self.QUERY, self.results)
+        composer.compose(self.QUERY, self.results[:2])
+        self.encode.assert_called_once()
+
+
+class InMemoryConversationStoreTests(SimpleTestCase):
+    """Historiques en mémoire bornés en messages, en inactivité, en utilisateurs et en octets"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('chatbot.services.conversation_store.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_history_keeps_the_last_messages(self):
+        store = InMemoryConversationStore(max_messages=3)
+        for turn in range(5):
+            store.add_message('u', 'user', f"Message {turn}")
+        self.assertEqual([m['content'] for m in store.get_history('u')], ["Message 2", "Message 3", "Message 4"])
+        self.assertEqual(store.stats()['bytes'], 3 * Message('user', "Message 0").size)
+
+    def test_rolled_out_topics_become_a_summary(self):
+        store = InMemoryConversationStore(max_messages=2, summary_topics=2)
+        for topic in ("Dépistage", "Allaitement", "Dépistage", "Symptômes"):
+            store.add_message('u', 'user', "Question ?", topic=topic)
+        history = store.get_history('u')
+        self.assertEqual(history[0]['role'], 'system')
+        self.assertIn("Allaitement", history[0]['content'])
+        self.assertEqual(len(history), 3)
+
+    def test_idle_conversation_expires(self):
+        store = InMemoryConversationStore(max_messages=4, idle_ttl=60)
+        store.add_message('u', 'user', "Bonjour")
+        self.now += 59
+        self.assertEqual(len(store.get_history('u')), 1)
+        self.now += 61
+        self.assertEqual(store.get_history('u'), [])
+        self.assertEqual(store.stats()['expirations'], 1)
+        self.assertEqual(store.stats()['users'], 0)
+
+    def test_idle_conversations_are_dropped_on_write(self):
+        store = InMemoryConversationStore(max_messages=4, idle_ttl=60)
+        store.add_message('ancien', 'user', "Bonjour")
+        self.now += 120
+        store.add_message('nouveau', 'user', "Bonjour")
+        self.assertEqual(store.stats()['users'], 1)
+        self.assertEqual(store.stats()['expirations'], 1)
+
+    def test_least_recently_used_user_is_evicted(self):
+        store = InMemoryConversationStore(max_messages=4, max_users=2)
+        store.add_message('a', 'user', "Bonjour")
+        store.add_message('b', 'user', "Bonjour")
+        store.get_history('a')
+        store.add_message('c', 'user', "Bonjour")
+        self.assertEqual(store.get_history('b'), [])
+        self.assertEqual(len(store.get_history('a')), 1)
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_memory_bound_evicts_oldest_conversations(self):
+        size = Message('user', "x" * 10).size
+        store = InMemoryConversationStore(max_messages=4, max_bytes=2 * size + 1)
+        store.add_message('a', 'user', "x" * 10)
+        store.add_message('b', 'user', "x" * 10)
+        store.add_message('c', 'user', "x" * 10)
+        self.assertEqual(store.get_history('a'), [])
+        self.assertEqual(store.stats()['bytes'], 2 * size)
+        self.assertEqual(store.stats()['evictions'], 1)
+
+
+class ChatViewTests(SimpleTestCase):
+    """/chatbot/ask/ et /chatbot/stream/ : CSRF, validation, créneaux et chargement"""
+
+    ENDPOINTS = ('chatbot:ask', 'chatbot:chat_stream')
+
+    def setUp(self):
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.loader = ChatbotServiceLoader()
+        self.loader.state = STATE_LOADING
+        self.slots = views._ChatSlots(1)
+        for patcher in (mock.patch.object(views, 'chatbot_loader', self.loader),
+                        mock.patch.object(views, '_chat_slots', self.slots)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _post(self, client, name, question):
+        return client.post(reverse(name), {'question': question}, content_type='application/json')
+
+    @staticmethod
+    def _events(response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_post_without_csrf_token_is_rejected(self):
+        client = Client(enforce_csrf_checks=True)
+        for name in self.ENDPOINTS:
+            with self.subTest(name=name):
+                self.assertEqual(self._post(client, name, "Bonjour ?").status_code, 403)
+
+    def test_post_with_the_page_csrf_token_is_accepted(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(reverse('chatbot:chat'))
+        response = client.post(reverse('chatbot:ask'), {'question': "Bonjour ?"}, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_question_is_a_bad_request(self):
+        for name in self.ENDPOINTS:
+            with self.subTest(name=name):
+                self.assertEqual(self._post(Client(), name, "   ").status_code, 400)
+
+    def test_busy_when_all_slots_are_taken(self):
+        self.assertTrue(self.slots.acquire())
+        self.addCleanup(self.slots.release)
+        for name in self.ENDPOINTS:
+            with self.subTest(name=name):
+                response = self._post(Client(), name, "Bonjour ?")
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '1')
+                self.assertEqual(json.loads(response.content)['method'], 'busy')
+
+    def test_loading_service_answers_immediately(self):
+        response = self._post(Client(), 'chatbot:ask', "Bonjour ?")
+        self.assertEqual(json.loads(response.content), {'answer': LOADING_ANSWER, 'method': 'loading'})
+        events = self._events(self._post(Client(), 'chatbot:chat_stream', "Bonjour ?"))
+        self.assertIn('event: done', events)
+        self.assertIn('"method": "loading"', events)
+        self.assertTrue(self.slots.acquire())
+        self.slots.release()
+
+    def test_conversation_id_is_random_and_stable(self):
+        self.loader.state = STATE_READY
+        self.loader.service = mock.Mock()
+        self.loader.service.process_question.return_value = {'answer': "Bonjour !", 'method': 'salutation'}
+        client = Client()
+        for _ in range(2):
+            self._post(client, 'chatbot:ask', "Bonjour ?")
+        first, second = [call.args[1] for call in self.loader.service.process_question.call_args_list]
+        self.assertEqual(first, second)
+        self.assertEqual(client.session[views.SESSION_USER_KEY], first)
+        self.assertNotEqual(client.session.session_key, first)
+        self._post(Client(), 'chatbot:ask', "Bonjour ?")
+        self.assertNotEqual(self.loader.service.process_question.call_args.args[1], first)
+
+
+class QueryLogTests(CorpusTestMixin, SimpleTestCase):
+    """Journal des questions (sur option) et liste de préchauffage"""
+
+    def setUp(self):
+        super().setUp()
+        self.write_corpus(CORPUS)
+        self.log_path = os.path.join(self.tmp_dir, 'logs', 'query_log.jsonl')
+
+    def _chatbot(self, **config):
+        self.rag_service(QUERY_LOG_PATH=self.log_path, **config)
+        service = ChatbotService()
+        self.addCleanup(service.cpu_executor.shutdown)
+        return service
+
+    def _write_log(self, entries):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        with open(self.log_path, 'w', encoding='utf-8') as f:
+            for question, method, ts in entries:
+                f.write(json.dumps({'ts': ts, 'question': question, 'method': method}) + '\n')
+
+    def test_disabled_by_default(self):
+        service = self._chatbot(QUERY_LOG=settings.CHATBOT_CONFIG.get('QUERY_LOG', False))
+        self.assertIsNone(service.query_log)
+        service.process_question(CORPUS[0]['question'], 'u')
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_opt_in_records_normalized_questions(self):
+        service = self._chatbot(QUERY_LOG=True, QUERY_LOG_SAMPLE_RATE=1.0)
+        self.assertIsInstance(service.query_log, QueryLog)
+        service.process_question("  Qu'est-ce que le cancer du sein ?  ", 'u')
+        service.query_log.flush()
+        with open(self.log_path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['question'], normalize_query(CORPUS[0]['question']))
+        self.assertEqual(entries[0]['method'], 'exact')
+        self.assertEqual(service.query_log.stats()['recorded'], 1)
+
+    def test_frequent_questions_groups_variants(self):
+        self._write_log([
+            ("c'est quoi le cancer du sein ?", 'generated', 100),
+            ("c'est quoi le cancer du sein", 'generated', 200),
+            ("c'est quoi le cancer du sein ?", 'direct', 300),
+            ("bonjour", 'salutation', 300),
+            ("bonjour", 'salutation', 300),
+            ("mammographie à quel âge ?", 'direct', 400),
+            ("mammographie à quel âge ?", 'direct', 50),
+        ])
+        self.assertEqual(frequent_questions(self.log_path), [
+            ("c'est quoi le cancer du sein ?", 3),
+            ("mammographie à quel âge ?", 2),
+        ])
+        # Égalité entre variantes : la première rencontrée représente le groupe
+        self.assertEqual(frequent_questions(self.log_path, since=150, min_count=1), [
+            ("c'est quoi le cancer du sein", 2),
+            ("mammographie à quel âge ?", 1),
+        ])
+
+    def test_build_warm_questions_writes_the_warm_list(self):
+        self._write_log([("comment faire l'autopalpation ?", 'generated', 100)] * 3
+                        + [("question rare ?", 'generated', 100)])
+        output = os.path.join(self.tmp_dir, 'warm', 'warm_questions.json')
+        call_command('build_warm_questions', '--log', self.log_path, '--output', output, stdout=io.StringIO())
+        self.assertEqual(load_warm_list(output), [{'question': "comment faire l'autopalpation ?", 'count': 3}])
+
+    def test_build_warm_questions_needs_a_log(self):
+        with self.assertRaisesMessage(CommandError, 'introuvable'):
+            call_command('build_warm_questions', '--log', self.log_path, '--output', 'warm.json')
+
+
+class PrepareBandTests(SimpleTestCase):
+    """La bande de réponse se décide sur la similarité dense, pas sur l'ordre RRF"""
+
+    def test_direct_answer_when_fused_order_demotes_best_dense_match(self):
+        # Ordre RRF : B (0.70) devant A (0.86)
+        service = _bare_chatbot([_result('B', 0.70), _result('A', 0.86), _result('D', 0.40)])
+        result = service._prepare("question", 'u', [], IntentDecision(INTENT_FAQ, 'test'))
+        self.assertEqual(result['method'], 'direct')
+        self.assertEqual(result['answer'], "Réponse A.")
+        self.assertAlmostEqual(result['score'], 0.86)
+
+    def test_generation_context_keeps_fused_order(self):
+        service = _bare_chatbot([_result('B', 0.50), _result('A', 0.60), _result('D', 0.40)])
+        request = service._prepare("question", 'u', [], IntentDecision(INTENT_FAQ, 'test'))
+        self.assertIsInstance(request, GenerationRequest)
+        self.assertEqual(request.score, 0.60)
+        self.assertEqual(request.topic, "Question A ?")
+        self.assertTrue(request.context.startswith("1. Q: Question B ?"))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def test_concurrent_calls_share_one_execution(self):
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'answer': "partagée"}
+
+        def call():
+            results.append(self.flight.do('clé', compute))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=call) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        while self.flight.stats()['coalesced'] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(result == {'answer': "partagée"} for result, _ in results))
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_exception_reaches_every_waiter(self):
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def compute():
+            started.set()
+            release.wait(5)
+            raise RuntimeError("Groq indisponible")
+
+        def call():
+            try:
+                self.flight.do('clé', compute)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        while self.flight.stats()['coalesced'] < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(errors, ["Groq indisponible"] * 2)
+
+    def test_nothing_is_kept_after_completion(self):
+        self.assertEqual(self.flight.do('clé', lambda: 1), (1, False))
+        self.assertEqual(self.flight.do('clé', lambda: 2), (2, False))
+        self.assertEqual(self.flight.stats()['executed'], 2)
+
+    def test_async_calls_share_one_execution(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "partagée"
+
+        async def run():
+            return await asyncio.gather(*(self.flight.ado('clé', compute) for _ in range(4)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+
+class FlightKeyTests(SimpleTestCase):
+    """Seules les questions sans historique sont partagées entre utilisateurs"""
+
+    def setUp(self):
+        self.service = ChatbotService.__new__(ChatbotService)
+        self.service.single_flight = SingleFlight()
+        self.faq = IntentDecision(INTENT_FAQ, 'test')
+
+    def test_first_question_is_coalesced_on_its_normalized_form(self):
+        self.assertEqual(self.service._flight_key("Qu'est-ce que le cancer du sein ?", [], self.faq),
+                         self.service._flight_key("qu'est-ce que le cancer du sein", [], self.faq))
+
+    def test_question_with_history_is_never_coalesced(self):
+        history = [{'role': 'user', 'content': "J'ai une boule au sein droit"}]
+        self.assertIsNone(self.service._flight_key("Qu'est-ce que le cancer du sein ?", history, self.faq))
+        self.assertIsNone(self.service._flight_key("Pourquoi ?", [], IntentDecision(INTENT_FOLLOWUP, 'test')))
+
+
+class IntentRouterTests(SimpleTestCase):
+    """Une question exacte de la FAQ est routée sans encodage"""
+
+    HISTORY = [{'role': 'user', 'content': "Bonjour"}, {'role': 'assistant', 'content': "Bonjour !"}]
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        rag_service = mock.Mock(dense_enabled=False)
+        rag_service.embed_query.return_value = np.array([[1.0, 0.0]])
+        rag_service.embeddings = np.array([[0.0, 1.0]])
+        self.router = IntentRouter(rag_service)
+        self.router._followup_centroid = np.array([1.0, 0.0])
+        self.rag_service = rag_service
+
+    def test_exact_faq_question_skips_the_embedding(self):
+        self.rag_service.lookup_exact.return_value = _result('A', 1.0)
+        decision = self.router.route("Qu'est-ce que le cancer du sein ?", self.HISTORY)
+        self.assertEqual(decision.intent, INTENT_FAQ)
+        self.rag_service.embed_query.assert_not_called()
+
+    def test_other_questions_are_compared_to_the_centroids(self):
+        self.rag_service.lookup_exact.return_value = None
+        decision = self.router.route("Le stress peut-il jouer un rôle dans la maladie ?", self.HISTORY)
+        self.assertEqual(decision.intent, INTENT_FOLLOWUP)
+        self.rag_service.embed_query.assert_called_once()
+
+
+class WordCounter(TokenCounter):
+    """Un jeton par mot : budgets faciles à calculer dans les tests"""
+
+    def __init__(self):
+        self.tokenizer = None
+
+    def count(self, text):
+        return len(text.split())
+
+
+class PromptBudgetTests(SimpleTestCase):
+    """Troncature du prompt au budget de jetons d'entrée"""
+
+    SYSTEM = "Tu es un assistant. {context}"  # 4 mots + 4
+    QUESTION = "Quand consulter ?"  # 3 mots + 4
+
+    def _build(self, budget, context_items=(), history=()):
+        return PromptBuilder(WordCounter(), budget=budget, max_history=6).build(
+            self.SYSTEM, list(context_items), self.QUESTION, list(history)
+        )
+
+    def test_context_items_are_kept_in_relevance_order_until_the_budget(self):
+        items = ["un deux trois", "quatre cinq six", "sept"]
+        # 15 jetons fixes, puis 4 par élément (séparateur compris)
+        messages, stats = self._build(budget=23, context_items=items)
+        self.assertEqual(messages[0]['content'], "Tu es un assistant. un deux trois\n\nquatre cinq six")
+        self.assertEqual((stats['context_items'], stats['context_available']), (2, 3))
+        self.assertLessEqual(stats['input_tokens'], 23)
+
+    def test_oldest_history_is_dropped_first(self):
+        history = [{'role': 'user' if turn % 2 == 0 else 'assistant', 'content': f"message {turn}"}
+                   for turn in range(4)]
+        # 15 jetons fixes, puis 2 + MESSAGE_OVERHEAD par message
+        messages, stats = self._build(budget=15 + 2 * (2 + MESSAGE_OVERHEAD), history=history)
+        self.assertEqual(messages[1:-1], history[-2:])
+        self.assertEqual((stats['history_messages'], stats['history_available']), (2, 4))
+
+    def test_context_wins_over_history(self):
+        history = [{'role': 'user', 'content': "message ancien"}]
+        messages, stats = self._build(budget=19, context_items=["un deux trois"], history=history)
+        self.assertEqual(stats['context_items'], 1)
+        self.assertEqual(messages, [messages[0], {'role': 'user', 'content': self.QUESTION}])
+
+    def test_system_prompt_and_question_are_always_sent(self):
+        history = [{'role': 'user', 'content': "message"}]
+        messages, stats = self._build(budget=5, context_items=["contexte"], history=history)
+        self.assertEqual(messages, [
+            {'role': 'system', 'content': "Tu es un assistant. "},
+            {'role': 'user', 'content': self.QUESTION},
+        ])
+        self.assertGreater(stats['input_tokens'], stats['budget'])
+
+
+class PromptHistoryTests(SimpleTestCase):
+    """Le résumé des échanges anciens survit à la fenêtre max_history"""
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        store = InMemoryConversationStore(max_messages=8, summary_topics=3)
+        for turn in range(6):
+            store.add_message('u', 'user', f"Question {turn} ?", topic=f"Sujet {turn}")
+            store.add_message('u', 'assistant', f"Réponse {turn}.")
+        self.history = store.get_history('u')
+
+    def _build(self, budget):
+        return PromptBuilder(TokenCounter(None), budget=budget, max_history=6).build(
+            "Contexte : {context}", [], "Et ensuite ?", self.history
+        )
+
+    def test_summary_is_kept_with_the_recent_window(self):
+        self.assertEqual(len(self.history), 9)
+        messages, stats = self._build(budget=10000)
+        self.assertEqual(messages[1], self.history[0])
+        self.assertIn("Sujet 1", messages[1]['content'])
+        self.assertEqual(messages[2:-1], self.history[-6:])
+        self.assertEqual(stats['history_messages'], 7)
+
+    def test_recent_messages_win_over_the_summary_when_the_budget_is_short(self):
+        recent_cost = sum(TokenCounter(None).count_message(m) for m in self.history[-6:])
+        messages, _ = self._build(budget=recent_cost + 20)
+        self.assertEqual(messages[1:-1], self.history[-6:])
+
+
+class StreamPostProcessorTests(SimpleTestCase):
+    """Le texte streamé est identique au nettoyage de la réponse complète"""
+
+    ANSWERS = [
+        "Bonjour ! L'autopalpation se fait une fois par mois, après les règles.",
+        "Excellente question. la mammographie est recommandée dès 40 ans.",
+        "Bonjour, voici la réponse sans point",
+        "Les signes à surveiller sont une boule, une rétraction du mamelon,",
+        "Consultez un médecin si vous remarquez un changement...",
+        "  Salutations distinguées. Le dépistage précoce sauve des vies !  ",
+        "Hi",
+        "",
+        "Le cancer du sein peut toucher les hommes; c'est rare mais possible;",
+    ]
+
+    def setUp(self):
+        self.groq = GroqService.__new__(GroqService)
+        # Avertissements « réponse coupée » attendus
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def _batch(self, raw):
+        return self.groq._ensure_complete_response(self.groq._clean_response(raw.strip()))
+
+    def _stream(self, raw, size):
+        processor = StreamPostProcessor(GroqService.UNWANTED_INTROS, self.groq._ensure_complete_response)
+        emitted = ''.join(processor.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+        emitted += processor.finish()
+        self.assertEqual(emitted, processor.text)
+        return emitted
+
+    def test_parity_with_batch_cleaning(self):
+        for raw in self.ANSWERS:
+            for size in (1, 3, 7, len(raw) or 1):
+                with self.subTest(raw=raw, size=size):
+                    self.assertEqual(self._stream(raw, size), self._batch(raw))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('chatbot.services.circuit_breaker.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30.0)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures_and_rejects(self):
+        self._fail(2)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self._fail(1)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_success_resets_the_failure_count(self):
+        self._fail(2)
+        self.breaker.record_success()
+        self._fail(2)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_trial_closes_on_success(self):
+        self._fail(3)
+        self.now += 30
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_trial_reopens_on_failure(self):
+        self._fail(3)
+        self.now += 30
+        self._fail(1)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_release_frees_the_half_open_trial(self):
+        self._fail(3)
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow_request())
+
+
+class GroqFailureAccountingTests(SimpleTestCase):
+    """Seules les défaillances du service ouvrent le circuit"""
+
+    class TransportError(Exception):
+        pass
+
+    class BadRequestError(Exception):
+        pass
+
+    def setUp(self):
+        self.groq = GroqService.__new__(GroqService)
+        self.groq.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30.0)
+        self.groq.max_retries = 1
+        self.groq._retryable_errors = (self.TransportError,)
+        self.groq._status_errors = (self.BadRequestError,)
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        for _ in range(10):
+            self.assertFalse(self.groq._should_retry(self.BadRequestError("400"), attempt=0))
+        self.assertEqual(self.groq.breaker.state, STATE_CLOSED)
+
+    def test_service_failures_open_the_circuit(self):
+        self.assertTrue(self.groq._should_retry(self.TransportError("timeout"), attempt=0))
+        self.assertFalse(self.groq._should_retry(self.TransportError("timeout"), attempt=1))
+        self.assertFalse(self.groq._should_retry(self.TransportError("timeout"), attempt=1))
+        self.assertEqual(self.groq.breaker.state, STATE_OPEN)
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+        self.fail_next = 0
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def _flush(self, batch):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError("base indisponible")
+        self.batches.append(list(batch))
+        self.written.set()
+
+    def _buffer(self, **kwargs):
+        buffer = WriteBehindBuffer(self._flush, name='test-write-behind', **kwargs)
+        self.addCleanup(buffer.flush)
+        return buffer
+
+    def test_full_batch_is_written_without_waiting_for_the_interval(self):
+        buffer = self._buffer(max_batch=3, interval=60)
+        for item in range(3):
+            buffer.add(item)
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [[0, 1, 2]])
+
+    def test_partial_batch_is_written_after_the_interval(self):
+        buffer = self._buffer(max_batch=100, interval=0.05)
+        buffer.add('a')
+        buffer.add('b')
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [['a', 'b']])
+        self.assertEqual(buffer.stats()['pending'], 0)
+
+    def test_failed_batch_is_requeued_in_order(self):
+        self.fail_next = 1
+        buffer = self._buffer(max_batch=100, interval=0.05)
+        buffer.add('a')
+        buffer.add('b')
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [['a', 'b']])
+        self.assertEqual(buffer.stats()['failures'], 1)
+        self.assertEqual(buffer.stats()['flushed'], 2)
+
+    def test_requeue_drops_the_oldest_beyond_max_pending(self):
+        self.fail_next = 1
+        buffer = self._buffer(max_batch=100, interval=60, max_pending=2)
+        for item in ('a', 'b', 'c'):
+            buffer.add(item)
+        buffer.flush()
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        buffer.flush()
+        self.assertEqual(self.batches, [['b', 'c']])
+
+    def test_read_through_returns_matching_pending_items(self):
+        buffer = self._buffer(max_batch=100, interval=60)
+        for item in (('u1', 'a'), ('u2', 'b'), ('u1', 'c')):
+            buffer.add(item)
+        stored, pending = buffer.read_through(lambda: 'en base', lambda item: item[0] == 'u1')
+        self.assertEqual(stored, 'en base')
+        self.assertEqual(pending, [('u1', 'a'), ('u1', 'c')])
+
+
+def _onnx_model_available() -> bool:
+    model_dir = Config.get('ONNX_MODEL_DIR') or ''
+    return (importlib.util.find_spec('onnxruntime') is not None
+            and importlib.util.find_spec('torch') is not None
+            and os.path.exists(os.path.join(model_dir, ONNX_MODEL_FILE)))
+
+
+@unittest.skipUnless(_onnx_model_available(), "onnxruntime, torch ou le modèle exporté absent")
+class OnnxParityTests(SimpleTestCase):
+    """Les backends ONNX restent interchangeables avec la référence PyTorch"""
+
+    TEXTS = [
+        "Quels sont les symptômes du cancer du sein ?",
+        "Comment faire l'autopalpation des seins ?",
+        "À quel âge commencer la mammographie ?",
+        "Le cancer du sein touche-t-il aussi les hommes ?",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model_name = Config.get('EMBEDDING_MODEL', Config.EMBEDDING_MODEL)
+        cls.reference = create_embedding_backend('sentence_transformers', cls.model_name).encode(cls.TEXTS)
+
+    def _cosines(self, backend):
+        vectors = create_embedding_backend(
+            backend, self.model_name, model_dir=Config.get('ONNX_MODEL_DIR'), **Config.get('ONNX_OPTIONS', {})
+        ).encode(self.TEXTS)
+        normalize = lambda v: v / np.linalg.norm(v, axis=1, keepdims=True)
+        return (normalize(vectors) * normalize(self.reference)).sum(axis=1)
+
+    def test_onnx_matches_pytorch(self):
+        self.assertGreaterEqual(self._cosines('onnx').min(), 0.99)
+
+    def test_onnx_int8_stays_close_to_pytorch(self):
+        self.assertGreaterEqual(self._cosines('onnx_int8').mean(), 0.98)
+
+    def test_top_k_on_the_bundled_corpus_matches_pytorch(self):
+        entries = list(load_corpus(corpus_files(os.path.join(settings.BASE_DIR, 'chatbot', 'data'))).values())
+        texts = [entry_text(entry) for entry in entries]
+        questions = [entry['question_originale'] for entry in entries][:100]
+
+        def top_k(backend, k=5):
+            encoder = create_embedding_backend(
+                backend, self.model_name, model_dir=Config.get('ONNX_MODEL_DIR'),
+                **(Config.get('ONNX_OPTIONS', {}) if backend != 'sentence_transformers' else {}),
+            )
+            corpus = prepare_vectors(encoder.encode(texts), 'flat_ip')
+            queries = prepare_vectors(encoder.encode(questions), 'flat_ip')
+            return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+        expected = top_k('sentence_transformers')
+        for backend in ('onnx', 'onnx_int8'):
+            with self.subTest(backend=backend):
+                found = top_k(backend)
+                np.testing.assert_array_equal(found[:, 0], expected[:, 0])
+                overlap = np.mean([len(set(e) & set(f)) / 5 for e, f in zip(expected, found)])
+                self.assertGreaterEqual(overlap, 0.9)
+
+
+@unittest.skipUnless(importlib.util.find_spec('onnx') and importlib.util.find_spec('onnxruntime'),
+                     "onnx ou onnxruntime absent")
+class QuantizedModelTests(SimpleTestCase):
+    """La variante int8 n'apparaît qu'une fois entièrement écrite"""
+
+    def setUp(self):
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, True)
+        weights = numpy_helper.from_array(np.random.default_rng(0).normal(size=(64, 64)).astype('float32'), 'W')
+        graph = helper.make_graph(
+            [helper.make_node('MatMul', ['x', 'W'], ['y'])], 'test',
+            [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 64])],
+            [helper.make_tensor_value_info('y', TensorProto.FLOAT, [1, 64])],
+            initializer=[weights],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+        onnx.save(model, os.path.join(self.model_dir, ONNX_MODEL_FILE))
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_quantized_model_is_written_atomically(self):
+        path = ensure_quantized_model(self.model_dir)
+        self.assertEqual(path, os.path.join(self.model_dir, ONNX_INT8_MODEL_FILE))
+        self.assertEqual(sorted(os.listdir(self.model_dir)), [ONNX_MODEL_FILE, ONNX_INT8_MODEL_FILE])
+
+    def test_failed_quantization_leaves_nothing_behind(self):
+        def partial_write(model_input, model_output, **kwargs):
+            with open(model_output, 'wb') as f:
+                f.write(b'tronque')
+            raise RuntimeError("interrompu")
+
+        with mock.patch('onnxruntime.quantization.quantize_dynamic', partial_write):
+            with self.assertRaises(RuntimeError):
+                ensure_quantized_model(self.model_dir)
+        self.assertEqual(os.listdir(self.model_dir), [ONNX_MODEL_FILE])
@@ -4,5 +4,8 @@ from . import views
 app_name = 'chatbot'
 
 urlpatterns = [
-    path('', views.chatbot_redirect, name='chat'),
-]
\ No newline at end of file
+    path('', views.chat_page, name='chat'),
+    path('ready/', views.readiness, name='ready'),
+    path('stream/', views.chat_stream, name='chat_stream'),
+    path('ask/', views.chat_api, name='ask'),
+]
@@ -1,5 +1,192 @@
+import json
+import threading
+import uuid
 
-from django.shortcuts import render, redirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
 
-def chatbot_redirect(request):
-    return redirect('https://anontchigan-api.streamlit.app/')
\ No newline at end of file
+from core.metrics import CHAT_HTTP_REQUESTS, CHAT_IN_FLIGHT
+
+from .services.loader import chatbot_loader
+
+# Clé de session de l'identifiant de conversation (aléatoire, distinct de la clé de session)
+SESSION_USER_KEY = 'chatbot_user_id'
+
+BUSY_ANSWER = "ANONTCHIGAN reçoit beaucoup de questions en ce moment. Merci de réessayer dans un instant. 🌸"
+
+
+class _ChatSlots:
+    """Borne le nombre de questions traitées en parallèle par ce processus"""
+
+    def __init__(self, limit: int):
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def acquire(self) -> bool:
+        if self._semaphore is not None and not self._semaphore.acquire(blocking=False):
+            return False
+        CHAT_IN_FLIGHT.inc()
+        return True
+
+    def release(self):
+        CHAT_IN_FLIGHT.dec()
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+_chat_slots = _ChatSlots(settings.CHATBOT_CONFIG.get('CHAT_MAX_IN_FLIGHT', 0))
+
+
+@require_GET
+@ensure_csrf_cookie
+def chat_page(request):
+    """
+    Page du chatbot, servie par le site : elle interroge /chatbot/ask/
+    (le ChatbotService de ce processus) au lieu d'une application externe
+    """
+    chatbot_loader.start()
+    _session_user_id(request)
+    return render(request, 'chatbot/chat.html', {'page_title': 'Chatbot'})
+
+
+@require_GET
+def readiness(request):
+    """
+    Sonde de disponibilité pour le load balancer : 200 si le chatbot
+    répond (ready ou degraded), 503 pendant le chargement ou en échec
+    """
+    status = chatbot_loader.status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+@require_POST
+def chat_stream(request):
+    """
+    Réponse du chatbot en Server-Sent Events : événements `token` au fil
+    de la génération, puis un événement `done` avec le résultat complet.
+    En POST (jeton CSRF requis) : la lire avec fetch, pas avec EventSource.
+    """
+    question = _read_question(request)
+    if not question:
+        return _json_response('stream', {'error': 'Question manquante'}, status=400)
+    if not _chat_slots.acquire():
+        return _busy_response('stream')
+
+    try:
+        user_id = _session_user_id(request)
+        service = chatbot_loader.get_service()
+        if service is not None:
+            events = service.process_question_stream(question, user_id)
+        else:
+            events = iter([{'type': 'done', **chatbot_loader.process_question(question, user_id)}])
+    except Exception:
+        _chat_slots.release()
+        raise
+
+    CHAT_HTTP_REQUESTS.inc(endpoint='stream', status=200)
+    # Sous ASGI, Django consommerait un itérateur synchrone en entier avant d'envoyer
+    # la réponse : l'itérateur asynchrone transmet chaque jeton dès sa génération
+    stream = _asse_stream(events) if isinstance(request, ASGIRequest) else _sse_stream(events)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_POST
+async def chat_api(request):
+    """
+    Réponse JSON du chatbot. Sous ASGI, traitée en asynchrone : la requête
+    n'occupe aucun thread pendant l'appel à Groq. Sous WSGI, chaque requête
+    async aurait sa propre boucle d'événements (un client AsyncGroq et une
+    coalescence par requête) : le pipeline synchrone est utilisé à la place.
+    """
+    question = _read_question(request)
+    if not question:
+        return _json_response('ask', {'error': 'Question manquante'}, status=400)
+    if not _chat_slots.acquire():
+        return _busy_response('ask')
+
+    try:
+        user_id = await _asession_user_id(request)
+        if isinstance(request, ASGIRequest):
+            result = await chatbot_loader.aprocess_question(question, user_id)
+        else:
+            result = await sync_to_async(chatbot_loader.process_question, thread_sensitive=False)(
+                question, user_id
+            )
+    finally:
+        _chat_slots.release()
+    return _json_response('ask', result)
+
+
+def _read_question(request) -> str:
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return ''
+        return str(payload.get('question', '')).strip() if isinstance(payload, dict) else ''
+    return request.POST.get('question', '').strip()
+
+
+def _session_user_id(request) -> str:
+    """
+    Identifiant de conversation aléatoire gardé dans la session Django. La clé
+    de session authentifie le visiteur : elle n'est ni journalisée ni stockée
+    avec les conversations, contrairement à cet identifiant
+    """
+    user_id = request.session.get(SESSION_USER_KEY)
+    if not user_id:
+        user_id = request.session[SESSION_USER_KEY] = uuid.uuid4().hex
+    return user_id
+
+
+async def _asession_user_id(request) -> str:
+    user_id = await request.session.aget(SESSION_USER_KEY)
+    if not user_id:
+        user_id = uuid.uuid4().hex
+        await request.session.aset(SESSION_USER_KEY, user_id)
+    return user_id
+
+
+def _json_response(endpoint: str, payload: dict, status: int = 200) -> JsonResponse:
+    CHAT_HTTP_REQUESTS.inc(endpoint=endpoint, status=status)
+    return JsonResponse(payload, status=status)
+
+
+def _busy_response(endpoint: str) -> JsonResponse:
+    response = _json_response(endpoint, {'answer': BUSY_ANSWER, 'method': 'busy'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
+def _sse_stream(events):
+    """Sérialise les événements et libère le créneau quand le flux se termine"""
+    try:
+        for event in events:
+            yield _sse_event(event)
+    finally:
+        _chat_slots.release()
+
+
+async def _asse_stream(events):
+    """Variante asynchrone : chaque événement est lu dans un thread, hors de la boucle"""
+    next_event = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            event = await next_event(events, None)
+            if event is None:
+                break
+            yield _sse_event(event)
+    finally:
+        _chat_slots.release()
+
+
+def _sse_event(event: dict) -> str:
+    payload = {key: value for key, value in event.items() if key != 'type'}
+    return f"event: {event['type']}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
@@ -0,0 +1,181 @@
+"""
+Métriques en mémoire du processus (histogrammes et compteurs), exposées au
+format texte Prometheus par la vue /metrics.
+
+Chaque worker gunicorn a ses propres valeurs : Prometheus les scrape worker
+par worker ou via un agrégateur. Le coût d'une mesure est une recherche
+dichotomique et un verrou, négligeable devant les étapes mesurées.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # clé -> [comptes par bucket (+Inf inclus), somme]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, (('le', le),))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self._value}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'anontchigan_stage_duration_seconds',
+    "Durée des étapes du chatbot et du prédicteur",
+    ('component', 'stage'),
+))
+CHAT_REQUESTS = REGISTRY.register(Counter(
+    'anontchigan_chat_requests_total',
+    "Questions traitées par le chatbot, par méthode de réponse et issue",
+    ('method', 'outcome'),
+))
+CHAT_SECONDS = REGISTRY.register(Histogram(
+    'anontchigan_chat_request_duration_seconds',
+    "Durée totale de traitement d'une question, par méthode de réponse",
+    ('method',),
+))
+CHAT_HTTP_REQUESTS = REGISTRY.register(Counter(
+    'anontchigan_chat_http_requests_total',
+    "Requêtes HTTP reçues par les endpoints du chatbot, par endpoint et code de statut",
+    ('endpoint', 'status'),
+))
+CHAT_IN_FLIGHT = REGISTRY.register(Gauge(
+    'anontchigan_chat_in_flight',
+    "Questions en cours de traitement par les endpoints du chatbot",
+))
+GROQ_CALLS = REGISTRY.register(Counter(
+    'anontchigan_groq_calls_total',
+    "Appels à Groq : success, failure (transport, timeout, 429, 5xx), client_error (4xx) "
+    "ou rejected (circuit ouvert)",
+    ('outcome',),
+))
+INDEX_CACHE_LOADS = REGISTRY.register(Counter(
+    'anontchigan_index_cache_loads_total',
+    "Construction de l'index du corpus (démarrage, rechargement) : hit (artefacts disque "
+    "réutilisés), incremental (seul le delta ré-encodé) ou rebuild (corpus entier ré-encodé)",
+    ('outcome',),
+))
+PREDICTIONS = REGISTRY.register(Counter(
+    'anontchigan_predictions_total',
+    "Prédictions du CancerPredictor, par type d'entrée et issue",
+    ('kind', 'outcome'),
+))
+
+
+def span(component: str, stage: str):
+    """Mesure la durée d'une étape : `with span('chatbot', 'embed'): ...`"""
+    return STAGE_SECONDS.time(component=component, stage=stage)
+
+
+def record_chat(method: str, seconds: float):
+    CHAT_REQUESTS.inc(method=method, outcome='error' if method == 'error' else 'ok')
+    CHAT_SECONDS.observe(seconds, method=method)
@@ -1,3 +1,65 @@
-from django.test import TestCase
+from django.test import RequestFactory, SimpleTestCase, override_settings
 
-# Create your tests here.
+from . import views
+from .metrics import Counter, Gauge, Histogram, Registry
+
+
+class MetricsFormatTests(SimpleTestCase):
+    """Rendu au format texte Prometheus"""
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = registry.register(Counter('requests_total', "Requêtes", ('endpoint',)))
+        gauge = registry.register(Gauge('in_flight', "En cours"))
+        counter.inc(endpoint='ask')
+        counter.inc(2, endpoint='ask')
+        counter.inc(endpoint='a"b\\c\nd')
+        gauge.inc()
+        self.assertEqual(registry.render(), (
+            '# HELP requests_total Requêtes\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{endpoint="a\\"b\\\\c\\nd"} 1\n'
+            'requests_total{endpoint="ask"} 3\n'
+            '# HELP in_flight En cours\n'
+            '# TYPE in_flight gauge\n'
+            'in_flight 1.0\n'
+        ))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('duration_seconds', "Durée", ('stage',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, stage='search')
+        self.assertEqual(histogram.render(), [
+            '# HELP duration_seconds Durée',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{stage="search",le="0.1"} 2',
+            'duration_seconds_bucket{stage="search",le="1.0"} 3',
+            'duration_seconds_bucket{stage="search",le="+Inf"} 4',
+            'duration_seconds_sum{stage="search"} 3.65',
+            'duration_seconds_count{stage="search"} 4',
+        ])
+
+
+@override_settings(DEBUG=False, METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['10.0.0.5'])
+class MetricsAccessTests(SimpleTestCase):
+    """/metrics n'est pas public"""
+
+    def _get(self, **extra):
+        return views.metrics(RequestFactory().get('/metrics', **extra))
+
+    def test_anonymous_request_is_forbidden(self):
+        self.assertEqual(self._get().status_code, 403)
+        self.assertEqual(self._get(HTTP_AUTHORIZATION='Bearer faux').status_code, 403)
+
+    def test_bearer_token(self):
+        response = self._get(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE anontchigan_stage_duration_seconds histogram', response.content)
+
+    def test_allowed_address(self):
+        self.assertEqual(self._get(REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN=None)
+    def test_open_in_debug(self):
+        self.assertEqual(self._get().status_code, 200)
@@ -9,5 +9,6 @@ urlpatterns = [
     path('a-propos/', views.a_propos, name='a_propos'),
     path('contact/', views.contact, name='contact'),
     path('politique-confidentialite/', views.politique, name='politique'),
+    path('metrics', views.metrics, name='metrics'),
     
 ]
\ No newline at end of file
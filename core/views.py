@@ -1,3 +1,6 @@
+import hmac
+
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.core.mail import send_mail
@@ -5,6 +8,7 @@ from django.conf import settings
 from .models import ContactMessage
 import logging
 from django.utils import timezone
+from .metrics import REGISTRY
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
@@ -165,4 +169,24 @@ def politique(request):
     """
     Vue pour la page Politique de confidentialité
     """
-    return render(request, 'core/politique.html')
\ No newline at end of file
+    return render(request, 'core/politique.html')
+
+def metrics(request):
+    """
+    Métriques du processus au format texte Prometheus, réservées au scraper
+    (jeton METRICS_TOKEN ou adresse de METRICS_ALLOWED_IPS, ouvertes en DEBUG)
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _metrics_allowed(request):
+    if settings.DEBUG:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization.startswith('Bearer ') and hmac.compare_digest(
+        authorization[len('Bearer '):].encode(), token.encode()
+    ):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
@@ -9,6 +9,8 @@ from keras.regularizers import l2
 from PIL import Image
 import h5py
 
+from core.metrics import PREDICTIONS, span
+
 class CancerPredictor:
     """
     Classe pour gérer les modèles de prédiction du cancer du sein
@@ -130,16 +132,22 @@ class CancerPredictor:
         ]])
         
         # Prédiction
-        prediction = model.predict(X)[0]
-        
-        # Probabilités
         try:
-            probabilities = model.predict_proba(X)[0]
-            prob_malin = float(probabilities[0])
-            prob_benin = float(probabilities[1])
-        except AttributeError:
-            prob_malin = 0.0 if prediction == 1 else 1.0
-            prob_benin = 1.0 if prediction == 1 else 0.0
+            with span('predictor', 'tabular_inference'):
+                prediction = model.predict(X)[0]
+                
+                # Probabilités
+                try:
+                    probabilities = model.predict_proba(X)[0]
+                    prob_malin = float(probabilities[0])
+                    prob_benin = float(probabilities[1])
+                except AttributeError:
+                    prob_malin = 0.0 if prediction == 1 else 1.0
+                    prob_benin = 1.0 if prediction == 1 else 0.0
+        except Exception:
+            PREDICTIONS.inc(kind='tabular', outcome='error')
+            raise
+        PREDICTIONS.inc(kind='tabular', outcome='ok')
         
         # 0 = Malin, 1 = Bénin
         label = "Bénin" if prediction == 1 else "Malin"
@@ -168,22 +176,25 @@ class CancerPredictor:
         
         try:
             # Charger l'image (compatible avec Django UploadedFile et chemins)
-            if hasattr(image_path_or_file, 'read'):
-                # C'est un fichier uploadé Django
-                img = Image.open(image_path_or_file).convert("RGB")
-            else:
-                # C'est un chemin de fichier
-                img = Image.open(image_path_or_file).convert("RGB")
+            with span('predictor', 'decode'):
+                if hasattr(image_path_or_file, 'read'):
+                    # C'est un fichier uploadé Django
+                    img = Image.open(image_path_or_file).convert("RGB")
+                else:
+                    # C'est un chemin de fichier
+                    img = Image.open(image_path_or_file).convert("RGB")
             
             # Redimensionner (comme dans le code original)
-            img = img.resize((cls.IMG_SIZE, cls.IMG_SIZE))
-            
-            # Convertir en array et normaliser (comme dans le code original)
-            img_array = np.array(img) / 255.0
-            img_array = np.expand_dims(img_array, axis=0)
+            with span('predictor', 'resize'):
+                img = img.resize((cls.IMG_SIZE, cls.IMG_SIZE))
             
-            # Prédiction (comme dans le code original)
-            proba = float(model.predict(img_array, verbose=0)[0][0])
+            with span('predictor', 'inference'):
+                # Convertir en array et normaliser (comme dans le code original)
+                img_array = np.array(img) / 255.0
+                img_array = np.expand_dims(img_array, axis=0)
+                
+                # Prédiction (comme dans le code original)
+                proba = float(model.predict(img_array, verbose=0)[0][0])
             
             # Classification (comme dans le code original)
             predicted_class = cls.IMAGE_CLASSES[int(proba >= 0.5)]
@@ -203,6 +214,7 @@ class CancerPredictor:
             print(f"🎯 Classe prédite: {predicted_class}")
             print(f"💪 Confiance: {confidence:.1f}%")
             
+            PREDICTIONS.inc(kind='image', outcome='ok')
             return {
                 'label': label,
                 'probability': proba,
@@ -213,6 +225,7 @@ class CancerPredictor:
             }
             
         except Exception as e:
+            PREDICTIONS.inc(kind='image', outcome='error')
             print(f"❌ Erreur lors du traitement de l'image: {e}")
             import traceback
             traceback.print_exc()